@@ -1,8 +1,8 @@
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer
-from collectionplans.models import CashCollection, Scheme, CashCollectionEntry , CollectionEntry
-from django.db.models import Sum
+from collectionplans.models import CashCollection, CashCollectionBalance, Scheme, CashCollectionEntry , CollectionEntry, SyncTombstone
+from collectionplans import ledger
 from decimal import Decimal
 import re
 
@@ -50,17 +50,16 @@ class CashCollectionEntrySerializer(serializers.ModelSerializer):
             customer = data.get('customer', self.instance.customer)
             scheme = data.get('scheme', self.instance.scheme)
             
-            amount_difference = float(amount) - float(self.instance.amount)
+            amount_difference = Decimal(str(amount)) - self.instance.amount
             
             if amount_difference > 0:
                 
-                total_paid = CashCollectionEntry.objects.filter(
-                    customer=customer,
-                    scheme=scheme
-                ).exclude(id=self.instance.id).aggregate(total=Sum("amount"))["total"] or 0
+                total_paid = ledger.get_total_paid(customer.id, scheme.id)
+                if (customer.id, scheme.id) == (self.instance.customer_id, self.instance.scheme_id):
+                    total_paid -= self.instance.amount
                 
-                new_total = float(total_paid) + float(amount)
-                scheme_total = float(scheme.total_amount)
+                new_total = total_paid + Decimal(str(amount))
+                scheme_total = scheme.total_amount
                 
                 if new_total > scheme_total:
                     raise serializers.ValidationError(
@@ -77,10 +76,7 @@ class CashCollectionEntrySerializer(serializers.ModelSerializer):
         if not customer or not scheme:
             raise serializers.ValidationError("Customer and scheme are required.")
 
-        total_paid = CashCollectionEntry.objects.filter(
-            customer=customer,
-            scheme=scheme
-        ).aggregate(total=Sum("amount"))["total"] or 0
+        total_paid = ledger.get_total_paid(customer.id, scheme.id)
 
         scheme_total = scheme.total_amount
 
@@ -93,6 +89,32 @@ class CashCollectionEntrySerializer(serializers.ModelSerializer):
 
         return data
 
+    # validate() is a fast pre-check against the ledger; the authoritative check is the
+    # conditional ledger update made while the entry is saved, which concurrent requests
+    # cannot both pass.
+    def create(self, validated_data):
+        try:
+            return super().create(validated_data)
+        except ledger.OverpaymentError as exc:
+            raise serializers.ValidationError({"non_field_errors": [str(exc)]})
+
+    def update(self, instance, validated_data):
+        try:
+            return super().update(instance, validated_data)
+        except ledger.OverpaymentError as exc:
+            raise serializers.ValidationError({"non_field_errors": [str(exc)]})
+
+
+class CashCollectionEntryBatchItemSerializer(serializers.Serializer):
+    """Shape check for one item of a batch upload; existence and overpayment are checked set-wise by the view."""
+    client_id = serializers.CharField(required=False, allow_blank=True, max_length=100)
+    customer = serializers.IntegerField()
+    scheme = serializers.IntegerField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal("0.01"))
+    payment_method = serializers.ChoiceField(
+        choices=CashCollectionEntry.PAYMENT_METHOD_CHOICES, default="cash"
+    )
+
 
 class CashCollectionSerializer(serializers.ModelSerializer):
     scheme_name = serializers.CharField(source='scheme.name', read_only=True)
@@ -133,31 +155,32 @@ class CashCollectionSerializer(serializers.ModelSerializer):
         return None
 
     def get_total_paid(self, obj):
-        entries = CashCollectionEntry.objects.filter(customer=obj.customer, scheme=obj.scheme)
-        return sum(float(entry.amount) for entry in entries)
+        """Reads the `paid_amount` annotation from `with_balances()`, falling back to the ledger row."""
+        paid = getattr(obj, "paid_amount", None)
+        if paid is None:
+            paid = ledger.get_total_paid(obj.customer_id, obj.scheme_id)
+            obj.paid_amount = paid
+        return paid
 
     def get_remaining_amount(self, obj):
-        total_paid = self.get_total_paid(obj)
-        return float(obj.scheme.total_amount) - float(total_paid)
+        return obj.scheme.total_amount - self.get_total_paid(obj)
 
     def get_payment_progress(self, obj):
-        total_paid = self.get_total_paid(obj)
-        if float(obj.scheme.total_amount) == 0:
+        if not obj.scheme.total_amount:
             return 0
-        return round((float(total_paid) / float(obj.scheme.total_amount)) * 100, 2)
+        progress = self.get_total_paid(obj) / obj.scheme.total_amount * 100
+        return progress.quantize(Decimal("0.01"))
 
     def get_installments_paid(self, obj):
         if not obj.scheme.installment_amount:
             return None
-        total_paid = self.get_total_paid(obj)
-        return int(float(total_paid) // float(obj.scheme.installment_amount))
+        return int(self.get_total_paid(obj) // obj.scheme.installment_amount)
 
     def get_installments_remaining(self, obj):
         if not obj.scheme.installment_amount:
             return None
-        total_installments = float(obj.scheme.total_amount) / float(obj.scheme.installment_amount)
-        installments_paid = self.get_installments_paid(obj)
-        return int(total_installments - installments_paid)
+        total_installments = obj.scheme.total_amount / obj.scheme.installment_amount
+        return int(total_installments - self.get_installments_paid(obj))
     
     def calculate_custom_installments(self, obj):
         """
@@ -192,6 +215,32 @@ class CashCollectionSerializer(serializers.ModelSerializer):
 
 
 
+class CashCollectionEnrollmentSerializer(serializers.Serializer):
+    """Validates the enrollment period shared by every customer of a bulk enroll request."""
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+
+
+def customer_details(customer):
+    """Returns detailed customer info, including user profile data."""
+    if customer is None:
+        return None
+    user = customer.user
+    return {
+        "id": customer.id,
+        "profile_id": customer.profile_id,
+        "shop_name": customer.shop_name,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "contact_number": user.contact_number,
+        "email": user.email,
+    }
+
+
+def payment_history_item(entry):
+    return {"amount": entry.amount, "payment_method": entry.payment_method, "date": entry.created_at}
+
+
 class CustomerSchemePaymentSerializer(serializers.ModelSerializer):
     customer_name = serializers.CharField(source="customer.user.first_name", read_only=True)
     scheme_name = serializers.CharField(source="scheme.name", read_only=True)
@@ -204,29 +253,37 @@ class CustomerSchemePaymentSerializer(serializers.ModelSerializer):
         fields = ["customer_name", "scheme_name", "scheme_total_amount", "payment_history", "customer_details"]
 
     def get_payment_history(self, obj):
+        """Reads the history prefetched by the view (`payment_history` context) when available."""
+        history = self.context.get("payment_history")
+        if history is not None:
+            return history.get((obj.customer_id, obj.scheme_id), [])
         payments = CashCollectionEntry.objects.filter(customer=obj.customer, scheme=obj.scheme)
-        return [{"amount": p.amount, "payment_method": p.payment_method, "date": p.created_at} for p in payments]
+        return [payment_history_item(p) for p in payments]
     
     def get_customer_details(self, obj):
-        """
-        Returns detailed customer info, including user profile data
-        """
-        if obj.customer:
-            customer = obj.customer
-            user = customer.user
-            return {
-                "id": customer.id,
-                "profile_id": customer.profile_id,
-                "shop_name": customer.shop_name,
-                "first_name": user.first_name,
-                "last_name": user.last_name,
-                "contact_number": user.contact_number,
-                "email": user.email,
-            }
-        return None
-    
+        return customer_details(obj.customer)
+
+
+class CustomerSchemePaymentGroupSerializer(serializers.ModelSerializer):
+    """One customer + scheme with its payments nested, built from a ledger row."""
+    customer_name = serializers.CharField(source="customer.user.first_name", read_only=True)
+    scheme_name = serializers.CharField(source="scheme.name", read_only=True)
+    scheme_total_amount = serializers.DecimalField(source="scheme.total_amount", max_digits=10, decimal_places=2, read_only=True)
+    payment_history = serializers.SerializerMethodField()
+    customer_details = serializers.SerializerMethodField()
 
+    class Meta:
+        model = CashCollectionBalance
+        fields = [
+            "customer", "scheme", "customer_name", "scheme_name", "scheme_total_amount",
+            "total_paid", "entry_count", "last_payment_at", "payment_history", "customer_details",
+        ]
 
+    def get_payment_history(self, obj):
+        return self.context["payment_history"].get((obj.customer_id, obj.scheme_id), [])
+
+    def get_customer_details(self, obj):
+        return customer_details(obj.customer)
 
 
 class CollectionEntrySerializer(serializers.ModelSerializer):
@@ -273,4 +330,10 @@ class CollectionEntrySerializer(serializers.ModelSerializer):
         if request and hasattr(request, 'user'):
             validated_data['updated_by'] = request.user
         
-        return super().update(instance, validated_data)
\ No newline at end of file
+        return super().update(instance, validated_data)
+
+
+class SyncTombstoneSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SyncTombstone
+        fields = ["model", "object_id", "customer_id", "deleted_at"]
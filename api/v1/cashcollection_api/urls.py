@@ -15,6 +15,7 @@ urlpatterns = [
     path("schemes/create/", views.scheme_create, name="scheme_create"),
 
     path("cashcollection/bycustomer/create/", views.cash_collection_entry_create, name="cash-collection-entry"),
+    path("cashcollection/bycustomer/batch/", views.cash_collection_entry_batch_create, name="cash-collection-entry-batch"),
     path("cashcollection/bycustomer/", views.cash_collection_entry_list, name="cash-collection-entry-list"),
     path("cashcollection/bycustomer/<int:pk>/", views.cash_collection_entry_update, name="cash-collection-entry-update"),
     path("cashcollection/bycustomer/<int:pk>/delete/", views.cash_collection_entry_delete, name="cash-collection-entry-delete"),
@@ -26,6 +27,7 @@ urlpatterns = [
     
     # Payment history
     path("customer-scheme-payments/", views.customer_scheme_payment_list, name="customer-scheme-payments"),
+    path("customer-scheme-payments/grouped/", views.customer_scheme_payment_groups, name="customer-scheme-payment-groups"),
     path("customer-scheme-payment/", views.customer_scheme_payment_list_logged_in_user, name="customer-scheme-payments-by-id"),
     path('customer-schemes/', views.get_customer_schemes, name='customer-scheme-list'),
 
@@ -35,5 +37,13 @@ urlpatterns = [
     path("collections/<int:pk>/", views.collection_detail_or_update_or_delete, name="collection_detail_update_delete"),
     path("collections/summary/", views.collection_summary, name="collection_summary"),
 
+    # Exports (file_type is csv or xlsx)
+    path("exports/cash-collection-entries/<str:file_type>/", views.cash_collection_entry_export, name="cash-collection-entry-export"),
+    path("exports/cash-collections/<str:file_type>/", views.cash_collection_export, name="cash-collection-export"),
+    path("exports/collections/<str:file_type>/", views.collection_export, name="collection-export"),
+
+    # Delta sync for the offline agent app
+    path("sync/", views.agent_sync, name="agent-sync"),
+
     
 ]
\ No newline at end of file
@@ -1,25 +1,46 @@
 from rest_framework import viewsets
-from .serializers import SchemeSerializer, CashCollectionSerializer, CashCollectionEntrySerializer, CustomerSchemePaymentSerializer,CollectionEntrySerializer
+from .serializers import payment_history_item, SchemeSerializer, CashCollectionSerializer, CashCollectionEntrySerializer, CustomerSchemePaymentSerializer,CollectionEntrySerializer, CashCollectionEnrollmentSerializer, CashCollectionEntryBatchItemSerializer, CustomerSchemePaymentGroupSerializer, SyncTombstoneSerializer
 from rest_framework.response import Response
 from rest_framework import status
 from collectionplans.models import CashCollection, Scheme
 from rest_framework.decorators import api_view
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.decorators import permission_classes
+from rest_framework.decorators import authentication_classes, permission_classes
 from customer.models import Customer
-from collectionplans.models import CashCollectionEntry,CollectionEntry
-from django.db.models import Sum, Case, When, DecimalField, F
-from django.db.models.functions import Coalesce
+from collectionplans.models import CashCollectionBalance, CashCollectionEntry,CollectionEntry, DAYBOOK_ORDERING
+from collectionplans import checkpoints, ledger, sync
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DecimalField, Exists, F, OuterRef, Value
 from decimal import Decimal
+from django.utils.dateparse import parse_date
+from rest_framework.utils.urls import replace_query_param
+from rest_framework import serializers
+from api.v1.exports import EXPORT_FILE_TYPES, export_response
+from api.v1.conditional import conditional_page, conditional_response
+from api.v1.customer_api.serializers import CustomerListSerializer
+from api.v1.pagination import KeysetPagination, page_response, paginated_response, pagination_setting
+from customer.models import CustomerAssignment
+from dashboard import notifications, targets
+from main import cache as read_cache
+from users.authentication import ClaimsJWTAuthentication
+from users.models import UserRoles
+
+
+# Read-cache namespaces of the scheme, customer and user fields embedded in the
+# enrollment and entry payloads; part of their ETags (see api/v1/conditional.py).
+EMBEDDED_NAMESPACES = ["schemes", "customers", "users"]
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@authentication_classes([ClaimsJWTAuthentication])
 def scheme_list(request):
     """Retrieve all schemes."""
-    schemes = Scheme.objects.all()
-    serializer = SchemeSerializer(schemes, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return read_cache.cached_response(
+        request, "scheme_list", ["schemes"],
+        lambda: paginated_response(request, Scheme.objects.all(), SchemeSerializer),
+    )
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -50,7 +71,12 @@ def scheme_update(request, id):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def enroll_customer_in_scheme(request):
-    """Enrolls multiple customers in a selected scheme (Creates CashCollection)."""
+    """Enrolls multiple customers in a selected scheme (Creates CashCollection).
+
+    Customers and existing enrollments are fetched with one IN query each and
+    the new enrollments are written with a single bulk_create, so the query
+    count does not depend on how many customers are enrolled.
+    """
    
     scheme_id = request.data.get("scheme")
     customer_ids = request.data.get("customers")
@@ -64,38 +90,47 @@ def enroll_customer_in_scheme(request):
 
     try:
         scheme = Scheme.objects.get(id=scheme_id)
-    except Scheme.DoesNotExist:
+    except (Scheme.DoesNotExist, ValueError, TypeError):
         return Response({"error": "Scheme not found"}, status=status.HTTP_404_NOT_FOUND)
-    
-    created_collections = []
-    errors = []
 
+    dates = CashCollectionEnrollmentSerializer(data=request.data)
+    if not dates.is_valid():
+        return Response({"errors": dates.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    errors = []
+    requested_ids = []
     for customer_id in customer_ids:
         try:
-            customer = Customer.objects.get(id=customer_id)
-        except Customer.DoesNotExist:
+            customer_id = int(customer_id)
+        except (TypeError, ValueError):
             errors.append({"customer_id": customer_id, "error": "Customer not found"})
             continue
+        if customer_id not in requested_ids:
+            requested_ids.append(customer_id)
 
-        existing_entry = CashCollection.objects.filter(scheme=scheme, customer=customer).exists()
-        if existing_entry:
+    existing_customers = set(
+        Customer.objects.filter(id__in=requested_ids).values_list("id", flat=True)
+    )
+    enrolled_customers = set(
+        CashCollection.objects.filter(scheme=scheme, customer_id__in=requested_ids).values_list("customer_id", flat=True)
+    )
+
+    new_collections = []
+    for customer_id in requested_ids:
+        if customer_id not in existing_customers:
+            errors.append({"customer_id": customer_id, "error": "Customer not found"})
+        elif customer_id in enrolled_customers:
             errors.append({"customer_id": customer_id, "error": "Customer is already enrolled in this scheme"})
-            continue
-        
-        # Prepare data for this specific customer
-        data = request.data.copy()
-        data["customer"] = customer_id
-        
-        serializer = CashCollectionSerializer(data=data)
-        if serializer.is_valid():
-            serializer.save(
-                created_by=request.user,
-                customer=customer,
-                scheme=scheme
-            )
-            created_collections.append(serializer.data)
         else:
-            errors.append({"customer_id": customer_id, "error": serializer.errors})
+            new_collections.append(CashCollection(
+                scheme=scheme,
+                customer_id=customer_id,
+                created_by=request.user,
+                **dates.validated_data
+            ))
+
+    with transaction.atomic():
+        created_collections = CashCollection.objects.bulk_create(new_collections, batch_size=1000)
 
     if not created_collections and errors:
         return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
@@ -104,28 +139,39 @@ def enroll_customer_in_scheme(request):
     
     return Response({
         "message": f"Successfully enrolled {len(created_collections)} customers.",
-        "data": created_collections,
+        "data": [{"id": collection.id, "customer_id": collection.customer_id} for collection in created_collections],
         "errors": errors
     }, status=response_status)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@authentication_classes([ClaimsJWTAuthentication])
 def cash_collection_list(request):
-    cash_collections = CashCollection.objects.all()
-    serializer = CashCollectionSerializer(cash_collections, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    cash_collections = CashCollection.objects.with_balances()
+    # paid_amount is read from the ledger row, whose changes do not touch the enrollment's updated_at.
+    return conditional_page(
+        request, cash_collections, lambda rows, paginator: page_response(rows, paginator, CashCollectionSerializer),
+        EMBEDDED_NAMESPACES, fields=("updated_at", "paid_amount"),
+    )
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def cash_collection_detail(request, id):
-    try:
-        cash_collection = CashCollection.objects.get(id=id)
-    except CashCollection.DoesNotExist:
-        return Response(status=status.HTTP_404_NOT_FOUND)
-    serializer = CashCollectionSerializer(cash_collection)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    def build():
+        try:
+            cash_collection = CashCollection.objects.with_balances().get(id=id)
+        except CashCollection.DoesNotExist:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        serializer = CashCollectionSerializer(cash_collection)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    enrollment = CashCollection.objects.filter(id=id)
+    balance = CashCollectionBalance.objects.filter(
+        customer_id__in=enrollment.values('customer_id'), scheme_id__in=enrollment.values('scheme_id')
+    )
+    return conditional_response(request, build, [enrollment, balance], EMBEDDED_NAMESPACES)
 
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
@@ -149,19 +195,166 @@ def cash_collection_entry_create(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def cash_collection_entry_batch_create(request):
+    """Ingests a batch of collection entries synced by an agent app.
+
+    Items are validated in order against the running total of their
+    customer + scheme, so an item that would overpay (including because of
+    earlier items in the same batch) is rejected without affecting the rest.
+    Existing totals come from one locked ledger query and accepted items are
+    written with bulk_create.
+    """
+    items = request.data.get("entries") if isinstance(request.data, dict) else request.data
+    if not isinstance(items, list) or not items:
+        return Response({"error": "A non-empty list of entries is required"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > settings.CASH_COLLECTION_BATCH_LIMIT:
+        return Response(
+            {"error": f"A batch may contain at most {settings.CASH_COLLECTION_BATCH_LIMIT} entries"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        serializer = CashCollectionEntryBatchItemSerializer(data=item)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            results[index] = {"index": index, "status": "rejected", "errors": serializer.errors}
+
+    schemes = Scheme.objects.in_bulk({data["scheme"] for _, data in valid})
+    customer_ids = set(
+        Customer.objects.filter(id__in={data["customer"] for _, data in valid}).values_list("id", flat=True)
+    )
+
+    with transaction.atomic():
+        balances = ledger.lock_balances(
+            (data["customer"], data["scheme"]) for _, data in valid
+            if data["customer"] in customer_ids and data["scheme"] in schemes
+        )
+        running_totals = {pair: balance.total_paid for pair, balance in balances.items()}
+
+        accepted = []
+        for index, data in valid:
+            pair = (data["customer"], data["scheme"])
+            if data["customer"] not in customer_ids:
+                error = "Customer not found"
+            elif data["scheme"] not in schemes:
+                error = "Scheme not found"
+            elif running_totals[pair] + data["amount"] > schemes[data["scheme"]].total_amount:
+                error = (
+                    f"Overpayment detected. You've already paid ₹{running_totals[pair]}, so you can only pay up to "
+                    f"₹{schemes[data['scheme']].total_amount - running_totals[pair]} more."
+                )
+            else:
+                error = None
+
+            if error:
+                results[index] = {"index": index, "status": "rejected", "errors": [error]}
+                continue
+
+            running_totals[pair] += data["amount"]
+            accepted.append((index, CashCollectionEntry(
+                customer_id=data["customer"],
+                scheme_id=data["scheme"],
+                amount=data["amount"],
+                payment_method=data["payment_method"],
+                created_by=request.user,
+                updated_by=request.user,
+            )))
+
+        entries = CashCollectionEntry.objects.bulk_create([entry for _, entry in accepted], batch_size=1000)
+        ledger.apply_bulk(balances, entries)
+        targets.apply_bulk(entries)
+        transaction.on_commit(lambda: notifications.alert_large_entries(entries))
+
+    for index, entry in accepted:
+        results[index] = {"index": index, "status": "accepted", "id": entry.id}
+    for index, item in enumerate(items):
+        if isinstance(item, dict) and "client_id" in item:
+            results[index]["client_id"] = item["client_id"]
+
+    return Response({
+        "accepted": len(accepted),
+        "rejected": len(items) - len(accepted),
+        "results": results,
+    }, status=status.HTTP_201_CREATED if accepted else status.HTTP_400_BAD_REQUEST)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@authentication_classes([ClaimsJWTAuthentication])
 def cash_collection_entry_list(request):
-    entries = CashCollectionEntry.objects.all().order_by('-created_at')  
-    serializer = CashCollectionEntrySerializer(entries, many=True)
-    return Response(serializer.data)
+    entries = CashCollectionEntry.objects.select_related(
+        'customer__user', 'scheme', 'created_by', 'updated_by'
+    ).order_by('-created_at')
+    return conditional_page(
+        request, entries, lambda rows, paginator: page_response(rows, paginator, CashCollectionEntrySerializer),
+        EMBEDDED_NAMESPACES,
+    )
+
+def payment_history_by_pair(pairs):
+    """Returns the payments of the given (customer_id, scheme_id) pairs, oldest first, from one query."""
+    pairs = set(pairs)
+    history = {pair: [] for pair in pairs}
+    if not pairs:
+        return history
+    entries = CashCollectionEntry.objects.filter(
+        customer_id__in={customer_id for customer_id, _ in pairs},
+        scheme_id__in={scheme_id for _, scheme_id in pairs},
+    ).order_by('customer_id', 'scheme_id', 'created_at', 'id')
+    for entry in entries:
+        payments = history.get((entry.customer_id, entry.scheme_id))
+        if payments is not None:
+            payments.append(payment_history_item(entry))
+    return history
+
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@authentication_classes([ClaimsJWTAuthentication])
 def customer_scheme_payment_list(request):
-    entries = CashCollectionEntry.objects.all()
-    serializer = CustomerSchemePaymentSerializer(entries, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    """Legacy per-entry payment history; prefer customer_scheme_payment_groups, which returns each pair once."""
+    entries = CashCollectionEntry.objects.select_related('customer__user', 'scheme')
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(entries, request)
+    rows = entries if page is None else page
+    context = {"payment_history": payment_history_by_pair((row.customer_id, row.scheme_id) for row in rows)}
+    serializer = CustomerSchemePaymentSerializer(rows, many=True, context=context)
+    if page is None:
+        return Response(serializer.data, status=status.HTTP_200_OK)
+    return paginator.get_paginated_response(serializer.data)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@authentication_classes([ClaimsJWTAuthentication])
+def customer_scheme_payment_groups(request):
+    """Payment history grouped by customer + scheme, each pair once with its payments nested.
+
+    Groups are the ledger rows of the pairs that have payments, keyset
+    paginated on (customer, scheme); the payments of a page are read with a
+    single ordered query. Filter with `?customer=` and `?scheme=`.
+    """
+    groups = CashCollectionBalance.objects.filter(entry_count__gt=0).select_related('customer__user', 'scheme')
+    for param in ('customer', 'scheme'):
+        value = request.query_params.get(param)
+        if value:
+            if not value.isdigit():
+                return Response({param: "Must be an integer id."}, status=status.HTTP_400_BAD_REQUEST)
+            groups = groups.filter(**{f"{param}_id": value})
+
+    def render(rows, paginator):
+        context = {"payment_history": payment_history_by_pair((row.customer_id, row.scheme_id) for row in rows)}
+        return page_response(rows, paginator, CustomerSchemePaymentGroupSerializer, context)
+
+    # Every entry change moves its ledger row's updated_at, so the groups cover the nested history too.
+    return conditional_page(
+        request, groups.order_by('customer_id', 'scheme_id'), render, EMBEDDED_NAMESPACES,
+        ordering=('customer_id', 'scheme_id'),
+    )
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
@@ -172,20 +365,23 @@ def customer_scheme_payment_list_logged_in_user(request):
     except Customer.DoesNotExist:
         return Response({"detail": "Customer profile not found."}, status=status.HTTP_404_NOT_FOUND)
 
-    entries = CashCollectionEntry.objects.filter(customer=customer)
-    serializer = CustomerSchemePaymentSerializer(entries, many=True)
+    entries = list(CashCollectionEntry.objects.filter(customer=customer).select_related('customer__user', 'scheme'))
+    context = {"payment_history": payment_history_by_pair((row.customer_id, row.scheme_id) for row in entries)}
+    serializer = CustomerSchemePaymentSerializer(entries, many=True, context=context)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def cash_collection_entry_detail(request, pk):
-    try:
-        entry = CashCollectionEntry.objects.get(pk=pk)
-    except CashCollectionEntry.DoesNotExist:
-        return Response(status=status.HTTP_404_NOT_FOUND)
-    
-    serializer = CashCollectionEntrySerializer(entry)
-    return Response(serializer.data)
+    def build():
+        try:
+            entry = CashCollectionEntry.objects.get(pk=pk)
+        except CashCollectionEntry.DoesNotExist:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        serializer = CashCollectionEntrySerializer(entry)
+        return Response(serializer.data)
+
+    return conditional_response(request, build, [CashCollectionEntry.objects.filter(pk=pk)], EMBEDDED_NAMESPACES)
 
 
 @api_view(['PUT', 'PATCH'])
@@ -223,11 +419,16 @@ def cash_collection_entry_delete(request, pk):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@authentication_classes([ClaimsJWTAuthentication])
 def customer_transaction_list(request):
     """Get all customer transaction entries."""
-    entries = CashCollectionEntry.objects.all().order_by('-created_at')
-    serializer = CashCollectionEntrySerializer(entries, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    entries = CashCollectionEntry.objects.select_related(
+        'customer__user', 'scheme', 'created_by', 'updated_by'
+    ).order_by('-created_at')
+    return conditional_page(
+        request, entries, lambda rows, paginator: page_response(rows, paginator, CashCollectionEntrySerializer),
+        EMBEDDED_NAMESPACES,
+    )
 
 @api_view(['PATCH'])
 @permission_classes([IsAuthenticated])
@@ -266,43 +467,84 @@ def customer_transaction_delete(request, pk):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@authentication_classes([ClaimsJWTAuthentication])
 def get_customer_schemes(request):
     """Get all customer-scheme enrollments (CashCollection records)."""
     scheme_id = request.query_params.get('scheme', None)
-    queryset = CashCollection.objects.all()
+    queryset = CashCollection.objects.with_balances()
 
     if scheme_id:
         queryset = queryset.filter(scheme_id=scheme_id)
-    serializer = CashCollectionSerializer(queryset, many=True)
-    
-    return Response(serializer.data)
+
+    return conditional_page(
+        request, queryset, lambda rows, paginator: page_response(rows, paginator, CashCollectionSerializer),
+        EMBEDDED_NAMESPACES, fields=("updated_at", "paid_amount"),
+    )
+
 
 
 
 
 
+def daybook_date_range(request):
+    """Parses the optional `date_from` / `date_to` query params of the daybook endpoints."""
+    dates = {}
+    for param in ('date_from', 'date_to'):
+        value = request.query_params.get(param)
+        if value:
+            dates[param] = parse_date(value)
+            if dates[param] is None:
+                raise serializers.ValidationError({param: "Use the YYYY-MM-DD format."})
+    return dates.get('date_from'), dates.get('date_to')
+
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@authentication_classes([ClaimsJWTAuthentication])
 def collection_list(request):
-    """Get all collection entries with running totals"""
-    entries = CollectionEntry.objects.all().order_by('date', 'created_at')
-    
-    # Calculate running total
-    running_total = Decimal('0.00')
-    entries_with_totals = []
-    
-    for entry in entries:
-        if entry.type == 'credit':
-            running_total += entry.amount
-        else:  # debit
-            running_total -= entry.amount
-        
-        entry_data = CollectionEntrySerializer(entry).data
+    """Get collection entries with running totals, paged in date order.
+
+    The running total is a window SUM computed by the database. The first
+    page opens with the balance before `date_from`, read from the daily
+    checkpoints; later pages open with the closing balance carried in the
+    cursor.
+    """
+    date_from, date_to = daybook_date_range(request)
+
+    entries = CollectionEntry.objects.select_related('created_by', 'updated_by')
+    if date_from:
+        entries = entries.filter(date__gte=date_from)
+    if date_to:
+        entries = entries.filter(date__lte=date_to)
+
+    paginator = KeysetPagination(ordering=DAYBOOK_ORDERING)
+    page = paginator.paginate_queryset(entries.with_running_total(), request)
+    if page is None:
+        page = entries.with_running_total().order_by(*DAYBOOK_ORDERING)
+
+    if 'balance' in getattr(paginator, 'cursor_extra', {}):
+        opening_balance = Decimal(paginator.cursor_extra['balance'])
+    elif date_from:
+        opening_balance = checkpoints.balance_before(date_from)
+    else:
+        opening_balance = Decimal('0.00')
+
+    page = list(page)
+    entries_with_totals = CollectionEntrySerializer(page, many=True).data
+    running_total = opening_balance
+    for entry, entry_data in zip(page, entries_with_totals):
+        running_total = opening_balance + entry.running_balance
         entry_data['running_total'] = running_total
-        entries_with_totals.append(entry_data)
-    
-    return Response(entries_with_totals, status=status.HTTP_200_OK)
+
+    if paginator.is_unpaginated(request):
+        return Response(entries_with_totals, status=status.HTTP_200_OK)
+
+    return Response({
+        "next": paginator.get_next_link(balance=str(running_total)),
+        "opening_balance": opening_balance,
+        "closing_balance": running_total,
+        "results": entries_with_totals,
+    }, status=status.HTTP_200_OK)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -364,22 +606,17 @@ def collection_delete(request, pk):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@authentication_classes([ClaimsJWTAuthentication])
 def collection_summary(request):
-    """Get summary statistics for collections"""
-    # Get totals for credit and debit
-    summary = CollectionEntry.objects.aggregate(
-        total_credit=Coalesce(
-            Sum(Case(When(type='credit', then=F('amount')), output_field=DecimalField())), 
-            Decimal('0.00')
-        ),
-        total_debit=Coalesce(
-            Sum(Case(When(type='debit', then=F('amount')), output_field=DecimalField())), 
-            Decimal('0.00')
-        )
-    )
-    
-    # Calculate balance
-    summary['balance'] = summary['total_credit'] - summary['total_debit']
+    """Get summary statistics for collections, optionally as of the close of `as_of`"""
+    as_of = request.query_params.get('as_of')
+    if as_of:
+        as_of = parse_date(as_of)
+        if as_of is None:
+            return Response({"as_of": "Use the YYYY-MM-DD format."}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Totals come from the nearest daily checkpoint plus the entries after it
+    summary = checkpoints.totals_as_of(as_of)
     
     return Response(summary, status=status.HTTP_200_OK)
 
@@ -413,4 +650,175 @@ def collection_detail_or_update_or_delete(request, pk):
     
     elif request.method == 'DELETE':
         entry.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+
+def export_filters(request, file_type):
+    """Parses the filters shared by the export endpoints: date range, `agent` and `scheme` ids."""
+    if file_type not in EXPORT_FILE_TYPES:
+        raise serializers.ValidationError({"file_type": f"Use one of: {', '.join(EXPORT_FILE_TYPES)}."})
+    date_from, date_to = daybook_date_range(request)
+    filters = {"date_from": date_from, "date_to": date_to}
+    for param in ('agent', 'scheme'):
+        value = request.query_params.get(param)
+        if value and not value.isdigit():
+            raise serializers.ValidationError({param: "Must be an integer id."})
+        filters[param] = int(value) if value else None
+    return filters
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def cash_collection_entry_export(request, file_type):
+    """Exports customer payments as CSV or XLSX, filtered by payment date, collecting agent and scheme."""
+    filters = export_filters(request, file_type)
+    entries = CashCollectionEntry.objects.order_by('created_at', 'id')
+    if filters["date_from"]:
+        entries = entries.filter(created_at__date__gte=filters["date_from"])
+    if filters["date_to"]:
+        entries = entries.filter(created_at__date__lte=filters["date_to"])
+    if filters["agent"]:
+        entries = entries.filter(created_by_id=filters["agent"])
+    if filters["scheme"]:
+        entries = entries.filter(scheme_id=filters["scheme"])
+
+    columns = [
+        ("ID", "id"),
+        ("Date", "created_at"),
+        ("Customer ID", "customer_id"),
+        ("First name", "customer__user__first_name"),
+        ("Last name", "customer__user__last_name"),
+        ("Shop", "customer__shop_name"),
+        ("Scheme", "scheme__name"),
+        ("Amount", "amount"),
+        ("Payment method", "payment_method"),
+        ("Collected by", "created_by__contact_number"),
+    ]
+    return export_response(entries, columns, "cash-collection-entries", file_type)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def cash_collection_export(request, file_type):
+    """Exports enrollments with their ledger balances, filtered by enrollment period, assigned agent and scheme."""
+    filters = export_filters(request, file_type)
+    enrollments = CashCollection.objects.with_balances().annotate(
+        remaining_amount=F('scheme__total_amount') - F('paid_amount'),
+    ).order_by('id')
+    if filters["date_from"]:
+        enrollments = enrollments.filter(end_date__gte=filters["date_from"])
+    if filters["date_to"]:
+        enrollments = enrollments.filter(start_date__lte=filters["date_to"])
+    if filters["agent"]:
+        enrollments = enrollments.filter(Exists(CustomerAssignment.objects.filter(
+            customer_id=OuterRef('customer_id'), agent_id=filters["agent"]
+        )))
+    if filters["scheme"]:
+        enrollments = enrollments.filter(scheme_id=filters["scheme"])
+
+    columns = [
+        ("ID", "id"),
+        ("Customer ID", "customer_id"),
+        ("First name", "customer__user__first_name"),
+        ("Last name", "customer__user__last_name"),
+        ("Shop", "customer__shop_name"),
+        ("Scheme", "scheme__name"),
+        ("Start date", "start_date"),
+        ("End date", "end_date"),
+        ("Scheme total", "scheme__total_amount"),
+        ("Paid", "paid_amount"),
+        ("Remaining", "remaining_amount"),
+    ]
+    return export_response(enrollments, columns, "cash-collections", file_type)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def collection_export(request, file_type):
+    """Exports the daybook in date order with its running balance, filtered by date and the recording user."""
+    filters = export_filters(request, file_type)
+    entries = CollectionEntry.objects.all()
+    opening_balance = Decimal("0.00")
+    if filters["date_from"]:
+        entries = entries.filter(date__gte=filters["date_from"])
+        opening_balance = checkpoints.balance_before(filters["date_from"])
+    if filters["date_to"]:
+        entries = entries.filter(date__lte=filters["date_to"])
+    if filters["agent"]:
+        # A per-user running balance would not match the daybook, so it is left out.
+        entries = entries.filter(created_by_id=filters["agent"]).order_by(*DAYBOOK_ORDERING)
+        balance_column = []
+    else:
+        entries = entries.with_running_total().annotate(
+            balance=F('running_balance') + Value(opening_balance, output_field=DecimalField(max_digits=14, decimal_places=2))
+        ).order_by(*DAYBOOK_ORDERING)
+        balance_column = [("Balance", "balance")]
+
+    columns = [
+        ("ID", "id"),
+        ("Date", "date"),
+        ("Type", "type"),
+        ("Amount", "amount"),
+        ("Narration", "narration"),
+        ("Recorded by", "created_by__contact_number"),
+    ] + balance_column
+    return export_response(entries, columns, "daybook", file_type)
+
+
+SYNC_SERIALIZERS = {
+    "schemes": SchemeSerializer,
+    "customers": CustomerListSerializer,
+    "enrollments": CashCollectionSerializer,
+    "entries": CashCollectionEntrySerializer,
+    "deleted": SyncTombstoneSerializer,
+}
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@authentication_classes([ClaimsJWTAuthentication])
+def agent_sync(request):
+    """Delta sync for the agent app: rows of the agent's customers changed since `?watermark=`.
+
+    Omit the watermark for a full sync. Follow `next` until it is null; the
+    last page carries the `watermark` to send on the next sync. `reset`
+    means the watermark was too old and the app must drop its local data
+    before applying this sync. See collectionplans/sync.py.
+    """
+    if request.user.role != UserRoles.AGENT:
+        return Response({"detail": "Only agents can sync."}, status=status.HTTP_403_FORBIDDEN)
+
+    cursor = request.query_params.get('cursor')
+    reset = False
+    try:
+        if cursor:
+            since, started_at, positions = sync.decode_cursor(cursor)
+        else:
+            since, started_at, reset = sync.start(request.query_params.get('watermark'))
+            positions = {name: 0 for name in sync.SECTIONS}
+    except sync.InvalidToken as exc:
+        return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        page_size = int(request.query_params.get('page_size', pagination_setting("PAGE_SIZE", 50)))
+    except ValueError:
+        page_size = pagination_setting("PAGE_SIZE", 50)
+    page_size = max(1, min(page_size, pagination_setting("MAX_PAGE_SIZE", 500)))
+
+    # request.user is a ClaimsUser here, so the sync queries filter on its pk.
+    rows, next_positions = sync.page(request.user.pk, since, positions, page_size)
+    data = {
+        "next": None,
+        "watermark": None,
+        "reset": reset,
+        "revoked_customers": sync.revoked_customer_ids(request.user.pk, since) if not cursor else [],
+    }
+    if next_positions is None:
+        data["watermark"] = sync.encode_watermark(started_at)
+    else:
+        url = replace_query_param(request.build_absolute_uri(), 'cursor', sync.encode_cursor(since, started_at, next_positions))
+        data["next"] = url
+    for name, serializer_class in SYNC_SERIALIZERS.items():
+        data[name] = serializer_class(rows[name], many=True).data
+    return Response(data, status=status.HTTP_200_OK)
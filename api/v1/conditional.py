@@ -0,0 +1,110 @@
+"""
+Conditional GET (ETag / Last-Modified) for the api/v1 function views.
+
+The validator of a response is computed before anything is serialized.
+List endpoints (conditional_page) build it from the rows of the page
+about to be served: their primary keys and version fields (`updated_at`,
+plus any annotated value that another table can change), read by the page
+query itself, so no extra query runs and nothing scans the table. A
+deleted, inserted or edited row on the page changes the keys or a version
+field. Detail endpoints (conditional_response) use one aggregate query
+per source queryset, filtered down to the object by its key, returning
+its row count, highest primary key and latest `updated_at`. Both add the
+read-cache versions of the namespaces whose rows are embedded in the
+payload (user names, scheme names).
+
+The ETag also covers the full URL (filters and cursor) and the requesting
+user, so a 304 is only returned for the same view of the data.
+If-None-Match is the authoritative check: Last-Modified is sent for
+clients that display it, but If-Modified-Since on its own is ignored
+because a timestamp cannot see deletes.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from api.v1.pagination import DEFAULT_ORDERING, KeysetPagination
+from main import cache as read_cache
+
+
+def queryset_validator(queryset):
+    """Returns (row count, max pk, max updated_at) of a queryset from a single aggregate query."""
+    values = queryset.order_by().aggregate(count=Count("pk"), max_pk=Max("pk"), last_modified=Max("updated_at"))
+    return values["count"], values["max_pk"], values["last_modified"]
+
+
+def make_etag(request, parts, namespaces):
+    parts = [request.get_full_path(), str(request.user.pk), *parts]
+    parts += [str(version) for version in read_cache.versions(namespaces)] if namespaces else []
+    return quote_etag(hashlib.sha1("|".join(parts).encode()).hexdigest())
+
+
+def compute_validators(request, querysets, namespaces):
+    """Returns the (etag, last_modified) pair for a response built from `querysets`."""
+    validators = [queryset_validator(queryset) for queryset in querysets]
+    parts = [f"{count}:{max_pk}:{last_modified and last_modified.isoformat()}" for count, max_pk, last_modified in validators]
+    timestamps = [last_modified for _, _, last_modified in validators if last_modified is not None]
+    return make_etag(request, parts, namespaces), max(timestamps) if timestamps else None
+
+
+def page_validators(request, rows, fields, namespaces, has_next=False):
+    """Returns the (etag, last_modified) pair for a response serving `rows`, from their pks and `fields`."""
+    parts = [str(has_next)]
+    parts += [":".join(str(value) for value in (row.pk, *(getattr(row, field) for field in fields))) for row in rows]
+    timestamps = [row.updated_at for row in rows if "updated_at" in fields and row.updated_at is not None]
+    return make_etag(request, parts, namespaces), max(timestamps) if timestamps else None
+
+
+def not_modified(request, etag):
+    if request.headers.get("if-none-match"):
+        return get_conditional_response(request, etag=etag)
+    return None
+
+
+def stamp(response, etag, last_modified):
+    if 200 <= response.status_code < 300:
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified.timestamp())
+    return response
+
+
+def conditional_response(request, build, querysets, namespaces=()):
+    """
+    Returns 304 Not Modified when the client's If-None-Match matches the
+    current validators; otherwise calls `build()` for the response and
+    stamps it with ETag and Last-Modified. Error responses are returned
+    without validators.
+    """
+    etag, last_modified = compute_validators(request, querysets, namespaces)
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+    return stamp(build(), etag, last_modified)
+
+
+def conditional_page(request, queryset, render, namespaces=(), fields=("updated_at",), ordering=DEFAULT_ORDERING):
+    """
+    Keyset-paginates `queryset` (the whole queryset for `?paginate=false`)
+    and returns 304 Not Modified when the client's If-None-Match matches the
+    rows about to be served; otherwise returns `render(rows, paginator)`,
+    with paginator None when unpaginated, stamped with ETag and
+    Last-Modified. `fields` are the row attributes that change whenever the
+    serialized row does, besides embedded rows covered by `namespaces`.
+    """
+    paginator = KeysetPagination(ordering)
+    page = paginator.paginate_queryset(queryset, request)
+    if page is None:
+        paginator, rows = None, list(queryset)
+    else:
+        rows = page
+
+    etag, last_modified = page_validators(
+        request, rows, fields, namespaces, has_next=paginator is not None and paginator.has_next,
+    )
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+    return stamp(render(rows, paginator), etag, last_modified)
@@ -1,11 +1,15 @@
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from rest_framework.permissions import IsAuthenticated
-from customer.models import Customer,Agent
+from customer.models import Customer,Agent,CustomerAssignment
 from .serializers import CustomerSerializer,AgentProfileSerializer,CustomerListSerializer,AgentListSerializer
-from django.core.paginator import Paginator
+from api.v1.conditional import conditional_page, conditional_response
+from api.v1.pagination import page_response, paginated_response
+from main import cache as read_cache
+from users.authentication import ClaimsJWTAuthentication
 from users.models import CustomUser, UserRoles
 from api.v1.users_api.serializers import UserSerializer
 
@@ -31,19 +35,25 @@ def customer_update(request, id):
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@authentication_classes([ClaimsJWTAuthentication])
 def customer_list(request):
     """Retrieve only active customers (users who are not deleted)."""
-    customers = Customer.objects.filter(user__is_deleted=False)
-    serializer = CustomerListSerializer(customers, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    customers = Customer.objects.filter(user__is_deleted=False).select_related("user")
+    # Soft deletes and user edits only touch CustomUser, which bumps the "users" version.
+    return conditional_page(
+        request, customers, lambda rows, paginator: page_response(rows, paginator, CustomerListSerializer), ["users"],
+    )
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def customer_detail(request, id):
     """Retrieve details of a specific customer (if the user is not deleted)."""
-    customer = get_object_or_404(Customer, id=id, user__is_deleted=False)
-    serializer = CustomerSerializer(customer)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    def build():
+        customer = get_object_or_404(Customer, id=id, user__is_deleted=False)
+        serializer = CustomerSerializer(customer)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    return conditional_response(request, build, [Customer.objects.filter(id=id)], ["users"])
 
 @api_view(["DELETE"])
 @permission_classes([IsAuthenticated])
@@ -51,6 +61,7 @@ def customer_delete(request, id):
     """Soft delete a customer by setting user.is_deleted=True."""
     customer = get_object_or_404(Customer, id=id, user__is_deleted=False)
     customer.user.is_deleted = True
+    # Also bumps the customer's updated_at (collectionplans.sync.touch_customer), so the agent apps drop it.
     customer.user.save()
     return Response({"message": "Customer soft deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
 
@@ -61,6 +72,8 @@ def customer_restore(request, id):
     customer = get_object_or_404(Customer, id=id, user__is_deleted=True)
     customer.user.is_deleted = False
     customer.user.save()
+    # Touch the assignments so the agent apps' delta sync sends this customer in full again.
+    CustomerAssignment.objects.filter(customer=customer, is_active=True).update(updated_at=timezone.now())
     return Response({"message": "Customer restored successfully"}, status=status.HTTP_200_OK)
 
 
@@ -93,26 +106,23 @@ def agent_restore(request):
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@authentication_classes([ClaimsJWTAuthentication])
 def list_agents(request):
-    agent = Agent.objects.all()
-    paginator = Paginator(agent, 20)  
-    page = request.GET.get("page", 1)
-    agent_page = paginator.page(page)
-
-    serializer = AgentListSerializer(agent_page, many=True)
-    return Response({
-        "count": paginator.count,
-        "total_pages": paginator.num_pages,
-        "current_page": int(page),
-        "results": serializer.data
-    }, status=status.HTTP_200_OK)
+    agents = Agent.objects.select_related("user")
+    return read_cache.cached_response(
+        request, "agent_list", ["agents", "users"],
+        lambda: paginated_response(request, agents, AgentListSerializer),
+    )
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@authentication_classes([ClaimsJWTAuthentication])
 def agent_detail(request, id):
-    agent = get_object_or_404(Agent, id=id)
-    serializer = AgentProfileSerializer(agent)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    def build():
+        agent = get_object_or_404(Agent.objects.select_related("user"), id=id)
+        return Response(AgentProfileSerializer(agent).data, status=status.HTTP_200_OK)
+
+    return read_cache.cached_response(request, "agent_detail", ["agents", "users"], build)
 
 
 @api_view(["POST"])
@@ -0,0 +1,65 @@
+from django.utils import timezone
+from rest_framework import serializers
+
+from dashboard.models import Notification, Report, ReportJob
+from dashboard.reports import report_period
+
+
+class ReportRequestSerializer(serializers.Serializer):
+    """A report request: daily/weekly/monthly around `date`, or custom from `start_date` to `end_date`."""
+    title = serializers.CharField(max_length=255, required=False)
+    report_type = serializers.ChoiceField(choices=["daily", "weekly", "monthly", "custom"])
+    date = serializers.DateField(required=False)
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+
+    def validate(self, data):
+        if data["report_type"] == "custom":
+            if not data.get("start_date") or not data.get("end_date"):
+                raise serializers.ValidationError("start_date and end_date are required for custom reports.")
+            if data["start_date"] > data["end_date"]:
+                raise serializers.ValidationError("start_date must be on or before end_date.")
+            start, end = data["start_date"], data["end_date"]
+        else:
+            start, end = report_period(data["report_type"], data.get("date") or timezone.localdate())
+
+        data["start_date"], data["end_date"] = start, end
+        data.setdefault("title", f"{data['report_type'].title()} collection report {start} to {end}")
+        return data
+
+
+class ReportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Report
+        fields = ["id", "title", "report_type", "start_date", "end_date", "generated_by", "file", "data", "created_at"]
+
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    report = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReportJob
+        fields = ["id", "status", "attempts", "error", "created_at", "started_at", "finished_at", "report"]
+
+    def get_report(self, obj):
+        """The finished report; only its id until the job is done."""
+        if obj.status != ReportJob.DONE:
+            return {"id": obj.report_id}
+        return ReportSerializer(obj.report, context=self.context).data
+
+
+class NotificationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Notification
+        fields = ["id", "title", "message", "notification_type", "is_read", "related_to", "related_id", "created_at"]
+
+
+class MarkReadSerializer(serializers.Serializer):
+    """Either a list of notification ids or `all: true`."""
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=1000)
+    all = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if not data["all"] and not data.get("ids"):
+            raise serializers.ValidationError("Pass a list of ids or all=true.")
+        return data
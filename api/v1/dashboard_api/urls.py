@@ -1,9 +1,13 @@
 from django.urls import path
 from . import views
 
-app_name = 'services_api'
+app_name = 'dashboard_api'
 
 urlpatterns = [
-    
-    
+    path("reports/", views.report_create, name="report_create"),
+    path("reports/jobs/<int:pk>/", views.report_job_detail, name="report_job_detail"),
+
+    path("notifications/", views.notification_list, name="notification_list"),
+    path("notifications/unread-count/", views.notification_unread_count, name="notification_unread_count"),
+    path("notifications/mark-read/", views.notification_mark_read, name="notification_mark_read"),
 ]
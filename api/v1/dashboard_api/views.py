@@ -0,0 +1,69 @@
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from api.v1.pagination import paginated_response
+from dashboard import notifications
+from dashboard.jobs import enqueue_report
+from dashboard.models import Notification, ReportJob
+from .serializers import MarkReadSerializer, NotificationSerializer, ReportJobSerializer, ReportRequestSerializer
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def report_create(request):
+    """Queues a collection report and returns its job immediately; poll report_job_detail for the result."""
+    serializer = ReportRequestSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    data = serializer.validated_data
+    job = enqueue_report(data["title"], data["report_type"], data["start_date"], data["end_date"], request.user)
+    return Response(ReportJobSerializer(job, context={"request": request}).data, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def report_job_detail(request, pk):
+    """Status of a report job, with the report data and file once it is done. Staff can see every job."""
+    jobs = ReportJob.objects.select_related("report")
+    if not request.user.is_staff:
+        jobs = jobs.filter(report__generated_by_id=request.user.id)
+    try:
+        job = jobs.get(pk=pk)
+    except ReportJob.DoesNotExist:
+        return Response({"error": "Report job not found"}, status=status.HTTP_404_NOT_FOUND)
+    return Response(ReportJobSerializer(job, context={"request": request}).data, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def notification_list(request):
+    """The user's inbox, newest first and cursor paginated; `?unread=true` for unread only."""
+    inbox = Notification.objects.filter(user=request.user)
+    if request.query_params.get("unread", "").lower() in ("true", "1", "yes"):
+        inbox = inbox.filter(is_read=False)
+    return paginated_response(request, inbox, NotificationSerializer, ordering=("-created_at", "-id"))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def notification_unread_count(request):
+    """Badge count, read from the user's counter row."""
+    return Response({"unread": notifications.unread_count(request.user.id)}, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def notification_mark_read(request):
+    """Marks the given notification ids (or all of them) as read."""
+    serializer = MarkReadSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    ids = None if serializer.validated_data["all"] else serializer.validated_data["ids"]
+    marked = notifications.mark_read(request.user.id, ids)
+    return Response(
+        {"marked": marked, "unread": notifications.unread_count(request.user.id)}, status=status.HTTP_200_OK
+    )
@@ -0,0 +1,113 @@
+"""
+Streaming CSV / XLSX exports shared by the api/v1 endpoints.
+
+Rows are read with `.values_list().iterator(chunk_size=...)`, so the
+database cursor is consumed in chunks and no model instances or full
+result lists are held in memory. CSV is streamed straight into the
+response; XLSX is written by XlsxWriter in `constant_memory` mode (one
+row in memory at a time) to a temporary file that is then streamed. A
+worksheet holds at most XLSX_MAX_ROWS data rows below its header; longer
+exports continue on further worksheets.
+"""
+import csv
+import datetime
+import tempfile
+from decimal import Decimal
+
+import xlsxwriter
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+
+EXPORT_FILE_TYPES = ("csv", "xlsx")
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# Excel's 1,048,576 rows per worksheet, less the header; XlsxWriter silently drops rows beyond it.
+XLSX_MAX_ROWS = 1048575
+
+
+def export_chunk_size():
+    return getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+
+
+class Echo:
+    """File-like object whose write() returns the line, for csv.writer inside a generator."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset, columns):
+    """Yields one tuple per row for the given `(header, lookup)` columns."""
+    lookups = [lookup for _, lookup in columns]
+    return queryset.values_list(*lookups).iterator(chunk_size=export_chunk_size())
+
+
+def localize(value):
+    if isinstance(value, datetime.datetime) and timezone.is_aware(value):
+        return timezone.localtime(value).replace(tzinfo=None)
+    return value
+
+
+def csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, Decimal):
+        # Window and arithmetic annotations are not quantized by every backend.
+        return value.quantize(Decimal("0.01"))
+    return localize(value)
+
+
+def csv_response(queryset, columns, filename):
+    writer = csv.writer(Echo())
+
+    def lines():
+        yield writer.writerow([header for header, _ in columns])
+        for row in export_rows(queryset, columns):
+            yield writer.writerow([csv_value(value) for value in row])
+
+    response = StreamingHttpResponse(lines(), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+def xlsx_response(queryset, columns, filename):
+    output = tempfile.TemporaryFile()
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True})
+    bold = workbook.add_format({"bold": True})
+    money = workbook.add_format({"num_format": "#,##0.00"})
+    day = workbook.add_format({"num_format": "yyyy-mm-dd"})
+    moment = workbook.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"})
+    headers = [header for header, _ in columns]
+
+    worksheet = None
+    for index, row in enumerate(export_rows(queryset, columns)):
+        row_number = index % XLSX_MAX_ROWS + 1
+        if row_number == 1:
+            worksheet = workbook.add_worksheet()
+            worksheet.write_row(0, 0, headers, bold)
+        for column, value in enumerate(row):
+            value = localize(value)
+            if value is None:
+                continue
+            if isinstance(value, Decimal):
+                worksheet.write_number(row_number, column, float(value), money)
+            elif isinstance(value, datetime.datetime):
+                worksheet.write_datetime(row_number, column, value, moment)
+            elif isinstance(value, datetime.date):
+                worksheet.write_datetime(row_number, column, value, day)
+            else:
+                worksheet.write(row_number, column, value)
+    if worksheet is None:
+        workbook.add_worksheet().write_row(0, 0, headers, bold)
+    workbook.close()
+
+    output.seek(0)
+    return FileResponse(output, as_attachment=True, filename=f"{filename}.xlsx", content_type=XLSX_CONTENT_TYPE)
+
+
+def export_response(queryset, columns, filename, file_type):
+    """Exports `queryset` as CSV or XLSX; `columns` is a list of `(header, values_list lookup)` pairs."""
+    if file_type == "xlsx":
+        return xlsx_response(queryset, columns, filename)
+    return csv_response(queryset, columns, filename)
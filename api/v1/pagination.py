@@ -0,0 +1,145 @@
+"""
+Keyset (cursor) pagination shared by the api/v1 list endpoints.
+
+Pages are selected with a WHERE clause on the last row of the previous
+page instead of OFFSET, and no COUNT(*) is issued, so the cost of a page
+does not grow with the size of the table or with how deep the client
+has scrolled.
+"""
+import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+DEFAULT_ORDERING = ("-created_at", "-id")
+
+
+def pagination_setting(name, default):
+    return getattr(settings, "KEYSET_PAGINATION", {}).get(name, default)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginates a queryset on a unique ordering such as (created_at, id).
+
+    Cursors are signed, opaque tokens holding the ordering values of the
+    last row served. Clients pass `?page_size=` to change the page size
+    and legacy clients can pass `?paginate=false` to get the full list.
+    """
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    unpaginated_query_param = "paginate"
+    cursor_salt = "api.v1.pagination"
+
+    def __init__(self, ordering=DEFAULT_ORDERING, page_size=None):
+        self.ordering = tuple(ordering)
+        self.default_page_size = page_size or pagination_setting("PAGE_SIZE", 50)
+        self.max_page_size = pagination_setting("MAX_PAGE_SIZE", 500)
+
+    def is_unpaginated(self, request):
+        return request.query_params.get(self.unpaginated_query_param, "").lower() in ("false", "0", "no")
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.default_page_size))
+        except (TypeError, ValueError):
+            page_size = self.default_page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Returns the rows of the requested page, or None when the client opted out of paging."""
+        if self.is_unpaginated(request):
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+        self.cursor_extra = {}
+
+        queryset = queryset.order_by(*self.ordering)
+        token = request.query_params.get(self.cursor_query_param)
+        if token:
+            queryset = queryset.filter(self.keyset_filter(self.decode_cursor(token)))
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def keyset_filter(self, values):
+        """Builds `(a > x) OR (a = x AND b > y) ...` for the ordering, honouring descending fields."""
+        condition = Q()
+        equal_so_far = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= equal_so_far & Q(**{f"{name}__{lookup}": value})
+            equal_so_far &= Q(**{name: value})
+        return condition
+
+    def row_values(self, row):
+        return [getattr(row, self.model._meta.get_field(field.lstrip("-")).attname) for field in self.ordering]
+
+    def encode_cursor(self, values, **extra):
+        payload = {"k": [encode_value(value) for value in values]}
+        payload.update(extra)
+        return signing.dumps(payload, salt=self.cursor_salt, compress=True)
+
+    def decode_cursor(self, token):
+        try:
+            payload = signing.loads(token, salt=self.cursor_salt)
+            self.cursor_extra = {key: value for key, value in payload.items() if key != "k"}
+            fields = [self.model._meta.get_field(field.lstrip("-")) for field in self.ordering]
+            values = [field.to_python(value) for field, value in zip(fields, payload["k"])]
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            raise NotFound("Invalid cursor")
+        if len(values) != len(self.ordering):
+            raise NotFound("Invalid cursor")
+        return values
+
+    def get_next_cursor(self, **extra):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.row_values(self.page[-1]), **extra)
+
+    def get_next_link(self, **extra):
+        cursor = self.get_next_cursor(**extra)
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data, **extra):
+        return Response({"next": self.get_next_link(), **extra, "results": data}, status=status.HTTP_200_OK)
+
+
+def encode_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def page_response(rows, paginator, serializer_class, context=None):
+    """Serializes `rows`, as the page of `paginator` or as a plain list when `paginator` is None."""
+    serializer = serializer_class(rows, many=True, context=context or {})
+    if paginator is None:
+        return Response(serializer.data, status=status.HTTP_200_OK)
+    return paginator.get_paginated_response(serializer.data)
+
+
+def paginated_response(request, queryset, serializer_class, ordering=DEFAULT_ORDERING, context=None):
+    """Serializes one keyset page of `queryset`, or the whole queryset for `?paginate=false`."""
+    paginator = KeysetPagination(ordering)
+    page = paginator.paginate_queryset(queryset, request)
+    if page is None:
+        return page_response(queryset, None, serializer_class, context)
+    return page_response(page, paginator, serializer_class, context)
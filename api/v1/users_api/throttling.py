@@ -0,0 +1,94 @@
+"""
+Failed-login throttle for the phone-number login endpoint.
+
+Failures are counted per contact number and per client IP over a sliding
+window, in process memory: a throttled attempt is rejected before any
+password hash is computed, without a cache round-trip, so brute-force
+traffic costs a worker next to nothing. Each gunicorn worker keeps its
+own counts, which multiplies the effective limit by the number of workers
+but needs no shared state. A successful login clears the number's
+failures (not the IP's, so one known password does not reset a sweep).
+
+The IP is REMOTE_ADDR, never X-Forwarded-For: that header is set by the
+client, and a new value per attempt would escape the per-IP limit. Behind
+a reverse proxy, the proxy's address is what REMOTE_ADDR holds unless the
+app server is configured to take the real one from the proxy.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+
+from django.conf import settings
+
+
+DEFAULTS = {
+    "WINDOW": 15 * 60,
+    "FAILURES_PER_NUMBER": 5,
+    "FAILURES_PER_IP": 50,
+    "MAX_KEYS": 10000,
+}
+
+
+def throttle_setting(name):
+    return getattr(settings, "LOGIN_THROTTLE", {}).get(name, DEFAULTS[name])
+
+
+class LoginFailureThrottle:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.failures = OrderedDict()
+
+    def keys(self, request, contact_number):
+        return [
+            (f"number:{contact_number}", throttle_setting("FAILURES_PER_NUMBER")),
+            (f"ip:{request.META.get('REMOTE_ADDR')}", throttle_setting("FAILURES_PER_IP")),
+        ]
+
+    def expire(self, history, now):
+        window = throttle_setting("WINDOW")
+        while history and history[0] <= now - window:
+            history.popleft()
+
+    def wait(self, request, contact_number):
+        """Seconds until the next attempt is allowed, or None if it is allowed now."""
+        now = time.monotonic()
+        waits = []
+        with self.lock:
+            for key, limit in self.keys(request, contact_number):
+                history = self.failures.get(key)
+                if not history:
+                    continue
+                self.expire(history, now)
+                if len(history) >= limit:
+                    waits.append(history[-limit] + throttle_setting("WINDOW") - now)
+        return max(waits) if waits else None
+
+    def record_failure(self, request, contact_number):
+        now = time.monotonic()
+        with self.lock:
+            for key, limit in self.keys(request, contact_number):
+                history = self.failures.pop(key, None) or deque(maxlen=limit)
+                self.expire(history, now)
+                history.append(now)
+                self.failures[key] = history
+            # Least recently failed keys go first, so a flood of distinct numbers cannot grow memory unbounded.
+            while len(self.failures) > throttle_setting("MAX_KEYS"):
+                self.failures.popitem(last=False)
+
+    def record_success(self, request, contact_number):
+        with self.lock:
+            self.failures.pop(f"number:{contact_number}", None)
+
+    def reset(self):
+        with self.lock:
+            self.failures.clear()
+
+
+def mask_number(contact_number):
+    """Keeps only the last four digits, for logging."""
+    contact_number = str(contact_number)
+    return "*" * max(len(contact_number) - 4, 0) + contact_number[-4:]
+
+
+login_throttle = LoginFailureThrottle()
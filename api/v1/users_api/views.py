@@ -3,7 +3,8 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from users.models import CustomUser, UserRoles
-from rest_framework_simplejwt.tokens import RefreshToken
+from users import writebehind
+from users.tokens import ClaimsRefreshToken
 from rest_framework.permissions import AllowAny
 from rest_framework.decorators import permission_classes
 from .serializers import LoginSerializer, UserListSerializer,CustomUserSerializer,UserSerializer
@@ -13,10 +14,18 @@ from django.contrib.admin.views.decorators import staff_member_required as admin
 from main.management.commands.create_roles_and_permissions import IsMainAdmin,IsSecondaryAdmin
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.auth import authenticate
+from api.v1.pagination import paginated_response
 
 
 import logging
 
+from rest_framework.exceptions import Throttled
+
+from .throttling import login_throttle, mask_number
+
+
+logger = logging.getLogger(__name__)
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def login_user(request):
@@ -40,40 +49,26 @@ def login_user(request):
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    # Authenticate by phone number
-    # Handle multiple users with same phone number by trying all matches
-    try:
-        users = CustomUser.objects.filter(contact_number=phone_number, is_active=True)
-        
-        user = None
-        for u in users:
-            if u.check_password(password):
-                user = u
-                break
-        
-        # If no match found, try Django's authenticate as fallback
-        if user is None:
-            user = authenticate(username=phone_number, password=password)
-        
-        print("login_user phone_number:", phone_number, "=> user:", user)
-
-        if user is None:
-            return Response(
-                {"detail": "Invalid phone number or password."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-        if not user.is_active:
-            return Response(
-                {"detail": "User account is disabled."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-    except Exception as e:
+    # Throttled attempts are rejected before any password hashing.
+    wait = login_throttle.wait(request, phone_number)
+    if wait is not None:
+        raise Throttled(wait=wait)
+
+    # contact_number is the unique USERNAME_FIELD, so ModelBackend resolves the user with one
+    # indexed query and hashes exactly once, against a dummy hash when the number is unknown
+    # (equal timing), and rejects inactive users only after that hash.
+    user = authenticate(request, contact_number=phone_number, password=password)
+    if user is None:
+        login_throttle.record_failure(request, phone_number)
+        logger.info("Failed login for %s", mask_number(phone_number))
         return Response(
-            {"detail": f"Authentication error: {str(e)}"},
+            {"detail": "Invalid phone number or password."},
             status=status.HTTP_400_BAD_REQUEST,
         )
+    login_throttle.record_success(request, phone_number)
+    writebehind.record_login(user)
 
-    refresh = RefreshToken.for_user(user)
+    refresh = ClaimsRefreshToken.for_user(user)
 
     response_data = {
         'detail': 'Login successful',
@@ -159,8 +154,7 @@ def create_admin_user(request):
 @permission_classes([AllowAny])
 def list_staff_users(request):
     staff_users = CustomUser.objects.filter(is_staff=True)
-    serializer = UserListSerializer(staff_users, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return paginated_response(request, staff_users, UserListSerializer, ordering=("-date_joined", "-id"))
 
 # update staff user
 @api_view(['PUT'])
@@ -10,7 +10,9 @@ echo "Making migrations..."
 python manage.py makemigrations
 
 echo "Applying migrations..."
-python manage.py migrate
+# Databases created before the migrations were committed already have the
+# initial tables; --fake-initial records those as applied instead of failing.
+python manage.py migrate --fake-initial
 
 echo "Creating roles and permissions..."
 python manage.py create_roles_and_permissions
@@ -193,9 +193,11 @@
 
 from pathlib import Path
 import os
+import tempfile
 import dj_database_url
 from dotenv import load_dotenv
 from datetime import timedelta
+from decimal import Decimal
 
 # --------------------------------------------------
 # BASE SETUP
@@ -237,12 +239,14 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
 
     'rest_framework',
+    'rest_framework_simplejwt.token_blacklist',
 
     'main',
     'users',
     'financials',
     'customer',
     'collectionplans',
+    'dashboard',
 ]
 
 # --------------------------------------------------
@@ -250,6 +254,7 @@ INSTALLED_APPS = [
 # --------------------------------------------------
 
 MIDDLEWARE = [
+    'main.middleware.QueryInstrumentationMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -350,6 +355,9 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+MEDIA_URL = 'media/'
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", BASE_DIR / 'media')
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # --------------------------------------------------
@@ -384,3 +392,88 @@ SIMPLE_JWT = {
     "UPDATE_LAST_LOGIN": True,
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
+
+# Write-behind journal for last_login and outstanding/blacklisted token rows (users/writebehind.py).
+# Each process appends to its own segment in JOURNAL_DIR, which must be on local disk and shared
+# by the workers of a host so segments of dead workers are replayed; `flush_auth_writes` drains it.
+# The temp-dir default does not survive a redeploy onto a fresh disk (records of a worker killed
+# before its exit flush are then lost): set AUTH_JOURNAL_DIR to a persistent volume in such setups.
+AUTH_WRITE_BEHIND = {
+    "ENABLED": os.getenv("AUTH_WRITE_BEHIND", "true").lower() == "true",
+    "JOURNAL_DIR": os.getenv("AUTH_JOURNAL_DIR", os.path.join(tempfile.gettempdir(), "paycollection-auth-journal")),
+    "FLUSH_INTERVAL": float(os.getenv("AUTH_JOURNAL_FLUSH_INTERVAL", 2)),
+    "BATCH_SIZE": int(os.getenv("AUTH_JOURNAL_BATCH_SIZE", 500)),
+}
+
+# Seconds a user's active flag, role and is_staff/is_deleted are cached in process by
+# users.authentication.ClaimsJWTAuthentication, i.e. how long a deactivation or role change
+# can take to reach the read endpoints that trust token claims.
+JWT_CLAIMS_STATE_TTL = int(os.getenv("JWT_CLAIMS_STATE_TTL", 60))
+
+# Failed phone-number logins allowed per WINDOW seconds before the login endpoint answers 429
+# (api/v1/users_api/throttling.py). Counted in process memory, per gunicorn worker.
+LOGIN_THROTTLE = {
+    "WINDOW": int(os.getenv("LOGIN_THROTTLE_WINDOW", 15 * 60)),
+    "FAILURES_PER_NUMBER": int(os.getenv("LOGIN_THROTTLE_FAILURES_PER_NUMBER", 5)),
+    "FAILURES_PER_IP": int(os.getenv("LOGIN_THROTTLE_FAILURES_PER_IP", 50)),
+}
+
+# --------------------------------------------------
+# PAGINATION (api/v1/pagination.py)
+# --------------------------------------------------
+
+KEYSET_PAGINATION = {
+    "PAGE_SIZE": int(os.getenv("API_PAGE_SIZE", 50)),
+    "MAX_PAGE_SIZE": int(os.getenv("API_MAX_PAGE_SIZE", 500)),
+}
+
+# Largest number of entries accepted by one agent batch sync request
+CASH_COLLECTION_BATCH_LIMIT = int(os.getenv("CASH_COLLECTION_BATCH_LIMIT", 5000))
+
+# Rows fetched per database round trip by the streaming CSV/XLSX exports
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 2000))
+
+# Background report generation (dashboard/jobs.py, `process_report_jobs` worker)
+REPORT_CHUNK_SIZE = int(os.getenv("REPORT_CHUNK_SIZE", 20000))
+REPORT_JOB_TIMEOUT = int(os.getenv("REPORT_JOB_TIMEOUT", 30 * 60))
+REPORT_JOB_MAX_ATTEMPTS = int(os.getenv("REPORT_JOB_MAX_ATTEMPTS", 3))
+
+# Agent delta sync (collectionplans/sync.py): how far before the previous sync's start changes
+# are re-read, and how long deletions are kept as tombstones.
+SYNC_WATERMARK_OVERLAP = int(os.getenv("SYNC_WATERMARK_OVERLAP", 5 * 60))
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.getenv("SYNC_TOMBSTONE_RETENTION_DAYS", 90))
+
+# Per-request query instrumentation (main/middleware.py). Requests over their budget, or
+# repeating one statement DUPLICATE_THRESHOLD times, are logged at WARNING on
+# `paycollection.requests`; the test suite fails on budget overruns (main/testing.py).
+QUERY_INSTRUMENTATION = {
+    "ENABLED": os.getenv("QUERY_INSTRUMENTATION", "true").lower() == "true",
+    "DUPLICATE_THRESHOLD": int(os.getenv("QUERY_DUPLICATE_THRESHOLD", 5)),
+}
+QUERY_BUDGETS = {
+    "cashcollection_api:cashcollection_list": 1,
+    "cashcollection_api:cash-collection-entry-list": 1,
+    "cashcollection_api:customer-scheme-list": 1,
+    "cashcollection_api:customer-scheme-payments": 2,
+    "cashcollection_api:customer-scheme-payment-groups": 2,
+    "cashcollection_api:customer-transaction-list": 1,
+    "cashcollection_api:collection_list": 3,
+    "cashcollection_api:scheme_list": 1,
+    "cashcollection_api:agent-sync": 8,
+    "partner_api:customer_list": 1,
+    "partner_api:agent-list": 1,
+    "dashboard_api:notification_list": 1,
+}
+
+# Versioned read cache (main/cache.py). The file-based backend is shared by every
+# gunicorn worker on the host, so a version bump in one worker invalidates the others.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", os.path.join(tempfile.gettempdir(), "paycollection-cache")),
+    }
+}
+READ_CACHE_TIMEOUT = int(os.getenv("READ_CACHE_TIMEOUT", 24 * 60 * 60))
+
+# Payments at or above this amount (in rupees) raise a large_transaction notification for the admins
+LARGE_TRANSACTION_THRESHOLD = Decimal(os.getenv("LARGE_TRANSACTION_THRESHOLD", "50000"))
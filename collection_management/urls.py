@@ -14,5 +14,6 @@ urlpatterns = [
     path('api/v1/users/', include(('api.v1.users_api.urls'),namespace='users_api')) , 
     path('api/v1/financials/', include(('api.v1.financials_api.urls'),namespace='financials_api')),
     path('api/v1/partner/', include(('api.v1.customer_api.urls'),namespace='partner_api')),
+    path('api/v1/dashboard/', include(('api.v1.dashboard_api.urls'),namespace='dashboard_api')),
     path('',home,name='home'),
 ]
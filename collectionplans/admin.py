@@ -1,7 +1,8 @@
 from django.contrib import admin
-from .models import CashCollection, Scheme,CashCollectionEntry
+from .models import CashCollection, Scheme,CashCollectionEntry, CashCollectionBalance
 
 # Register your models here.
 admin.site.register(CashCollection)
 admin.site.register(Scheme)
 admin.site.register(CashCollectionEntry)
+admin.site.register(CashCollectionBalance)
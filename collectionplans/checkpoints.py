@@ -0,0 +1,122 @@
+"""
+Daily closing-balance checkpoints for the CollectionEntry daybook.
+
+A checkpoint holds the cumulative credit and debit totals at the close
+of a day. The totals as of any date are read from the nearest checkpoint
+plus the entries after it, instead of aggregating the whole table.
+
+Checkpoints are only written for days before today, so entries added for
+today never touch them. A backdated insert, edit or delete removes the
+checkpoints from that date onwards. Every daybook write then rebuilds the
+missing checkpoints once it commits (see collectionplans.signals), so
+reads never write: they use whatever checkpoints exist and total the
+entries after the latest one.
+
+Invalidation and materialization exclude each other through a PostgreSQL
+advisory lock: otherwise a materializer could total the entries from its
+snapshot, a backdated insert could commit and delete nothing, and the
+materializer would then write checkpoints that miss the new entry.
+Materializers take the lock shared, so they only wait for invalidations,
+not for each other.
+"""
+import datetime
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Sum, Q
+from django.utils import timezone
+
+from collectionplans.models import CollectionBalanceCheckpoint, CollectionEntry
+
+
+# Arbitrary application-wide key of the checkpoint advisory lock.
+CHECKPOINT_LOCK_KEY = 0x44415942
+
+
+def lock(shared=False):
+    """Takes the checkpoint lock until the end of the current transaction."""
+    if connection.vendor != "postgresql":
+        return  # SQLite serializes writers on the whole database already.
+    function = "pg_advisory_xact_lock_shared" if shared else "pg_advisory_xact_lock"
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {function}(%s)", [CHECKPOINT_LOCK_KEY])
+
+
+def invalidate_from(day):
+    """Drops the checkpoints that include entries dated `day` or later."""
+    with transaction.atomic(savepoint=False):
+        lock()
+        CollectionBalanceCheckpoint.objects.filter(date__gte=day).delete()
+
+
+def materialize(until):
+    """
+    Writes the missing checkpoints after the latest one, up to and including
+    `until`, and returns the latest checkpoint on or before `until`.
+    """
+    with transaction.atomic(savepoint=False):
+        # Taken before anything is read, so the totals include every entry whose invalidation has committed.
+        lock(shared=True)
+        return write_checkpoints(until)
+
+
+def materialize_closed_days():
+    """Writes the missing checkpoints up to yesterday; run after a daybook write commits."""
+    materialize(timezone.localdate() - datetime.timedelta(days=1))
+
+
+def write_checkpoints(until):
+    latest = CollectionBalanceCheckpoint.objects.filter(date__lte=until).first()
+    entries = CollectionEntry.objects.filter(date__lte=until)
+    credit = debit = Decimal("0.00")
+    if latest is not None:
+        entries = entries.filter(date__gt=latest.date)
+        credit, debit = latest.total_credit, latest.total_debit
+
+    daily = (
+        entries.order_by()
+        .values("date")
+        .annotate(credit=Sum("amount", filter=Q(type="credit")), debit=Sum("amount", filter=Q(type="debit")))
+        .order_by("date")
+    )
+    checkpoints = []
+    for day in daily:
+        credit += day["credit"] or Decimal("0.00")
+        debit += day["debit"] or Decimal("0.00")
+        checkpoints.append(CollectionBalanceCheckpoint(date=day["date"], total_credit=credit, total_debit=debit))
+
+    # ignore_conflicts: a concurrent request may be materializing the same days.
+    CollectionBalanceCheckpoint.objects.bulk_create(checkpoints, ignore_conflicts=True)
+    return checkpoints[-1] if checkpoints else latest
+
+
+def totals_as_of(day=None):
+    """
+    Returns the cumulative credit, debit and balance of every entry dated
+    up to and including `day` (all entries when `day` is None). Read-only:
+    the latest checkpoint on or before `day` plus the entries after it.
+    """
+    day = day or datetime.date.max
+    checkpoint = CollectionBalanceCheckpoint.objects.filter(date__lte=day).first()
+    entries = CollectionEntry.objects.filter(date__lte=day)
+
+    if checkpoint is None:
+        totals = {"total_credit": Decimal("0.00"), "total_debit": Decimal("0.00")}
+    else:
+        totals = {"total_credit": checkpoint.total_credit, "total_debit": checkpoint.total_debit}
+        entries = entries.filter(date__gt=checkpoint.date)
+
+    # Today's (and future-dated) entries are never checkpointed.
+    tail = entries.totals()
+    totals["total_credit"] += tail["total_credit"]
+    totals["total_debit"] += tail["total_debit"]
+
+    totals["balance"] = totals["total_credit"] - totals["total_debit"]
+    return totals
+
+
+def balance_before(day):
+    """Returns the daybook balance at the opening of `day`."""
+    if day == datetime.date.min:
+        return Decimal("0.00")
+    return totals_as_of(day - datetime.timedelta(days=1))["balance"]
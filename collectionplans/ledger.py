@@ -0,0 +1,207 @@
+"""
+Incremental maintenance of CashCollectionBalance rows.
+
+Every CashCollectionEntry write is turned into a delta against the
+(customer, scheme) balance row instead of re-aggregating the entry table,
+so reads and overpayment checks only ever touch a single row.
+"""
+import operator
+from decimal import Decimal
+from functools import reduce
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from collectionplans.models import CashCollectionBalance, CashCollectionEntry
+
+
+class OverpaymentError(Exception):
+    """Raised when an entry would push a customer + scheme total past the scheme total."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        super().__init__(f"Overpayment detected. The total paid would exceed the scheme total of ₹{limit}.")
+
+
+def get_total_paid(customer_id, scheme_id):
+    """Returns the amount paid so far for a customer + scheme from the ledger row."""
+    total = (
+        CashCollectionBalance.objects
+        .filter(customer_id=customer_id, scheme_id=scheme_id)
+        .values_list("total_paid", flat=True)
+        .first()
+    )
+    return total if total is not None else Decimal("0.00")
+
+
+def ensure_balance(customer_id, scheme_id):
+    """Creates the ledger row for a customer + scheme if it does not exist yet."""
+    try:
+        with transaction.atomic():
+            CashCollectionBalance.objects.get_or_create(customer_id=customer_id, scheme_id=scheme_id)
+    except IntegrityError:
+        # Another request created the row between our lookup and insert.
+        pass
+
+
+def apply_delta(customer_id, scheme_id, amount, count, paid_at=None, limit=None):
+    """
+    Adds `amount` and `count` to the ledger row of a customer + scheme.
+
+    With a `limit`, a positive amount is applied with a conditional UPDATE
+    (`... WHERE total_paid <= limit - amount`). The UPDATE's row lock
+    serializes concurrent payments for the same customer + scheme and the
+    condition is re-checked against the committed total, so two requests
+    can never both pass the overpayment check. OverpaymentError is raised
+    when the condition fails; callers run inside the entry's transaction,
+    which is then rolled back.
+    """
+    if scheme_id is None:
+        return
+
+    updates = {
+        "total_paid": F("total_paid") + amount,
+        "entry_count": F("entry_count") + count,
+        "updated_at": timezone.now(),
+    }
+    if paid_at is not None:
+        updates["last_payment_at"] = Greatest(Coalesce(F("last_payment_at"), paid_at), paid_at)
+
+    balances = CashCollectionBalance.objects.filter(customer_id=customer_id, scheme_id=scheme_id)
+    guarded = balances
+    if limit is not None and amount > 0:
+        guarded = balances.filter(total_paid__lte=limit - amount)
+
+    if guarded.update(**updates):
+        return
+    if guarded is not balances and balances.exists():
+        raise OverpaymentError(limit)
+
+    # No ledger row yet. New entries create it; edits of entries written before the ledger
+    # existed rebuild it. Removals are skipped: the row is already gone (e.g. a cascading
+    # scheme delete) and `rebuild_balances` repairs anything left behind.
+    if count > 0:
+        ensure_balance(customer_id, scheme_id)
+        if not guarded.update(**updates):
+            raise OverpaymentError(limit)
+    elif count == 0:
+        balance = rebuild_balance(customer_id, scheme_id)
+        if limit is not None and amount > 0 and balance.total_paid > limit:
+            raise OverpaymentError(limit)
+
+
+def refresh_last_payment(customer_id, scheme_id):
+    """Recomputes last_payment_at after an entry was removed from a customer + scheme."""
+    latest = (
+        CashCollectionEntry.objects
+        .filter(customer_id=OuterRef("customer_id"), scheme_id=OuterRef("scheme_id"))
+        .order_by()
+        .values("customer_id")
+        .annotate(latest=Max("created_at"))
+        .values("latest")
+    )
+    CashCollectionBalance.objects.filter(customer_id=customer_id, scheme_id=scheme_id).update(
+        last_payment_at=Subquery(latest)
+    )
+
+
+def scheme_limit(entry):
+    return entry.scheme.total_amount if entry.scheme_id is not None else None
+
+
+def entry_saved(entry, created):
+    """Applies a created or updated entry to the ledger, refusing overpayments."""
+    if created:
+        apply_delta(
+            entry.customer_id, entry.scheme_id, entry.amount, 1,
+            paid_at=entry.created_at, limit=scheme_limit(entry),
+        )
+    else:
+        previous = getattr(entry, "_loaded_values", None)
+        if previous is None or "amount" not in previous:
+            rebuild_balance(entry.customer_id, entry.scheme_id)
+        elif (previous["customer_id"], previous["scheme_id"]) == (entry.customer_id, entry.scheme_id):
+            delta = Decimal(entry.amount) - Decimal(previous["amount"])
+            if delta:
+                limit = scheme_limit(entry) if delta > 0 else None
+                apply_delta(entry.customer_id, entry.scheme_id, delta, 0, limit=limit)
+        else:
+            apply_delta(previous["customer_id"], previous["scheme_id"], -Decimal(previous["amount"]), -1)
+            refresh_last_payment(previous["customer_id"], previous["scheme_id"])
+            apply_delta(
+                entry.customer_id, entry.scheme_id, entry.amount, 1,
+                paid_at=entry.created_at, limit=scheme_limit(entry),
+            )
+
+
+def entry_deleted(entry):
+    """Removes a deleted entry from the ledger."""
+    previous = getattr(entry, "_loaded_values", None) or {}
+    customer_id = previous.get("customer_id", entry.customer_id)
+    scheme_id = previous.get("scheme_id", entry.scheme_id)
+    amount = Decimal(previous.get("amount", entry.amount))
+
+    apply_delta(customer_id, scheme_id, -amount, -1)
+    refresh_last_payment(customer_id, scheme_id)
+
+
+def rebuild_balance(customer_id, scheme_id):
+    """Recomputes a single ledger row from the entry table."""
+    if scheme_id is None:
+        return
+    entries = CashCollectionEntry.objects.filter(customer_id=customer_id, scheme_id=scheme_id)
+    totals = entries.aggregate(total=Sum("amount"), count=Count("id"), latest=Max("created_at"))
+    balance, _ = CashCollectionBalance.objects.update_or_create(
+        customer_id=customer_id,
+        scheme_id=scheme_id,
+        defaults={
+            "total_paid": totals["total"] or Decimal("0.00"),
+            "entry_count": totals["count"],
+            "last_payment_at": totals["latest"],
+        },
+    )
+    return balance
+
+
+def lock_balances(pairs):
+    """
+    Returns the ledger rows of the given (customer_id, scheme_id) pairs keyed
+    by pair, creating missing rows and locking all of them for the rest of
+    the surrounding transaction.
+    """
+    pairs = sorted({(customer_id, scheme_id) for customer_id, scheme_id in pairs if scheme_id is not None})
+    if not pairs:
+        return {}
+
+    CashCollectionBalance.objects.bulk_create(
+        [CashCollectionBalance(customer_id=customer_id, scheme_id=scheme_id) for customer_id, scheme_id in pairs],
+        ignore_conflicts=True,
+    )
+    # Only the exact pairs, locked in pk order so concurrent batches cannot deadlock on each other.
+    rows = CashCollectionBalance.objects.select_for_update().filter(
+        reduce(operator.or_, (Q(customer_id=customer_id, scheme_id=scheme_id) for customer_id, scheme_id in pairs))
+    ).order_by("pk")
+    return {(row.customer_id, row.scheme_id): row for row in rows}
+
+
+def apply_bulk(balances, entries):
+    """
+    Adds bulk-created entries (which bypass the post_save handlers) to the
+    ledger rows returned by lock_balances() with a single bulk_update.
+    """
+    now = timezone.now()
+    touched = {}
+    for entry in entries:
+        balance = balances[(entry.customer_id, entry.scheme_id)]
+        balance.total_paid += Decimal(entry.amount)
+        balance.entry_count += 1
+        if balance.last_payment_at is None or entry.created_at > balance.last_payment_at:
+            balance.last_payment_at = entry.created_at
+        balance.updated_at = now
+        touched[balance.pk] = balance
+
+    CashCollectionBalance.objects.bulk_update(
+        touched.values(), ["total_paid", "entry_count", "last_payment_at", "updated_at"], batch_size=1000
+    )
@@ -0,0 +1,64 @@
+# Generated by Django 5.1.5 on 2026-10-18 11:34
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+BACKFILL_CHUNK_SIZE = 1000
+
+
+def backfill_balances(apps, schema_editor):
+    """Fills the new ledger from the payments recorded so far, one chunk of customers at a time."""
+    CashCollectionBalance = apps.get_model('collectionplans', 'CashCollectionBalance')
+    CashCollectionEntry = apps.get_model('collectionplans', 'CashCollectionEntry')
+    Customer = apps.get_model('customer', 'Customer')
+
+    last_id = 0
+    while True:
+        customer_ids = list(
+            Customer.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:BACKFILL_CHUNK_SIZE]
+        )
+        if not customer_ids:
+            break
+        last_id = customer_ids[-1]
+        totals = (
+            CashCollectionEntry.objects.filter(customer_id__in=customer_ids, scheme__isnull=False).order_by()
+            .values('customer_id', 'scheme_id')
+            .annotate(total=Sum('amount'), count=Count('id'), latest=Max('created_at'))
+        )
+        CashCollectionBalance.objects.bulk_create([
+            CashCollectionBalance(
+                customer_id=row['customer_id'], scheme_id=row['scheme_id'],
+                total_paid=row['total'] or Decimal('0.00'), entry_count=row['count'], last_payment_at=row['latest'],
+            )
+            for row in totals
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collectionplans', '0002_initial'),
+        ('customer', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CashCollectionBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_paid', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('entry_count', models.PositiveIntegerField(default=0)),
+                ('last_payment_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scheme_balances', to='customer.customer')),
+                ('scheme', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='collectionplans.scheme')),
+            ],
+            options={
+                'unique_together': {('customer', 'scheme')},
+            },
+        ),
+        migrations.RunPython(backfill_balances, migrations.RunPython.noop),
+    ]
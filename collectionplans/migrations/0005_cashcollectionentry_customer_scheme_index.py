@@ -0,0 +1,20 @@
+# Generated by Django 5.1.5 on 2026-10-18 11:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collectionplans', '0004_collectionbalancecheckpoint'),
+        ('customer', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cashcollectionentry',
+            index=models.Index(fields=['customer', 'scheme', 'created_at'], name='collectionp_custome_de11fd_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.5 on 2026-10-18 11:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collectionplans', '0005_cashcollectionentry_customer_scheme_index'),
+        ('customer', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(choices=[('scheme', 'Scheme'), ('customer', 'Customer'), ('enrollment', 'Cash collection'), ('entry', 'Cash collection entry')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('customer_id', models.BigIntegerField(blank=True, null=True)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='cashcollectionentry',
+            index=models.Index(fields=['customer', 'updated_at'], name='collectionp_custome_7408c9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='synctombstone',
+            index=models.Index(fields=['deleted_at'], name='collectionp_deleted_8a7d97_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='synctombstone',
+            index=models.Index(fields=['customer_id', 'deleted_at'], name='collectionp_custome_c07eb7_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.5 on 2026-10-18 11:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collectionplans', '0006_synctombstone_and_more'),
+        ('customer', '0002_customerassignment_agent_active_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cashcollection',
+            index=models.Index(fields=['scheme', 'customer'], name='collectionp_scheme__6c3972_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cashcollectionentry',
+            index=models.Index(fields=['created_at', 'id'], name='collectionp_created_97fef6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='collectionentry',
+            index=models.Index(fields=['date', 'created_at', 'id'], name='collectionp_date_c2bcaf_idx'),
+        ),
+    ]
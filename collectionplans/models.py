@@ -1,4 +1,8 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Case, DecimalField, F, OuterRef, RowRange, Subquery, Sum, When, Window
+from django.db.models.functions import Coalesce
 from customer.models import Customer
 from users.models import CustomUser
 from financials.models import Transaction
@@ -38,6 +42,22 @@ class Scheme(models.Model):
         return self.name
 
 
+class CashCollectionQuerySet(models.QuerySet):
+
+    def with_balances(self):
+        """Annotates each enrollment with the amount paid, read from its CashCollectionBalance row."""
+        paid = CashCollectionBalance.objects.filter(
+            customer=OuterRef("customer"), scheme=OuterRef("scheme")
+        ).values("total_paid")[:1]
+        return self.select_related("scheme", "customer__user").annotate(
+            paid_amount=Coalesce(
+                Subquery(paid, output_field=DecimalField(max_digits=12, decimal_places=2)),
+                Decimal("0.00"),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            )
+        )
+
+
 class CashCollection(models.Model):
     scheme = models.ForeignKey(Scheme, on_delete=models.CASCADE, null=True, blank=True, related_name="collections")
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name="cash_collections")
@@ -50,6 +70,14 @@ class CashCollection(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CashCollectionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # "Is this customer enrolled in this scheme?" checks and per-scheme enrollment lists.
+            models.Index(fields=["scheme", "customer"]),
+        ]
+
     def __str__(self):
         return f"{self.scheme.name} Collection ({self.start_date} - {self.end_date})"
     
@@ -78,10 +106,51 @@ class CashCollectionEntry(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Per-enrollment payment history in date order (ledger rebuilds, FIFO schedule allocation).
+            models.Index(fields=["customer", "scheme", "created_at"]),
+            # Delta sync: an agent's customers' entries changed since a watermark.
+            models.Index(fields=["customer", "updated_at"]),
+            # Newest-first entry lists and their keyset cursor (api/v1/pagination.py DEFAULT_ORDERING).
+            models.Index(fields=["created_at", "id"]),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Keep the persisted values so the balance ledger can apply deltas on update/delete.
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Saves inside a transaction so the balance ledger commits or rolls back with the entry."""
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        # The post_save receivers have diffed against the previous values; the next save diffs against these.
+        self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
+
     def __str__(self):
         return f"{self.customer.user.username} - {self.amount}"
 
 
+class CashCollectionBalance(models.Model):
+    """Materialized payment totals per customer + scheme enrollment, kept current by collectionplans.ledger."""
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name="scheme_balances")
+    scheme = models.ForeignKey(Scheme, on_delete=models.CASCADE, related_name="balances")
+    total_paid = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+    entry_count = models.PositiveIntegerField(default=0)
+    last_payment_at = models.DateTimeField(null=True, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("customer", "scheme")
+
+    def __str__(self):
+        return f"{self.customer_id} / {self.scheme_id} - {self.total_paid}"
+
+
 class CashFlow(models.Model):
     balance_type = models.CharField(max_length=50, choices=[("bank", "Bank"), ("hand_cash", "Hand Cash")])
     total_balance = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)
@@ -117,6 +186,47 @@ from django.contrib.auth import get_user_model
 
 CustomUser = get_user_model()
 
+DAYBOOK_ORDERING = ("date", "created_at", "id")
+
+
+class CollectionEntryQuerySet(models.QuerySet):
+    """Daybook queries. Credits count positive and debits negative towards the balance."""
+
+    @staticmethod
+    def signed_amount():
+        return Case(
+            When(type="debit", then=-F("amount")),
+            default=F("amount"),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        )
+
+    def balance(self):
+        """Returns credits minus debits over the queryset in a single aggregate."""
+        totals = self.totals()
+        return totals["total_credit"] - totals["total_debit"]
+
+    def totals(self):
+        """Returns the credit and debit totals over the queryset in a single aggregate."""
+        return self.aggregate(**{
+            f"total_{kind}": Coalesce(
+                Sum("amount", filter=models.Q(type=kind)),
+                Decimal("0.00"),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            )
+            for kind in ("credit", "debit")
+        })
+
+    def with_running_total(self):
+        """Annotates `running_balance`, the window SUM of the filtered rows in daybook order."""
+        return self.annotate(
+            running_balance=Window(
+                Sum(self.signed_amount()),
+                order_by=[F(field).asc() for field in DAYBOOK_ORDERING],
+                frame=RowRange(start=None, end=0),
+            )
+        )
+
+
 class CollectionEntry(models.Model):
     """Model for tracking credit and debit collection entries"""
     
@@ -150,11 +260,79 @@ class CollectionEntry(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CollectionEntryQuerySet.as_manager()
     
     class Meta:
         ordering = ['-date', '-created_at']
         verbose_name = "Collection Entry"
         verbose_name_plural = "Collection Entries"
+        indexes = [
+            # Daybook pages, date filters and running balances (DAYBOOK_ORDERING).
+            models.Index(fields=["date", "created_at", "id"]),
+        ]
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Keep the persisted date so backdated edits can invalidate the right checkpoints.
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Saves inside a transaction so checkpoint invalidation commits with the entry."""
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.type.capitalize()} - {self.amount} on {self.date}"
+
+
+class CollectionBalanceCheckpoint(models.Model):
+    """Cumulative daybook totals at the close of `date`, maintained by collectionplans.checkpoints."""
+    date = models.DateField(unique=True)
+    total_credit = models.DecimalField(max_digits=14, decimal_places=2)
+    total_debit = models.DecimalField(max_digits=14, decimal_places=2)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-date"]
+
+    @property
+    def closing_balance(self):
+        return self.total_credit - self.total_debit
+
+    def __str__(self):
+        return f"{self.date} - {self.closing_balance}"
+
+class SyncTombstone(models.Model):
+    """A deleted row, kept so offline agent apps can drop their copy on the next delta sync (collectionplans.sync)."""
+    SCHEME = "scheme"
+    CUSTOMER = "customer"
+    ENROLLMENT = "enrollment"
+    ENTRY = "entry"
+    MODEL_CHOICES = [
+        (SCHEME, "Scheme"),
+        (CUSTOMER, "Customer"),
+        (ENROLLMENT, "Cash collection"),
+        (ENTRY, "Cash collection entry"),
+    ]
+
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    # Plain ids: the customer row is usually gone by the time its tombstone is read.
+    customer_id = models.BigIntegerField(null=True, blank=True)
+    # Customer tombstones only: the agent the customer was assigned to, one tombstone per agent.
+    agent_id = models.BigIntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["deleted_at"]),
+            models.Index(fields=["customer_id", "deleted_at"]),
+            models.Index(fields=["agent_id", "deleted_at"]),
+        ]
+
     def __str__(self):
-        return f"{self.type.capitalize()} - {self.amount} on {self.date}"
\ No newline at end of file
+        return f"{self.model} {self.object_id} deleted at {self.deleted_at}"
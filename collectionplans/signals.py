@@ -0,0 +1,46 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from collectionplans import checkpoints, ledger, sync
+from collectionplans.models import CashCollection, CashCollectionEntry, CollectionEntry, Scheme
+from customer.models import Customer
+from users.models import CustomUser
+
+
+@receiver(post_save, sender=CashCollectionEntry)
+def update_balance_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    ledger.entry_saved(instance, created)
+
+
+@receiver(post_delete, sender=CashCollectionEntry)
+def update_balance_on_delete(sender, instance, **kwargs):
+    ledger.entry_deleted(instance)
+
+
+@receiver(post_save, sender=CollectionEntry)
+def invalidate_checkpoints_on_save(sender, instance, created, raw=False, **kwargs):
+    # The date may still be the string it was assigned as; compare it as a date.
+    to_date = CollectionEntry._meta.get_field("date").to_python
+    new_date = to_date(instance.date)
+    previous_date = to_date(getattr(instance, "_loaded_values", {}).get("date", new_date))
+    checkpoints.invalidate_from(min(previous_date, new_date))
+    instance._loaded_values = {"date": new_date}
+    transaction.on_commit(checkpoints.materialize_closed_days)
+
+
+@receiver(post_delete, sender=CollectionEntry)
+def invalidate_checkpoints_on_delete(sender, instance, **kwargs):
+    checkpoints.invalidate_from(getattr(instance, "_loaded_values", {}).get("date", instance.date))
+    transaction.on_commit(checkpoints.materialize_closed_days)
+
+
+# Hard deletes (including cascades) leave a tombstone for the agent apps' delta sync.
+for model in (Scheme, Customer, CashCollection, CashCollectionEntry):
+    post_delete.connect(sync.record_deletion, sender=model, dispatch_uid=f"sync-tombstone:{model._meta.label}")
+pre_delete.connect(sync.remember_agents, sender=Customer, dispatch_uid="sync-tombstone-agents")
+
+# Customer rows embed their user's name and phone, which are edited on CustomUser.
+post_save.connect(sync.touch_customer, sender=CustomUser, dispatch_uid="sync-touch-customer")
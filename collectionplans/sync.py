@@ -0,0 +1,236 @@
+"""
+Delta sync feed for the offline agent apps.
+
+A sync returns the schemes, and the customers, enrollments and entries of
+the agent's actively assigned customers, that changed after the client's
+watermark, plus SyncTombstone rows for what was deleted in the meantime.
+The rows of a customer assigned to the agent (or restored) since the
+watermark are sent in full, and customers whose assignment was withdrawn
+or who were soft-deleted are listed so the app can drop them.
+
+The watermark is a signed token holding the time the previous sync
+started. Changes are read from SYNC_WATERMARK_OVERLAP seconds before it,
+so rows committed by transactions that were still open at that moment
+are not missed; clients apply rows by id and ignore repeats. Each section
+is paginated by id on a fixed predicate, so rows changed while a client
+pages through a sync are picked up by the next one. Watermarks older
+than SYNC_TOMBSTONE_RETENTION_DAYS may have lost tombstones to pruning,
+so they get a full sync flagged with `reset`.
+"""
+import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from collectionplans.models import CashCollection, CashCollectionBalance, CashCollectionEntry, Scheme, SyncTombstone
+from customer.models import Customer, CustomerAssignment
+
+
+WATERMARK_SALT = "collectionplans.sync.watermark"
+CURSOR_SALT = "collectionplans.sync.cursor"
+
+SECTIONS = ("schemes", "customers", "enrollments", "entries", "deleted")
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def watermark_overlap():
+    return datetime.timedelta(seconds=getattr(settings, "SYNC_WATERMARK_OVERLAP", 5 * 60))
+
+
+def tombstone_retention():
+    return datetime.timedelta(days=getattr(settings, "SYNC_TOMBSTONE_RETENTION_DAYS", 90))
+
+
+# Tombstones -------------------------------------------------------------------------------
+
+def tombstones_for(instance):
+    if isinstance(instance, Scheme):
+        return [SyncTombstone(model=SyncTombstone.SCHEME, object_id=instance.pk)]
+    if isinstance(instance, Customer):
+        return [
+            SyncTombstone(
+                model=SyncTombstone.CUSTOMER, object_id=instance.pk, customer_id=instance.pk, agent_id=agent_id,
+            )
+            for agent_id in getattr(instance, "_sync_agent_ids", ())
+        ]
+    if isinstance(instance, CashCollection):
+        return [SyncTombstone(model=SyncTombstone.ENROLLMENT, object_id=instance.pk, customer_id=instance.customer_id)]
+    return [SyncTombstone(model=SyncTombstone.ENTRY, object_id=instance.pk, customer_id=instance.customer_id)]
+
+
+def remember_agents(sender, instance, **kwargs):
+    """
+    Notes the agents a customer is assigned to before it is deleted. The
+    assignments are cascade-deleted with the customer, so by post_delete
+    there is nothing left to scope its tombstones by.
+    """
+    instance._sync_agent_ids = sorted(set(
+        CustomerAssignment.objects.filter(customer=instance).values_list("agent_id", flat=True)
+    ))
+
+
+def record_deletion(sender, instance, **kwargs):
+    SyncTombstone.objects.bulk_create(tombstones_for(instance))
+
+
+def touch_customer(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Moves the updated_at of a saved user's customer profile, so edits of
+    the user fields a customer row carries (name, phone) reach the delta
+    sync. CustomUser has no updated_at of its own.
+    """
+    if raw or (update_fields is not None and set(update_fields) <= {"last_login"}):
+        return
+    Customer.objects.filter(user=instance).update(updated_at=timezone.now())
+
+
+def prune_tombstones(now=None):
+    """Deletes tombstones older than the retention period; returns the number removed."""
+    cutoff = (now or timezone.now()) - tombstone_retention()
+    deleted, _ = SyncTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
+
+
+# Tokens -----------------------------------------------------------------------------------
+
+def encode_watermark(moment):
+    return signing.dumps({"t": moment.isoformat()}, salt=WATERMARK_SALT)
+
+
+def decode_watermark(token):
+    try:
+        moment = parse_datetime(signing.loads(token, salt=WATERMARK_SALT)["t"])
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        raise InvalidToken("Invalid watermark")
+    if moment is None:
+        raise InvalidToken("Invalid watermark")
+    return moment
+
+
+def encode_cursor(since, started_at, positions):
+    payload = {
+        "s": since and since.isoformat(),
+        "w": started_at.isoformat(),
+        "p": positions,
+    }
+    return signing.dumps(payload, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token):
+    try:
+        payload = signing.loads(token, salt=CURSOR_SALT)
+        since = parse_datetime(payload["s"]) if payload["s"] else None
+        started_at = parse_datetime(payload["w"])
+        positions = {name: int(value) for name, value in payload["p"].items() if name in SECTIONS}
+    except (signing.BadSignature, KeyError, TypeError, ValueError, AttributeError):
+        raise InvalidToken("Invalid cursor")
+    if started_at is None:
+        raise InvalidToken("Invalid cursor")
+    return since, started_at, positions
+
+
+# Feed -------------------------------------------------------------------------------------
+
+def assigned_customers(agent):
+    return CustomerAssignment.objects.filter(
+        agent=agent, is_active=True, customer__user__is_deleted=False
+    ).values("customer_id")
+
+
+def revoked_customer_ids(agent, since):
+    """
+    Customers the app should drop: those whose assignment to `agent` was
+    withdrawn after `since` and those soft-deleted since then.
+    """
+    if since is None:
+        return []
+    withdrawn = CustomerAssignment.objects.filter(agent=agent, is_active=False, updated_at__gt=since).values("customer_id")
+    soft_deleted = CustomerAssignment.objects.filter(
+        agent=agent, is_active=True, customer__user__is_deleted=True, customer__updated_at__gt=since,
+    ).values("customer_id")
+    return list(
+        Customer.objects.filter(Q(id__in=withdrawn) | Q(id__in=soft_deleted))
+        .exclude(id__in=assigned_customers(agent))
+        .order_by("id").values_list("id", flat=True)
+    )
+
+
+def section_querysets(agent, since):
+    """Returns the unordered queryset of changed rows for every section."""
+    customers = assigned_customers(agent)
+    querysets = {
+        "schemes": Scheme.objects.all(),
+        "customers": Customer.objects.filter(id__in=customers).select_related("user"),
+        "enrollments": CashCollection.objects.with_balances().filter(customer_id__in=customers),
+        "entries": CashCollectionEntry.objects.filter(customer_id__in=customers).select_related(
+            "customer__user", "scheme", "created_by", "updated_by"
+        ),
+        # A deleted customer's assignments are gone with it; its tombstones carry the agents instead.
+        # Those recorded before agent_id existed have none and still go to every agent.
+        "deleted": SyncTombstone.objects.filter(
+            Q(customer_id__in=customers)
+            | Q(model=SyncTombstone.SCHEME)
+            | Q(model=SyncTombstone.CUSTOMER, agent_id=getattr(agent, "pk", agent))
+            | Q(model=SyncTombstone.CUSTOMER, agent_id__isnull=True)
+        ),
+    }
+    if since is None:
+        querysets["deleted"] = SyncTombstone.objects.none()
+        return querysets
+
+    new_customers = CustomerAssignment.objects.filter(
+        agent=agent, is_active=True, customer__user__is_deleted=False, updated_at__gt=since,
+    ).values("customer_id")
+    balance_changed = Exists(CashCollectionBalance.objects.filter(
+        customer_id=OuterRef("customer_id"), scheme_id=OuterRef("scheme_id"), updated_at__gt=since,
+    ))
+    querysets["schemes"] = querysets["schemes"].filter(updated_at__gt=since)
+    querysets["customers"] = querysets["customers"].filter(Q(updated_at__gt=since) | Q(id__in=new_customers))
+    querysets["enrollments"] = querysets["enrollments"].filter(
+        Q(updated_at__gt=since) | Q(customer_id__in=new_customers) | balance_changed
+    )
+    querysets["entries"] = querysets["entries"].filter(Q(updated_at__gt=since) | Q(customer_id__in=new_customers))
+    querysets["deleted"] = querysets["deleted"].filter(deleted_at__gt=since)
+    return querysets
+
+
+def start(watermark=None, now=None):
+    """
+    Resolves a client's watermark token into (since, started_at, reset):
+    the lower bound of the changes to send (None for a full sync), the
+    moment that becomes the next watermark and whether the client must
+    drop its local data first.
+    """
+    now = now or timezone.now()
+    if not watermark:
+        return None, now, False
+    previous = decode_watermark(watermark)
+    if previous < now - tombstone_retention():
+        return None, now, True
+    return previous - watermark_overlap(), now, False
+
+
+def page(agent, since, positions, page_size):
+    """
+    Reads one page of every unfinished section for `agent` (the agent user
+    or its pk). `positions` maps a section to the last id served (0 before
+    the first page); finished sections are absent. Returns the rows per
+    section and the positions for the next page, or None when every section
+    is exhausted.
+    """
+    rows, next_positions = {}, {}
+    for name, queryset in section_querysets(agent, since).items():
+        if name not in positions:
+            rows[name] = []
+            continue
+        batch = list(queryset.filter(id__gt=positions[name]).order_by("id")[:page_size + 1])
+        rows[name] = batch[:page_size]
+        if len(batch) > page_size:
+            next_positions[name] = rows[name][-1].id
+    return rows, next_positions or None
@@ -1,3 +1,992 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+import openpyxl
+from django.conf import settings
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.v1 import conditional
+from collectionplans import checkpoints, ledger, sync
+from collectionplans.models import (
+    DAYBOOK_ORDERING, CashCollection, CashCollectionBalance, CashCollectionEntry, CollectionBalanceCheckpoint,
+    CollectionEntry, Scheme,
+)
+from customer.models import Agent, Customer, CustomerAssignment
+from main import cache as read_cache
+from main.management.commands.rebuild_balances import Command as RebuildBalances
+from main.middleware import QueryStats
+from main.testing import QueryBudgetMixin
+from users.models import CustomUser, UserRoles
+
+
+class CollectionTestMixin:
+    """Small factory helpers shared by the collection plan tests."""
+
+    def make_user(self, contact_number, **extra_fields):
+        return CustomUser.objects.create_user(contact_number, password="pw", **extra_fields)
+
+    def make_customer(self, index):
+        user = self.make_user(f"90000{index:05d}", first_name="Customer", last_name=str(index),
+                              role=UserRoles.CUSTOMER)
+        return Customer.objects.create(user=user, shop_name=f"Shop {index}")
+
+    def make_scheme(self, index=1, total_amount="1000.00", installment_amount="100.00"):
+        return Scheme.objects.create(
+            scheme_number=f"S-{index}",
+            name=f"Scheme {index}",
+            total_amount=Decimal(total_amount),
+            installment_amount=Decimal(installment_amount),
+            collection_frequency="daily",
+            start_date=date(2025, 1, 1),
+            end_date=date(2025, 12, 31),
+        )
+
+    def enroll(self, customer, scheme):
+        return CashCollection.objects.create(
+            customer=customer, scheme=scheme,
+            start_date=scheme.start_date, end_date=scheme.end_date,
+        )
+
+    def pay(self, customer, scheme, amount, **extra_fields):
+        return CashCollectionEntry.objects.create(
+            customer=customer, scheme=scheme, amount=Decimal(amount), **extra_fields
+        )
+
+
+class CashCollectionBalanceTests(CollectionTestMixin, TestCase):
+
+    def setUp(self):
+        self.admin = self.make_user("9999999999", role=UserRoles.ADMIN, is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.scheme = self.make_scheme(total_amount="1000.00", installment_amount="100.00")
+
+    def seed(self, count):
+        for index in range(CashCollection.objects.count(), CashCollection.objects.count() + count):
+            customer = self.make_customer(index)
+            self.enroll(customer, self.scheme)
+            self.pay(customer, self.scheme, "100.10")
+            self.pay(customer, self.scheme, "200.20")
+
+    def test_list_returns_exact_decimal_balances(self):
+        self.seed(1)
+        response = self.client.get(reverse("cashcollection_api:cashcollection_list"))
+
+        row = response.data["results"][0]
+        self.assertEqual(row["total_paid"], Decimal("300.30"))
+        self.assertEqual(row["remaining_amount"], Decimal("699.70"))
+        self.assertEqual(row["payment_progress"], Decimal("30.03"))
+        self.assertEqual(row["installments_paid"], 3)
+        self.assertEqual(row["installments_remaining"], 7)
+
+    def test_list_query_count_is_independent_of_row_count(self):
+        url = reverse("cashcollection_api:cashcollection_list")
+        self.seed(2)
+        # Just the page: the ETag is built from the rows it returns.
+        with self.assertNumQueries(1):
+            self.client.get(url)
+
+        self.seed(10)
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data["results"]), 12)
+
+    def test_customer_schemes_query_count_is_independent_of_row_count(self):
+        url = reverse("cashcollection_api:customer-scheme-list")
+        self.seed(3)
+        # Just the page: the ETag is built from the rows it returns.
+        with self.assertNumQueries(1):
+            self.client.get(url, {"scheme": self.scheme.id})
+
+        self.seed(9)
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {"scheme": self.scheme.id})
+        self.assertEqual(len(response.data["results"]), 12)
+
+
+class CashCollectionLedgerTests(CollectionTestMixin, TestCase):
+
+    def setUp(self):
+        self.admin = self.make_user("9999999999", role=UserRoles.ADMIN, is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.scheme = self.make_scheme(total_amount="1000.00")
+        self.customer = self.make_customer(1)
+        self.enroll(self.customer, self.scheme)
+
+    def balance(self):
+        return CashCollectionBalance.objects.get(customer=self.customer, scheme=self.scheme)
+
+    def create_entry(self, amount):
+        return self.client.post(
+            reverse("cashcollection_api:cash-collection-entry"),
+            {"customer": self.customer.id, "scheme": self.scheme.id, "amount": amount},
+        )
+
+    def test_balance_follows_create_update_and_delete(self):
+        first = self.create_entry("400.00").data
+        self.create_entry("250.00")
+        self.assertEqual((self.balance().total_paid, self.balance().entry_count), (Decimal("650.00"), 2))
+
+        self.client.patch(
+            reverse("cashcollection_api:customer-transaction-update", args=[first["id"]]), {"amount": "300.00"}
+        )
+        self.assertEqual((self.balance().total_paid, self.balance().entry_count), (Decimal("550.00"), 2))
+
+        self.client.delete(reverse("cashcollection_api:cash-collection-entry-delete", args=[first["id"]]))
+        balance = self.balance()
+        self.assertEqual((balance.total_paid, balance.entry_count), (Decimal("250.00"), 1))
+        self.assertEqual(balance.last_payment_at, CashCollectionEntry.objects.get().created_at)
+
+    def test_overpayment_is_rejected_from_the_ledger(self):
+        self.create_entry("900.00")
+        with self.assertNumQueries(3):
+            response = self.create_entry("200.00")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.balance().total_paid, Decimal("900.00"))
+
+    def test_rebuild_balances_reports_and_repairs_drift(self):
+        self.create_entry("400.00")
+        stale = timezone.now() - timedelta(days=1)
+        CashCollectionBalance.objects.update(total_paid=Decimal("1.00"), updated_at=stale)
+
+        out = StringIO()
+        call_command("rebuild_balances", "--dry-run", stdout=out)
+        self.assertIn("1 mismatched", out.getvalue())
+        self.assertEqual(self.balance().total_paid, Decimal("1.00"))
+
+        call_command("rebuild_balances", "--chunk-size", "1", stdout=out)
+        self.assertEqual(self.balance().total_paid, Decimal("400.00"))
+        self.assertGreater(self.balance().updated_at, stale)
+
+    def test_rebuild_balances_tolerates_a_payment_creating_a_missing_row(self):
+        self.create_entry("400.00")
+        CashCollectionBalance.objects.all().delete()
+        entry_totals = RebuildBalances.entry_totals
+
+        def scan_then_pay(command, customer_ids):
+            totals = entry_totals(command, customer_ids)
+            if not CashCollectionBalance.objects.exists():
+                # A payment lands after the scan and creates the row the command is about to insert.
+                self.create_entry("100.00")
+            return totals
+
+        with mock.patch.object(RebuildBalances, "entry_totals", scan_then_pay):
+            call_command("rebuild_balances", stdout=StringIO())
+        self.assertEqual((self.balance().total_paid, self.balance().entry_count), (Decimal("500.00"), 2))
+
+
+class ConcurrentOverpaymentTests(CollectionTestMixin, TransactionTestCase):
+    """Races many writers against one enrollment; the ledger's conditional update must hold the limit."""
+
+    threads = 8
+    attempts_per_thread = 10
+
+    def setUp(self):
+        self.scheme = self.make_scheme(total_amount="1000.00")
+        self.customer = self.make_customer(1)
+        self.enroll(self.customer, self.scheme)
+
+    def write_entries(self, barrier, outcomes):
+        barrier.wait()
+        try:
+            for _ in range(self.attempts_per_thread):
+                while True:
+                    try:
+                        # The serializer pre-check is skipped on purpose: every writer would pass it.
+                        self.pay(self.customer, self.scheme, "30.00")
+                        outcomes.append("accepted")
+                    except ledger.OverpaymentError:
+                        outcomes.append("rejected")
+                    except OperationalError:
+                        # SQLite serializes writers with "database is locked"; retry like a client would.
+                        time.sleep(0.001)
+                        continue
+                    break
+        finally:
+            connection.close()
+
+    def test_concurrent_entries_never_overpay(self):
+        barrier = threading.Barrier(self.threads)
+        outcomes = []
+        workers = [
+            threading.Thread(target=self.write_entries, args=(barrier, outcomes)) for _ in range(self.threads)
+        ]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        total = sum(entry.amount for entry in CashCollectionEntry.objects.filter(scheme=self.scheme))
+        balance = CashCollectionBalance.objects.get(customer=self.customer, scheme=self.scheme)
+        self.assertEqual(outcomes.count("accepted"), 33)
+        self.assertEqual(len(outcomes), self.threads * self.attempts_per_thread)
+        self.assertEqual(total, Decimal("990.00"))
+        self.assertEqual((balance.total_paid, balance.entry_count), (Decimal("990.00"), 33))
+        print(f"\n{len(outcomes)} contended entries in {elapsed:.2f}s ({len(outcomes) / elapsed:.0f} entries/sec)")
+
+
+class KeysetPaginationTests(CollectionTestMixin, TestCase):
+
+    def setUp(self):
+        self.admin = self.make_user("9999999999", role=UserRoles.ADMIN, is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        scheme = self.make_scheme(total_amount="100000.00")
+        customer = self.make_customer(1)
+        self.entry_ids = [self.pay(customer, scheme, "10.00").id for _ in range(7)]
+        # Identical timestamps force the id tie-breaker to do the work.
+        CashCollectionEntry.objects.update(created_at=CashCollectionEntry.objects.first().created_at)
+        self.url = reverse("cashcollection_api:cash-collection-entry-list")
+
+    def test_cursor_walks_every_row_once_in_order(self):
+        seen = []
+        response = self.client.get(self.url, {"page_size": 3})
+        while True:
+            seen += [row["id"] for row in response.data["results"]]
+            if not response.data["next"]:
+                break
+            response = self.client.get(response.data["next"])
+
+        self.assertEqual(seen, sorted(self.entry_ids, reverse=True))
+
+    def test_tampered_cursor_is_rejected(self):
+        next_url = self.client.get(self.url, {"page_size": 3}).data["next"]
+        cursor = parse_qs(urlparse(next_url).query)["cursor"][0]
+        response = self.client.get(self.url, {"cursor": cursor[:-2] + "xx"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_legacy_clients_can_opt_out_of_paging(self):
+        response = self.client.get(self.url, {"paginate": "false"})
+        self.assertEqual(len(response.data), 7)
+
+
+class PaymentHistoryGroupTests(CollectionTestMixin, TestCase):
+
+    def setUp(self):
+        self.admin = self.make_user("9999999999", role=UserRoles.ADMIN, is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.scheme = self.make_scheme()
+        self.url = reverse("cashcollection_api:customer-scheme-payment-groups")
+
+    def seed(self, customers, payments):
+        for index in range(Customer.objects.count(), Customer.objects.count() + customers):
+            customer = self.make_customer(index)
+            self.enroll(customer, self.scheme)
+            for _ in range(payments):
+                self.pay(customer, self.scheme, "10.00")
+
+    def test_each_pair_is_returned_once_with_its_payments(self):
+        self.seed(3, 4)
+        response = self.client.get(self.url, {"page_size": 2})
+        rows = response.data["results"]
+        rows += self.client.get(response.data["next"]).data["results"]
+
+        self.assertEqual(len(rows), 3)
+        self.assertEqual([len(row["payment_history"]) for row in rows], [4, 4, 4])
+        self.assertEqual(rows[0]["total_paid"], "40.00")
+        self.assertEqual(len({row["customer"] for row in rows}), 3)
+
+    def test_query_count_does_not_grow_with_payments(self):
+        self.seed(2, 1)
+        # The page of groups and their payments.
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+        self.seed(2, 10)
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+
+
+class ExportTests(CollectionTestMixin, TestCase):
+
+    def setUp(self):
+        self.admin = self.make_user("9999999999", role=UserRoles.ADMIN, is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.scheme = self.make_scheme()
+        self.other_scheme = self.make_scheme(2)
+        for index in range(3):
+            customer = self.make_customer(index)
+            self.enroll(customer, self.scheme)
+            self.pay(customer, self.scheme, "100.00")
+            self.pay(customer, self.other_scheme, "5.00")
+        for day, kind, amount in [(1, "credit", "50.00"), (2, "debit", "20.00"), (3, "credit", "10.00")]:
+            CollectionEntry.objects.create(date=date(2025, 3, day), type=kind, amount=Decimal(amount))
+
+    def read_csv(self, response):
+        return list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+
+    def test_entries_csv_is_streamed_and_filtered(self):
+        url = reverse("cashcollection_api:cash-collection-entry-export", args=["csv"])
+        response = self.client.get(url, {"scheme": self.scheme.id})
+
+        self.assertTrue(response.streaming)
+        rows = self.read_csv(response)
+        self.assertEqual(rows[0][:3], ["ID", "Date", "Customer ID"])
+        self.assertEqual([row[7] for row in rows[1:]], ["100.00"] * 3)
+
+    def test_daybook_csv_carries_the_opening_balance(self):
+        url = reverse("cashcollection_api:collection-export", args=["csv"])
+        rows = self.read_csv(self.client.get(url, {"date_from": "2025-03-02"}))
+        self.assertEqual([row[-1] for row in rows[1:]], ["30.00", "40.00"])
+
+    def test_enrollments_xlsx(self):
+        url = reverse("cashcollection_api:cash-collection-export", args=["xlsx"])
+        response = self.client.get(url)
+        workbook = openpyxl.load_workbook(io.BytesIO(b"".join(response.streaming_content)), read_only=True)
+        rows = list(workbook.active.iter_rows(values_only=True))
+
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][-2:], (100, 900))
+
+    def test_xlsx_continues_on_a_new_worksheet_past_the_row_limit(self):
+        url = reverse("cashcollection_api:cash-collection-entry-export", args=["xlsx"])
+        with mock.patch("api.v1.exports.XLSX_MAX_ROWS", 2):
+            response = self.client.get(url)
+        workbook = openpyxl.load_workbook(io.BytesIO(b"".join(response.streaming_content)), read_only=True)
+        sheets = [list(sheet.iter_rows(values_only=True)) for sheet in workbook.worksheets]
+
+        self.assertEqual([len(rows) for rows in sheets], [3, 3, 3])
+        self.assertTrue(all(rows[0][:3] == ("ID", "Date", "Customer ID") for rows in sheets))
+        self.assertEqual(len({row[0] for rows in sheets for row in rows[1:]}), 6)
+
+    def test_unknown_file_type_is_rejected(self):
+        url = reverse("cashcollection_api:collection-export", args=["pdf"])
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+
+class DaybookTests(CollectionTestMixin, TestCase):
+
+    def setUp(self):
+        self.admin = self.make_user("9999999999", role=UserRoles.ADMIN, is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.url = reverse("cashcollection_api:collection_list")
+        start = date(2025, 3, 1)
+        self.rows = []
+        for day in range(6):
+            for kind, amount in (("credit", Decimal("100.00") * (day + 1)), ("debit", Decimal("15.50"))):
+                self.rows.append(CollectionEntry.objects.create(
+                    type=kind, amount=amount, date=start + timedelta(days=day)
+                ))
+
+    def expected_totals(self, rows, opening=Decimal("0.00")):
+        totals, balance = [], opening
+        for row in rows:
+            balance += row.amount if row.type == "credit" else -row.amount
+            totals.append(balance)
+        return totals
+
+    def walk(self, params):
+        totals = []
+        response = self.client.get(self.url, {"page_size": 4, **params})
+        first_opening = response.data["opening_balance"]
+        while True:
+            totals += [row["running_total"] for row in response.data["results"]]
+            if not response.data["next"]:
+                return first_opening, totals
+            with self.assertNumQueries(1):
+                response = self.client.get(response.data["next"])
+
+    def test_running_total_is_carried_across_pages(self):
+        opening, totals = self.walk({})
+        self.assertEqual(opening, Decimal("0.00"))
+        self.assertEqual(totals, self.expected_totals(self.rows))
+
+    def test_date_range_opens_with_the_prior_balance(self):
+        opening, totals = self.walk({"date_from": "2025-03-03", "date_to": "2025-03-05"})
+        before = self.expected_totals(self.rows[:4])[-1]
+        self.assertEqual(opening, before)
+        self.assertEqual(totals, self.expected_totals(self.rows[4:10], opening=before))
+
+    def test_invalid_date_is_rejected(self):
+        response = self.client.get(self.url, {"date_from": "03/03/2025"})
+        self.assertEqual(response.status_code, 400)
+
+
+class DaybookCheckpointTests(CollectionTestMixin, TestCase):
+
+    def setUp(self):
+        self.admin = self.make_user("9999999999", role=UserRoles.ADMIN, is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.url = reverse("cashcollection_api:collection_summary")
+        with self.captureOnCommitCallbacks(execute=True):
+            for day in range(1, 11):
+                CollectionEntry.objects.create(type="credit", amount=Decimal("100.00"), date=date(2025, 4, day))
+                CollectionEntry.objects.create(type="debit", amount=Decimal("10.00"), date=date(2025, 4, day))
+
+    def checkpoint_dates(self):
+        return list(CollectionBalanceCheckpoint.objects.order_by("date").values_list("date", flat=True))
+
+    def test_writes_materialize_and_summary_reads_checkpoints(self):
+        self.assertEqual(self.checkpoint_dates(), [date(2025, 4, day) for day in range(1, 11)])
+
+        response = self.client.get(self.url, {"as_of": "2025-04-05"})
+        self.assertEqual(response.data["total_credit"], Decimal("500.00"))
+        self.assertEqual(response.data["balance"], Decimal("450.00"))
+        self.assertEqual(self.client.get(self.url).data["balance"], Decimal("900.00"))
+
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {"as_of": "2025-04-07"})
+        self.assertEqual(response.data["balance"], Decimal("630.00"))
+
+    def test_reads_never_write_checkpoints(self):
+        CollectionBalanceCheckpoint.objects.all().delete()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(self.url, {"as_of": "2025-04-05"}).data["balance"], Decimal("450.00"))
+            self.client.get(reverse("cashcollection_api:collection_list"), {"date_from": "2025-04-03"})
+        self.assertFalse([query for query in queries.captured_queries if not query["sql"].startswith("SELECT")])
+        self.assertEqual(CollectionBalanceCheckpoint.objects.count(), 0)
+
+    def test_backdated_edit_invalidates_only_later_checkpoints(self):
+        entry = CollectionEntry.objects.get(date=date(2025, 4, 6), type="credit")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.amount = Decimal("300.00")
+            entry.save()
+            self.assertEqual(self.checkpoint_dates(), [date(2025, 4, day) for day in range(1, 6)])
+        self.assertEqual(len(self.checkpoint_dates()), 10)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.date = date(2025, 4, 2)
+            entry.save()
+            self.assertEqual(CollectionBalanceCheckpoint.objects.count(), 1)
+
+        self.assertEqual(self.client.get(self.url, {"as_of": "2025-04-02"}).data["balance"], Decimal("480.00"))
+        self.assertEqual(self.client.get(self.url).data["balance"], Decimal("1100.00"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.delete()
+        self.assertEqual(self.client.get(self.url).data["balance"], Decimal("800.00"))
+
+    def test_a_date_assigned_as_a_string_invalidates_from_that_date(self):
+        entry = CollectionEntry.objects.get(date=date(2025, 4, 6), type="credit")
+        entry.date = "2025-04-03"
+        entry.save()
+        self.assertEqual(self.checkpoint_dates(), [date(2025, 4, 1), date(2025, 4, 2)])
+
+    def test_balance_before_the_first_representable_date_is_zero(self):
+        self.assertEqual(checkpoints.balance_before(date.min), Decimal("0.00"))
+
+
+class BulkEnrollmentTests(CollectionTestMixin, TestCase):
+
+    def setUp(self):
+        self.admin = self.make_user("9999999999", role=UserRoles.ADMIN, is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.scheme = self.make_scheme()
+        self.url = reverse("cashcollection_api:cashcollection_create")
+
+    def enroll_request(self, customer_ids):
+        return self.client.post(self.url, {
+            "scheme": self.scheme.id,
+            "customers": customer_ids,
+            "start_date": "2025-01-01",
+            "end_date": "2025-12-31",
+        }, format="json")
+
+    def test_query_count_is_constant_in_the_number_of_customers(self):
+        small = [self.make_customer(index).id for index in range(5)]
+        large = [self.make_customer(index).id for index in range(5, 105)]
+
+        with self.assertNumQueries(6) as small_run:
+            self.enroll_request(small)
+        with self.assertNumQueries(len(small_run.captured_queries)):
+            response = self.enroll_request(large)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data["data"]), 100)
+        self.assertEqual(CashCollection.objects.filter(scheme=self.scheme).count(), 105)
+
+    def test_reports_unknown_and_already_enrolled_customers(self):
+        enrolled = self.make_customer(1)
+        self.enroll(enrolled, self.scheme)
+        fresh = self.make_customer(2)
+
+        response = self.enroll_request([enrolled.id, fresh.id, fresh.id, 424242])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["data"], [
+            {"id": CashCollection.objects.get(customer=fresh).id, "customer_id": fresh.id},
+        ])
+        self.assertEqual(
+            [(error["customer_id"], error["error"]) for error in response.data["errors"]],
+            [(enrolled.id, "Customer is already enrolled in this scheme"), (424242, "Customer not found")],
+        )
+
+    def test_missing_period_is_rejected(self):
+        customer = self.make_customer(1)
+        response = self.client.post(self.url, {"scheme": self.scheme.id, "customers": [customer.id]}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("start_date", response.data["errors"])
+
+
+class BatchEntryIngestTests(CollectionTestMixin, TestCase):
+
+    def setUp(self):
+        self.agent = self.make_user("8888888888", role=UserRoles.AGENT)
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+        self.scheme = self.make_scheme(total_amount="1000.00")
+        self.customer = self.make_customer(1)
+        self.url = reverse("cashcollection_api:cash-collection-entry-batch")
+
+    def item(self, amount, customer=None, **extra):
+        return {"customer": (customer or self.customer).id, "scheme": self.scheme.id, "amount": amount, **extra}
+
+    def test_overpayment_is_checked_cumulatively_across_the_batch(self):
+        self.pay(self.customer, self.scheme, "300.00")
+
+        response = self.client.post(self.url, {"entries": [
+            self.item("400.00", client_id="a"),
+            self.item("400.00", client_id="b"),
+            self.item("200.00", client_id="c"),
+            self.item("-5", client_id="d"),
+            {"customer": 424242, "scheme": self.scheme.id, "amount": "1.00", "client_id": "e"},
+        ]}, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [(row["client_id"], row["status"]) for row in response.data["results"]],
+            [("a", "accepted"), ("b", "rejected"), ("c", "accepted"), ("d", "rejected"), ("e", "rejected")],
+        )
+        balance = CashCollectionBalance.objects.get(customer=self.customer, scheme=self.scheme)
+        self.assertEqual((balance.total_paid, balance.entry_count), (Decimal("900.00"), 3))
+        self.assertEqual(CashCollectionEntry.objects.filter(created_by=self.agent).count(), 2)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        customers = [self.make_customer(index) for index in range(2, 12)]
+
+        with self.assertNumQueries(9) as small_run:
+            self.client.post(self.url, [self.item("1.00", customer) for customer in customers[:2]], format="json")
+        # 100 rows stay within one INSERT batch even on SQLite's 999-parameter limit.
+        with self.assertNumQueries(len(small_run.captured_queries)):
+            response = self.client.post(
+                self.url, [self.item("1.00", customer) for customer in customers for _ in range(10)], format="json"
+            )
+        self.assertEqual(response.data["accepted"], 100)
+
+    def test_lock_balances_locks_only_the_requested_pairs_in_pk_order(self):
+        other_scheme = self.make_scheme(2)
+        other_customer = self.make_customer(2)
+        ledger.lock_balances([(self.customer.id, other_scheme.id), (other_customer.id, self.scheme.id)])
+
+        with transaction.atomic(), self.assertNumQueries(2) as queries:
+            balances = ledger.lock_balances([(self.customer.id, self.scheme.id), (other_customer.id, other_scheme.id)])
+
+        self.assertEqual(set(balances), {(self.customer.id, self.scheme.id), (other_customer.id, other_scheme.id)})
+        lock_sql = queries.captured_queries[-1]["sql"]
+        self.assertTrue(lock_sql.endswith('ORDER BY "collectionplans_cashcollectionbalance"."id" ASC'))
+
+
+class ReadCacheTests(CollectionTestMixin, TestCase):
+
+    def setUp(self):
+        read_cache.read_cache().clear()
+        self.scheme = self.make_scheme()
+        self.staff = self.make_user("9999999999", role=UserRoles.ADMIN)
+        agent_user = self.make_user("8888888888", first_name="Ravi", role=UserRoles.AGENT)
+        self.agent = Agent.objects.create(user=agent_user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def test_scheme_list_is_served_from_cache_until_a_scheme_changes(self):
+        url = reverse("cashcollection_api:scheme_list")
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual([row["name"] for row in response.data["results"]], ["Scheme 1"])
+
+        self.scheme.name = "Gold"
+        self.scheme.save()
+        response = self.client.get(url)
+        self.assertEqual([row["name"] for row in response.data["results"]], ["Gold"])
+        self.assertEqual(read_cache.stats(["scheme_list"])["scheme_list"]["hits"], 1)
+
+    def test_agent_views_are_invalidated_by_user_edits_but_not_by_logins(self):
+        url = reverse("partner_api:agent-details", args=[self.agent.id])
+        self.client.get(url)
+
+        self.agent.user.last_login = timezone.now()
+        self.agent.user.save(update_fields=["last_login"])
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        self.agent.user.first_name = "Ravi Kumar"
+        self.agent.user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.data["user"]["first_name"], "Ravi Kumar")
+
+        response = self.client.get(reverse("partner_api:agent-list"))
+        self.assertEqual([row["user"]["first_name"] for row in response.data["results"]], ["Ravi Kumar"])
+        self.assertEqual(self.client.get(reverse("partner_api:agent-details", args=[424242])).status_code, 404)
+
+    def test_interleaved_bumps_each_give_a_new_version(self):
+        # Worker A bumps, a reader caches under A's version, then worker B bumps in the same tick.
+        # B must not land on A's version, or the reader's stale entry would be served again.
+        (initial,) = read_cache.versions(["schemes"])
+        with mock.patch("main.cache.time.time_ns", return_value=1):
+            read_cache.bump("schemes")
+            (after_a,) = read_cache.versions(["schemes"])
+            read_cache.cached("scheme_list", ["schemes"], "k", lambda: "stale")
+            read_cache.bump("schemes")
+            (after_b,) = read_cache.versions(["schemes"])
+
+        self.assertEqual(len({initial, after_a, after_b}), 3)
+        self.assertEqual(read_cache.cached("scheme_list", ["schemes"], "k", lambda: "fresh"), "fresh")
+
+
+class ConditionalGetTests(CollectionTestMixin, TestCase):
+
+    def setUp(self):
+        read_cache.read_cache().clear()
+        self.customer = self.make_customer(1)
+        self.scheme = self.make_scheme()
+        self.enroll(self.customer, self.scheme)
+        self.entries = [self.pay(self.customer, self.scheme, "100.00") for _ in range(2)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.make_user("9999999999", role=UserRoles.ADMIN))
+        self.url = reverse("cashcollection_api:cash-collection-entry-list")
+
+    def test_unchanged_list_returns_304_without_serializing(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Last-Modified", response)
+
+        with self.assertNumQueries(1):
+            cached = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b"")
+        self.assertEqual(self.client.get(self.url, {"page_size": 1}, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
+
+    def test_deletes_and_embedded_edits_change_the_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.entries[0].delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, len(response.data["results"])), (200, 1))
+
+        etag = response["ETag"]
+        self.customer.user.first_name = "Renamed"
+        self.customer.user.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_enrollment_list_tracks_ledger_changes(self):
+        url = reverse("cashcollection_api:customer-scheme-list")
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, {"paginate": "false"}).status_code, 200)
+
+        self.pay(self.customer, self.scheme, "50.00")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(response.data["results"][0]["total_paid"]), Decimal("250.00"))
+
+
+class AgentSyncTests(CollectionTestMixin, TestCase):
+
+    def setUp(self):
+        self.agent = self.make_user("8888888888", role=UserRoles.AGENT)
+        self.scheme = self.make_scheme()
+        self.customers = [self.make_customer(index) for index in range(3)]
+        for customer in self.customers[:2]:
+            CustomerAssignment.objects.create(customer=customer, agent=self.agent)
+            self.enroll(customer, self.scheme)
+            self.pay(customer, self.scheme, "100.00")
+        self.enroll(self.customers[2], self.scheme)
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+        self.url = reverse("cashcollection_api:agent-sync")
+
+    def sync(self, **params):
+        """Follows `next` to the end and returns the merged sections and the last page."""
+        merged = {name: [] for name in ("schemes", "customers", "enrollments", "entries", "deleted")}
+        response = self.client.get(self.url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            for name in merged:
+                merged[name] += response.data[name]
+            if response.data["next"] is None:
+                return merged, response.data
+            response = self.client.get(response.data["next"])
+
+    def test_full_sync_is_scoped_to_assigned_customers_and_paginated(self):
+        merged, last = self.sync(page_size=1)
+        self.assertEqual({row["id"] for row in merged["customers"]}, {c.id for c in self.customers[:2]})
+        self.assertEqual(len(merged["enrollments"]), 2)
+        self.assertEqual(len(merged["entries"]), 2)
+        self.assertEqual(len(merged["schemes"]), 1)
+        self.assertIsNotNone(last["watermark"])
+
+    def test_delta_sends_changes_tombstones_and_revocations(self):
+        _, last = self.sync()
+        past = timezone.now() - timedelta(hours=1)
+        for model in (Scheme, Customer, CashCollection, CashCollectionEntry, CashCollectionBalance, CustomerAssignment):
+            model.objects.update(updated_at=past)
+        with self.settings(SYNC_WATERMARK_OVERLAP=0):
+            merged, _ = self.sync(watermark=last["watermark"])
+            self.assertEqual(sum(len(rows) for rows in merged.values()), 0)
+
+            entry = self.pay(self.customers[0], self.scheme, "50.00")
+            CashCollectionEntry.objects.filter(customer=self.customers[1]).delete()
+            CustomerAssignment.objects.filter(customer=self.customers[1]).update(is_active=False, updated_at=timezone.now())
+            CustomerAssignment.objects.create(customer=self.customers[2], agent=self.agent)
+
+            merged, last_page = self.sync(watermark=last["watermark"])
+        self.assertEqual({row["id"] for row in merged["entries"]}, {entry.id})
+        self.assertEqual([row["id"] for row in merged["customers"]], [self.customers[2].id])
+        self.assertEqual(
+            {row["customer"] for row in merged["enrollments"]}, {self.customers[0].id, self.customers[2].id}
+        )
+        self.assertEqual([(row["model"], row["customer_id"]) for row in merged["deleted"]], [])
+        self.assertEqual(last_page["revoked_customers"], [self.customers[1].id])
+
+    def test_user_edits_reach_the_delta(self):
+        _, last = self.sync()
+        Customer.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        user = self.customers[0].user
+        user.first_name = "Renamed"
+        user.save()
+        user.save(update_fields=["last_login"])
+        self.customers[1].user.save(update_fields=["last_login"])
+
+        with self.settings(SYNC_WATERMARK_OVERLAP=0):
+            merged, _ = self.sync(watermark=last["watermark"])
+        self.assertEqual([row["id"] for row in merged["customers"]], [self.customers[0].id])
+
+    def test_deletions_of_assigned_rows_leave_tombstones(self):
+        _, last = self.sync()
+        CashCollectionEntry.objects.filter(customer=self.customers[0]).delete()
+        CashCollection.objects.filter(customer=self.customers[2]).delete()
+        merged, _ = self.sync(watermark=last["watermark"])
+        self.assertEqual([(row["model"], row["customer_id"]) for row in merged["deleted"]], [("entry", self.customers[0].id)])
+
+    def test_customer_tombstones_only_reach_its_agents(self):
+        _, last = self.sync()
+        other_agent = self.make_user("7777777777", role=UserRoles.AGENT)
+        CustomerAssignment.objects.create(customer=self.customers[2], agent=other_agent)
+        deleted_ids = [self.customers[0].id, self.customers[2].id]
+        Customer.objects.filter(id__in=deleted_ids).delete()
+
+        merged, _ = self.sync(watermark=last["watermark"])
+        self.assertEqual(
+            [(row["model"], row["object_id"]) for row in merged["deleted"] if row["model"] == "customer"],
+            [("customer", self.customers[0].id)],
+        )
+        self.client.force_authenticate(other_agent)
+        merged, _ = self.sync(watermark=last["watermark"])
+        self.assertEqual(
+            [(row["model"], row["object_id"]) for row in merged["deleted"]], [("customer", self.customers[2].id)]
+        )
+
+    def test_stale_or_forged_watermarks(self):
+        self.assertEqual(self.client.get(self.url, {"watermark": "forged"}).status_code, 400)
+        stale = sync.encode_watermark(timezone.now() - timedelta(days=365))
+        self.assertTrue(self.client.get(self.url, {"watermark": stale}).data["reset"])
+        self.client.force_authenticate(self.make_user("7777777777", role=UserRoles.STAFF))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class QueryPlanTests(CollectionTestMixin, TestCase):
+    """
+    EXPLAIN-based regression checks for the hot-path queries: each must be
+    served by an index, never by a full scan of its table. On PostgreSQL
+    sequential scans are disabled for the check, so a Seq Scan in the plan
+    means no index can serve the query at all.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        users = CustomUser.objects.bulk_create([
+            CustomUser(contact_number=f"91{index:08d}", role=UserRoles.CUSTOMER) for index in range(400)
+        ])
+        agents = CustomUser.objects.bulk_create([
+            CustomUser(contact_number=f"88{index:08d}", role=UserRoles.AGENT) for index in range(20)
+        ])
+        customers = Customer.objects.bulk_create([Customer(user=user, shop_name="Shop") for user in users])
+        schemes = [cls().make_scheme(index) for index in range(8)]
+        CashCollection.objects.bulk_create([
+            CashCollection(customer=customer, scheme=scheme, start_date=scheme.start_date, end_date=scheme.end_date)
+            for customer in customers for scheme in schemes[:2]
+        ])
+        CustomerAssignment.objects.bulk_create([
+            CustomerAssignment(customer=customer, agent=agents[index % 20], is_active=index % 40 != 0)
+            for index, customer in enumerate(customers)
+        ])
+        CashCollectionEntry.objects.bulk_create([
+            CashCollectionEntry(customer=customers[index % 400], scheme=schemes[index % 8], amount=Decimal("10.00"))
+            for index in range(4000)
+        ], batch_size=500)
+        CollectionEntry.objects.bulk_create([
+            CollectionEntry(date=date(2025, 1, 1) + timedelta(days=index % 300), amount=Decimal("5.00"))
+            for index in range(3000)
+        ], batch_size=500)
+        cls.agent, cls.customer, cls.scheme = agents[3], customers[7], schemes[3]
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def plan(self, queryset):
+        if connection.vendor == "postgresql":
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                return queryset.explain()
+        return queryset.explain()
+
+    def sql_plan(self, sql):
+        with transaction.atomic(), connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute(f"EXPLAIN {sql}")
+                return "\n".join(row[0] for row in cursor.fetchall())
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return "\n".join(row[-1] for row in cursor.fetchall())
+
+    def assertIndexed(self, queryset, sorted_by_index=False):
+        table = queryset.model._meta.db_table
+        plan = self.plan(queryset)
+        if connection.vendor == "postgresql":
+            self.assertNotIn(f"Seq Scan on {table}", plan, plan)
+            if sorted_by_index:
+                self.assertNotRegex(plan, r"(?m)^\s*(->\s*)?Sort\b", plan)
+        else:
+            self.assertNotRegex(plan, rf"\bSCAN {table}(?! USING)", plan)
+            if sorted_by_index:
+                self.assertNotIn("TEMP B-TREE FOR ORDER BY", plan, plan)
+
+    def test_entries_of_an_enrollment(self):
+        self.assertIndexed(CashCollectionEntry.objects.filter(customer=self.customer, scheme=self.scheme))
+
+    def test_newest_entries_page(self):
+        self.assertIndexed(CashCollectionEntry.objects.order_by("-created_at", "-id")[:50], sorted_by_index=True)
+
+    def test_enrollment_exists_check(self):
+        self.assertIndexed(CashCollection.objects.filter(scheme=self.scheme, customer=self.customer))
+
+    def test_daybook_page(self):
+        entries = CollectionEntry.objects.filter(date__gte=date(2025, 6, 1)).order_by(*DAYBOOK_ORDERING)[:50]
+        self.assertIndexed(entries, sorted_by_index=True)
+
+    def test_active_assignments_of_an_agent(self):
+        self.assertIndexed(CustomerAssignment.objects.filter(agent=self.agent, is_active=True))
+
+    def test_login_lookup_by_contact_number(self):
+        self.assertIndexed(CustomUser.objects.filter(contact_number="9100000042", is_active=True))
+
+    def assertValidatorIndexed(self, queryset):
+        """The ETag aggregate must seek an index; a full scan of a covering index is not good enough either."""
+        with CaptureQueriesContext(connection) as queries:
+            conditional.queryset_validator(queryset)
+        plan = self.sql_plan(queries.captured_queries[-1]["sql"])
+        if connection.vendor == "postgresql":
+            self.assertNotIn("Seq Scan", plan, plan)
+            self.assertIn("Index Cond", plan, plan)
+        else:
+            self.assertNotRegex(plan, r"\bSCAN\b", plan)
+
+    def test_detail_etag_aggregates(self):
+        entry = CashCollectionEntry.objects.order_by("id")[1234]
+        self.assertValidatorIndexed(CashCollectionEntry.objects.filter(pk=entry.pk))
+        # The whole-table aggregate the list endpoints used to run on every GET.
+        with self.assertRaises(AssertionError):
+            self.assertValidatorIndexed(CashCollectionEntry.objects.all())
+        self.assertValidatorIndexed(Customer.objects.filter(id=self.customer.id))
+
+        enrollment = CashCollection.objects.filter(customer=self.customer, scheme=self.scheme)
+        self.assertValidatorIndexed(enrollment)
+        self.assertValidatorIndexed(CashCollectionBalance.objects.filter(
+            customer_id__in=enrollment.values("customer_id"), scheme_id__in=enrollment.values("scheme_id"),
+        ))
+
+
+class QueryBudgetTests(QueryBudgetMixin, CollectionTestMixin, TestCase):
+    """Every budgeted list endpoint, seeded with more rows than any budget."""
+
+    def setUp(self):
+        read_cache.read_cache().clear()
+        scheme = self.make_scheme()
+        self.agent = self.make_user("8888888888", role=UserRoles.AGENT)
+        Agent.objects.create(user=self.agent)
+        for index in range(15):
+            customer = self.make_customer(index)
+            self.enroll(customer, scheme)
+            self.pay(customer, scheme, "10.00", created_by=self.agent)
+            CustomerAssignment.objects.create(customer=customer, agent=self.agent)
+            CollectionEntry.objects.create(date=date(2025, 1, 1) + timedelta(days=index), amount=Decimal("5.00"))
+        self.staff = self.make_user("9999999999", role=UserRoles.ADMIN, is_staff=True)
+        self.client = APIClient()
+
+    def test_list_endpoints_stay_within_their_query_budgets(self):
+        for view_name in settings.QUERY_BUDGETS:
+            self.client.force_authenticate(self.agent if view_name == "cashcollection_api:agent-sync" else self.staff)
+            with self.subTest(view_name):
+                response = self.client.get(reverse(view_name))
+                self.assertEqual(response.status_code, 200)
+                self.assertWithinQueryBudget(response)
+
+    def test_staff_get_instrumentation_headers(self):
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(reverse("cashcollection_api:cash-collection-entry-list"))
+        self.assertEqual((response["X-DB-Queries"], response["X-DB-Query-Budget"]), ("1", "1"))
+        self.assertEqual(response["X-DB-Duplicate-Queries"], "0")
+        self.assertIn("X-Serializer-Time-ms", response)
+
+        self.client.force_authenticate(self.agent)
+        self.assertNotIn("X-DB-Queries", self.client.get(reverse("cashcollection_api:cash-collection-entry-list")))
+
+    def test_per_row_queries_show_up_as_duplicates(self):
+        stats = QueryStats()
+        with connection.execute_wrapper(stats):
+            [entry.customer.shop_name for entry in CashCollectionEntry.objects.all()]
+        self.assertEqual(stats.count, 16)
+        self.assertEqual(list(stats.duplicates().values()), [15])
+
+
+class BenchmarkCommandTests(TestCase):
+
+    def setUp(self):
+        # Login bookkeeping is written synchronously, so nothing is left in a journal.
+        journal_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(journal_dir.cleanup)
+        override = override_settings(AUTH_WRITE_BEHIND={"ENABLED": False, "JOURNAL_DIR": journal_dir.name})
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_benchmark_of_a_seeded_database_reports_every_endpoint(self):
+        call_command("seed_dataset", customers=20, agents=2, schemes=3, entries=300, daybook=50, stdout=StringIO())
+        self.assertEqual(CashCollectionBalance.objects.exclude(total_paid=0).count(),
+                         CashCollectionEntry.objects.values("customer", "scheme").distinct().count())
+
+        with tempfile.NamedTemporaryFile(suffix=".json") as output:
+            call_command("benchmark_endpoints", "--current", "--iterations", "3", "--warmup", "0",
+                         "--output", output.name, stdout=StringIO())
+            report = json.load(output)
+
+        endpoints = report["runs"][0]["endpoints"]
+        self.assertEqual(set(endpoints), {
+            "login_user", "cash_collection_list", "cash_collection_entry_create", "collection_list",
+            "collection_summary", "customer_list", "get_customer_schemes",
+        })
+        self.assertTrue(all(result["queries"] > 0 and result["p99_ms"] >= result["p50_ms"] for result in endpoints.values()))
+        # The benchmarked POST was rolled back.
+        self.assertEqual(report["runs"][0]["rows"]["payments"], CashCollectionEntry.objects.count())
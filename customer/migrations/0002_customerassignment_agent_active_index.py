@@ -0,0 +1,19 @@
+# Generated by Django 5.1.5 on 2026-10-18 11:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customerassignment',
+            index=models.Index(fields=['agent', 'is_active'], name='customer_cu_agent_i_9212a4_idx'),
+        ),
+    ]
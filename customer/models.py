@@ -73,5 +73,11 @@ class CustomerAssignment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # An agent's active customers (export filters, delta sync scope).
+            models.Index(fields=["agent", "is_active"]),
+        ]
+
     def __str__(self):
         return f"{self.customer} assigned to {self.agent}"
\ No newline at end of file
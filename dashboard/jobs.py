@@ -0,0 +1,107 @@
+"""
+Database-backed queue for report generation.
+
+Requests only insert a Report and its ReportJob and return the job id.
+The `process_report_jobs` worker claims queued jobs with a conditional
+UPDATE (only one worker can flip a row from queued to running), builds
+the report and records the outcome on the job. Running jobs whose worker
+died are claimed again after REPORT_JOB_TIMEOUT seconds, up to
+REPORT_JOB_MAX_ATTEMPTS times; after that they are marked failed.
+"""
+import datetime
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from dashboard.models import Report, ReportJob
+from dashboard.reports import build_report
+
+
+logger = logging.getLogger(__name__)
+
+
+def job_timeout():
+    return datetime.timedelta(seconds=getattr(settings, "REPORT_JOB_TIMEOUT", 30 * 60))
+
+
+def max_attempts():
+    return getattr(settings, "REPORT_JOB_MAX_ATTEMPTS", 3)
+
+
+def enqueue_report(title, report_type, start_date, end_date, user=None):
+    """Creates a Report and queues the job that will fill it in."""
+    with transaction.atomic():
+        report = Report.objects.create(
+            title=title, report_type=report_type, start_date=start_date, end_date=end_date, generated_by=user,
+        )
+        return ReportJob.objects.create(report=report)
+
+
+def claimable_jobs():
+    stale = timezone.now() - job_timeout()
+    return ReportJob.objects.filter(
+        Q(status=ReportJob.QUEUED) | Q(status=ReportJob.RUNNING, started_at__lt=stale),
+        attempts__lt=max_attempts(),
+    )
+
+
+def fail_abandoned_jobs():
+    """Marks stale running jobs that have no attempts left as failed; returns how many there were."""
+    stale = timezone.now() - job_timeout()
+    return ReportJob.objects.filter(
+        status=ReportJob.RUNNING, started_at__lt=stale, attempts__gte=max_attempts(),
+    ).update(
+        status=ReportJob.FAILED,
+        error=f"Worker did not finish within {job_timeout()} and no attempts are left",
+        finished_at=timezone.now(),
+    )
+
+
+def claim_next_job(worker):
+    """Claims the oldest claimable job for `worker`, or returns None when there is nothing to do."""
+    fail_abandoned_jobs()
+    while True:
+        job_id = claimable_jobs().order_by("created_at", "id").values_list("id", flat=True).first()
+        if job_id is None:
+            return None
+        claimed = claimable_jobs().filter(id=job_id).update(
+            status=ReportJob.RUNNING, worker=worker, started_at=timezone.now(), attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return ReportJob.objects.select_related("report").get(id=job_id)
+        # Another worker claimed it first; try the next one.
+
+
+def run_job(job):
+    """Builds the job's report and records whether it succeeded."""
+    try:
+        build_report(job.report)
+    except Exception as exc:
+        logger.exception("Report job %s failed", job.id)
+        retry = job.attempts < max_attempts()
+        ReportJob.objects.filter(id=job.id, worker=job.worker).update(
+            status=ReportJob.QUEUED if retry else ReportJob.FAILED,
+            error=f"{type(exc).__name__}: {exc}",
+            finished_at=None if retry else timezone.now(),
+        )
+        return False
+
+    ReportJob.objects.filter(id=job.id, worker=job.worker).update(
+        status=ReportJob.DONE, error="", finished_at=timezone.now(),
+    )
+    return True
+
+
+def process_jobs(worker, limit=None):
+    """Runs claimable jobs until the queue is empty or `limit` jobs ran; returns the number processed."""
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_next_job(worker)
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.5 on 2026-10-18 11:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collectionplans', '0004_collectionbalancecheckpoint'),
+        ('customer', '0001_initial'),
+        ('dashboard', '0001_initial'),
+        ('financials', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentScheduleState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('signature', models.CharField(max_length=64)),
+                ('generated_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='paymentschedule',
+            constraint=models.UniqueConstraint(fields=('customer', 'scheme', 'due_date'), name='unique_schedule_due_date'),
+        ),
+        migrations.AddField(
+            model_name='paymentschedulestate',
+            name='scheme',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='schedule_state', to='collectionplans.scheme'),
+        ),
+    ]
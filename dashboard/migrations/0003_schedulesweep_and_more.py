@@ -0,0 +1,34 @@
+# Generated by Django 5.1.5 on 2026-10-18 11:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collectionplans', '0005_cashcollectionentry_customer_scheme_index'),
+        ('customer', '0001_initial'),
+        ('dashboard', '0002_paymentschedulestate_and_more'),
+        ('financials', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleSweep',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('allocated_rows', models.PositiveIntegerField(default=0)),
+                ('rolled_rows', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='paymentschedule',
+            index=models.Index(fields=['status', 'due_date'], name='dashboard_p_status_efdfb3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentschedule',
+            index=models.Index(fields=['created_at'], name='dashboard_p_created_a355dd_idx'),
+        ),
+    ]
@@ -1,11 +1,11 @@
 from django.db import models
 from users.models import CustomUser
 from customer.models import Customer
-from collectionplans.models import CashCollectionScheme
+from collectionplans.models import Scheme
 
 class PaymentSchedule(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name="payment_schedules")
-    scheme = models.ForeignKey(CashCollectionScheme, on_delete=models.CASCADE, related_name="payment_schedules")
+    scheme = models.ForeignKey(Scheme, on_delete=models.CASCADE, related_name="payment_schedules")
     due_date = models.DateField()
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=[
@@ -21,8 +21,39 @@ class PaymentSchedule(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["customer", "scheme", "due_date"], name="unique_schedule_due_date"),
+        ]
+        indexes = [
+            # Date roll of the status sweeper: WHERE status IN (...) AND due_date < / = / > today.
+            models.Index(fields=["status", "due_date"]),
+            # Incremental sweeps pick up rows inserted by schedule regeneration.
+            models.Index(fields=["created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.customer} - {self.scheme.name} - {self.due_date} - {self.status}"
+
+
+class PaymentScheduleState(models.Model):
+    """What the PaymentSchedule rows of a scheme were last generated from (see dashboard.schedules)."""
+    scheme = models.OneToOneField(Scheme, on_delete=models.CASCADE, related_name="schedule_state")
+    signature = models.CharField(max_length=64)
+    generated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.scheme_id} - {self.generated_at}"
+
+class ScheduleSweep(models.Model):
+    """One run of the PaymentSchedule status sweeper; the last finished run bounds the next incremental one."""
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    allocated_rows = models.PositiveIntegerField(default=0)
+    rolled_rows = models.PositiveIntegerField(default=0)
+
     def __str__(self):
-        return f"{self.customer} - {self.scheme.scheme_name} - {self.due_date} - {self.status}"
+        return f"Sweep {self.started_at} - {self.allocated_rows} allocated, {self.rolled_rows} rolled"
 
 class AgentCollectionTarget(models.Model):
     agent = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="collection_targets", 
@@ -35,6 +66,13 @@ class AgentCollectionTarget(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Keep the persisted window so a moved target can be recomputed (dashboard.targets).
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     def __str__(self):
         return f"{self.agent.first_name} - Target: {self.target_amount} - Achieved: {self.achieved_amount}"
     
@@ -62,6 +100,37 @@ class Report(models.Model):
     
     def __str__(self):
         return f"{self.title} - {self.report_type} - {self.start_date} to {self.end_date}"
+
+
+class ReportJob(models.Model):
+    """Queue row for a Report built in the background by the `process_report_jobs` worker."""
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    report = models.OneToOneField(Report, on_delete=models.CASCADE, related_name="job")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    def __str__(self):
+        return f"Job {self.id} - {self.report_id} - {self.status}"
     
 
 class Notification(models.Model):
@@ -81,9 +150,27 @@ class Notification(models.Model):
     related_id = models.IntegerField(blank=True, null=True)  # Record ID
     
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Unread inbox and bulk mark-read: WHERE user_id = ? AND is_read = false ORDER BY created_at DESC.
+            models.Index(fields=["user", "is_read", "created_at"]),
+            # Full inbox: WHERE user_id = ? ORDER BY created_at DESC, id DESC.
+            models.Index(fields=["user", "-created_at", "-id"]),
+        ]
     
     def __str__(self):
         return f"{self.user} - {self.title} - {self.created_at}"    
+
+
+class NotificationCounter(models.Model):
+    """Denormalized unread Notification count per user, kept current by dashboard.notifications."""
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name="notification_counter")
+    unread = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.unread} unread"
     
 
 
@@ -0,0 +1,146 @@
+"""
+Notification fan-out and the per-user unread counter.
+
+Notifications are written with bulk_create in batches, and every batch
+bumps the NotificationCounter rows of its recipients with one F() UPDATE
+per distinct increment, so a run that notifies tens of thousands of users
+issues a few statements per batch. Badge polling reads the counter row
+instead of counting the notifications table; mark_read() decrements it
+by the number of rows it actually flipped.
+"""
+import datetime
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from dashboard.models import Notification, NotificationCounter, PaymentSchedule
+from main import cache as read_cache
+from users.models import CustomUser, UserRoles
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def bump_counters(user_counts):
+    """Adds `{user_id: count}` to the recipients' unread counters, creating missing counter rows."""
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(user_id=user_id) for user_id in user_counts], ignore_conflicts=True,
+    )
+    by_increment = {}
+    for user_id, count in user_counts.items():
+        by_increment.setdefault(count, []).append(user_id)
+    for count, user_ids in by_increment.items():
+        NotificationCounter.objects.filter(user_id__in=user_ids).update(
+            unread=F("unread") + count, updated_at=timezone.now(),
+        )
+
+
+def fan_out(notifications, batch_size=1000):
+    """Writes an iterable of unsaved Notification objects in batches; returns how many were written."""
+    written = 0
+    for batch in batched(notifications, batch_size):
+        with transaction.atomic():
+            Notification.objects.bulk_create(batch, batch_size=batch_size)
+            bump_counters(Counter(notification.user_id for notification in batch))
+        written += len(batch)
+    return written
+
+
+def notify(user_ids, title, message, notification_type, related_to=None, related_id=None, batch_size=1000):
+    """Sends the same notification to every user in `user_ids`."""
+    return fan_out(
+        (
+            Notification(
+                user_id=user_id, title=title, message=message, notification_type=notification_type,
+                related_to=related_to, related_id=related_id,
+            )
+            for user_id in dict.fromkeys(user_ids)
+        ),
+        batch_size=batch_size,
+    )
+
+
+def unread_count(user_id):
+    return NotificationCounter.objects.filter(user_id=user_id).values_list("unread", flat=True).first() or 0
+
+
+def mark_read(user_id, ids=None):
+    """Marks the user's notifications (only `ids` when given) as read; returns how many changed."""
+    unread = Notification.objects.filter(user_id=user_id, is_read=False)
+    if ids is not None:
+        unread = unread.filter(id__in=ids)
+    with transaction.atomic():
+        marked = unread.update(is_read=True)
+        if marked:
+            NotificationCounter.objects.filter(user_id=user_id).update(
+                unread=Greatest(F("unread") - marked, Value(0)), updated_at=timezone.now(),
+            )
+    return marked
+
+
+def large_transaction_threshold():
+    return getattr(settings, "LARGE_TRANSACTION_THRESHOLD", None)
+
+
+def admin_user_ids():
+    """Ids of the active admins and super admins, from the read cache."""
+    admins = CustomUser.objects.filter(role__in=[UserRoles.SUPER_ADMIN, UserRoles.ADMIN], is_active=True)
+    return read_cache.cached("admin_user_ids", ["users"], "admins", lambda: list(admins.values_list("id", flat=True)))
+
+
+def alert_large_entries(entries):
+    """Alerts the admins about every payment at or above LARGE_TRANSACTION_THRESHOLD."""
+    threshold = large_transaction_threshold()
+    large = [entry for entry in entries if threshold is not None and entry.amount >= threshold]
+    if not large:
+        return 0
+    admins = admin_user_ids()
+    return fan_out(
+        Notification(
+            user_id=admin_id, title="Large transaction", notification_type="large_transaction",
+            message=f"A payment of ₹{entry.amount} was recorded for customer {entry.customer_id}.",
+            related_to="CashCollectionEntry", related_id=entry.id,
+        )
+        for entry in large
+        for admin_id in admins
+    )
+
+
+def payment_reminders(today=None):
+    """
+    Yields the payment-due notifications for unpaid installments due today
+    and the overdue ones for unpaid installments that fell due yesterday,
+    one per installment, addressed to the customer's user. Meant to run
+    once a day.
+    """
+    today = today or timezone.localdate()
+    reminders = [
+        (today, "payment_due", "Payment due today", "₹{amount} for {scheme} is due today ({due_date})."),
+        (today - datetime.timedelta(days=1), "payment_overdue", "Payment overdue",
+         "₹{amount} for {scheme} was due on {due_date} and is overdue."),
+    ]
+    for due_date, notification_type, title, template in reminders:
+        rows = (
+            PaymentSchedule.objects.filter(due_date=due_date, status__in=["upcoming", "due", "overdue"])
+            .order_by("id")
+            .values_list("id", "customer__user_id", "amount", "scheme__name", "due_date")
+            .iterator(chunk_size=2000)
+        )
+        for schedule_id, user_id, amount, scheme, due in rows:
+            yield Notification(
+                user_id=user_id, title=title, notification_type=notification_type,
+                message=template.format(amount=amount, scheme=scheme, due_date=due),
+                related_to="PaymentSchedule", related_id=schedule_id,
+            )
@@ -0,0 +1,178 @@
+"""
+Collection reports built with pandas for dashboard.Report.
+
+Payments in the report period are read from CashCollectionEntry in
+chunks with `.iterator()`. Each chunk is turned into a DataFrame and
+reduced to per-dimension partial sums, so memory is bounded by the chunk
+size rather than the number of payments. Amounts are summed as integer
+paise to keep the totals exact.
+"""
+import calendar
+import datetime
+import io
+
+import pandas as pd
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from collectionplans.models import CashCollectionEntry, Scheme
+from users.models import CustomUser
+
+
+DIMENSIONS = {
+    "by_agent": ["agent_id"],
+    "by_scheme": ["scheme_id"],
+    "by_payment_method": ["payment_method"],
+    "by_day": ["day"],
+}
+
+SHEET_TITLES = {
+    "by_agent": "By agent",
+    "by_scheme": "By scheme",
+    "by_payment_method": "By payment method",
+    "by_day": "By day",
+}
+
+
+def report_chunk_size():
+    return getattr(settings, "REPORT_CHUNK_SIZE", 20000)
+
+
+def report_period(report_type, day, end_date=None):
+    """Returns the (start, end) dates covered by a report of `report_type` around `day`."""
+    if report_type == "daily":
+        return day, day
+    if report_type == "weekly":
+        start = day - datetime.timedelta(days=day.weekday())
+        return start, start + datetime.timedelta(days=6)
+    if report_type == "monthly":
+        return day.replace(day=1), day.replace(day=calendar.monthrange(day.year, day.month)[1])
+    return day, end_date
+
+
+def period_entries(start, end):
+    """Payments made between the local start of `start` and the local end of `end`."""
+    start_at = timezone.make_aware(datetime.datetime.combine(start, datetime.time.min))
+    end_at = timezone.make_aware(datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min))
+    return CashCollectionEntry.objects.filter(created_at__gte=start_at, created_at__lt=end_at)
+
+
+def entry_chunks(entries, chunk_size):
+    """Yields DataFrames of at most `chunk_size` payments."""
+    columns = ["created_at", "amount", "payment_method", "scheme_id", "agent_id"]
+    rows = entries.order_by().values_list(
+        "created_at", "amount", "payment_method", "scheme_id", "created_by_id"
+    ).iterator(chunk_size=chunk_size)
+
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield pd.DataFrame.from_records(chunk, columns=columns)
+            chunk = []
+    if chunk:
+        yield pd.DataFrame.from_records(chunk, columns=columns)
+
+
+def partial_sums(frame):
+    frame["paise"] = [int(amount * 100) for amount in frame["amount"]]
+    frame["day"] = pd.to_datetime(frame["created_at"], utc=True).dt.tz_convert(settings.TIME_ZONE).dt.date
+    frame["agent_id"] = frame["agent_id"].astype("Int64")
+    frame["scheme_id"] = frame["scheme_id"].astype("Int64")
+    return {
+        name: frame.groupby(keys, dropna=False)["paise"].agg(paise="sum", count="size")
+        for name, keys in DIMENSIONS.items()
+    }
+
+
+def summarize(start, end, chunk_size=None):
+    """Aggregates the payments between `start` and `end` into one DataFrame per dimension."""
+    partials = {name: [] for name in DIMENSIONS}
+    for frame in entry_chunks(period_entries(start, end), chunk_size or report_chunk_size()):
+        for name, sums in partial_sums(frame).items():
+            partials[name].append(sums)
+
+    tables = {}
+    for name, keys in DIMENSIONS.items():
+        if partials[name]:
+            table = pd.concat(partials[name]).groupby(level=keys, dropna=False).sum().reset_index()
+        else:
+            table = pd.DataFrame(columns=keys + ["paise", "count"])
+        tables[name] = table.sort_values(keys).reset_index(drop=True)
+    label_tables(tables)
+    return tables
+
+
+def label_tables(tables):
+    """Adds agent and scheme names next to their ids."""
+    agent_ids = [int(agent_id) for agent_id in tables["by_agent"]["agent_id"].dropna()]
+    agents = {
+        user.id: f"{user.first_name} {user.last_name}".strip() or user.contact_number
+        for user in CustomUser.objects.filter(id__in=agent_ids).only("first_name", "last_name", "contact_number")
+    }
+    scheme_ids = [int(scheme_id) for scheme_id in tables["by_scheme"]["scheme_id"].dropna()]
+    schemes = dict(Scheme.objects.filter(id__in=scheme_ids).values_list("id", "name"))
+
+    tables["by_agent"].insert(1, "agent_name", [agents.get(agent_id) for agent_id in tables["by_agent"]["agent_id"]])
+    tables["by_scheme"].insert(1, "scheme_name", [schemes.get(scheme_id) for scheme_id in tables["by_scheme"]["scheme_id"]])
+
+
+def rupees(paise):
+    paise = int(paise)
+    return f"{'-' if paise < 0 else ''}{abs(paise) // 100}.{abs(paise) % 100:02d}"
+
+
+def json_value(value):
+    if pd.isna(value):
+        return None
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def report_data(tables, start, end):
+    """The JSON stored in Report.data: period, totals and one list of rows per dimension."""
+    totals = tables["by_payment_method"]
+    data = {
+        "period": {"start_date": start.isoformat(), "end_date": end.isoformat()},
+        "totals": {"amount": rupees(totals["paise"].sum()), "count": int(totals["count"].sum())},
+    }
+    for name, table in tables.items():
+        data[name] = [
+            {
+                **{column: json_value(value) for column, value in row.items() if column != "paise"},
+                "amount": rupees(row["paise"]),
+            }
+            for row in table.to_dict("records")
+        ]
+    return data
+
+
+def report_workbook(tables, data):
+    """Renders the report tables to XLSX bytes, one sheet per dimension."""
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
+        summary = pd.DataFrame([
+            ("Start date", data["period"]["start_date"]),
+            ("End date", data["period"]["end_date"]),
+            ("Total amount", float(data["totals"]["amount"])),
+            ("Payments", data["totals"]["count"]),
+        ], columns=["", "Value"])
+        summary.to_excel(writer, sheet_name="Summary", index=False)
+        for name, table in tables.items():
+            sheet = table.assign(amount=table["paise"] / 100).drop(columns="paise")
+            sheet.to_excel(writer, sheet_name=SHEET_TITLES[name], index=False)
+    return buffer.getvalue()
+
+
+def build_report(report, chunk_size=None):
+    """Computes a Report's data and XLSX file and saves both on it."""
+    tables = summarize(report.start_date, report.end_date, chunk_size)
+    report.data = report_data(tables, report.start_date, report.end_date)
+    filename = f"{report.report_type}-{report.start_date:%Y%m%d}-{report.end_date:%Y%m%d}-{report.id}.xlsx"
+    report.file.save(filename, ContentFile(report_workbook(tables, report.data)), save=False)
+    report.save(update_fields=["data", "file"])
+    return report
@@ -0,0 +1,153 @@
+"""
+Expands CashCollection enrollments into PaymentSchedule rows.
+
+The installment dates and amounts of a scheme are computed once with a
+pandas date range and numpy, then every enrollment takes the slice of
+that vector that falls inside its own enrollment period. Rows are
+written with bulk_create in batches. The (customer, scheme, due_date)
+unique constraint with `ignore_conflicts` makes a re-run idempotent.
+
+PaymentScheduleState stores a signature of the scheme fields the
+schedule was built from. A run rebuilds the unpaid rows of schemes whose
+signature changed. For the other schemes it only expands enrollments
+created or edited since the last run. Paid and partially paid rows are
+never removed.
+"""
+import hashlib
+import math
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.utils import timezone
+
+from collectionplans.models import CashCollection, CollectionFrequencyChoices, Scheme
+from dashboard.models import PaymentSchedule, PaymentScheduleState
+
+
+PRESERVED_STATUSES = ("paid", "partially_paid")
+
+FREQUENCY_STEPS = {
+    CollectionFrequencyChoices.DAILY: "D",
+    CollectionFrequencyChoices.WEEKLY: "7D",
+}
+
+
+def scheme_signature(scheme):
+    """Hash of the scheme fields that determine its installments."""
+    fields = [
+        scheme.start_date, scheme.end_date, scheme.collection_frequency, scheme.installment_amount, scheme.total_amount,
+    ]
+    return hashlib.sha256("|".join(str(value) for value in fields).encode()).hexdigest()
+
+
+def to_paise(amount):
+    return int(Decimal(amount) * 100)
+
+
+def installment_dates(scheme):
+    start, end = pd.Timestamp(scheme.start_date), pd.Timestamp(scheme.end_date)
+    frequency = scheme.collection_frequency
+
+    if frequency in FREQUENCY_STEPS:
+        return pd.date_range(start, end, freq=FREQUENCY_STEPS[frequency])
+    if frequency == CollectionFrequencyChoices.MONTHLY:
+        # Offset every installment from the start date so the 31st does not drift to the 28th.
+        months = (end.year - start.year) * 12 + end.month - start.month
+        dates = pd.DatetimeIndex([start + pd.DateOffset(months=month) for month in range(months + 1)])
+        return dates[dates <= end]
+
+    # Custom (or unset) frequency: spread the installments evenly over the scheme period.
+    if scheme.installment_amount:
+        count = math.ceil(scheme.total_amount / scheme.installment_amount)
+    else:
+        count = 1
+    if count <= 1:
+        return pd.DatetimeIndex([end])
+    return pd.date_range(start, end, periods=count).normalize().unique()
+
+
+def scheme_installments(scheme):
+    """Returns the due dates (as a DatetimeIndex) and amounts (in paise) of a scheme's installments."""
+    dates = installment_dates(scheme)
+    total = to_paise(scheme.total_amount)
+    if not len(dates) or total <= 0:
+        return pd.DatetimeIndex([]), np.array([], dtype=np.int64)
+
+    if scheme.installment_amount:
+        installment = to_paise(scheme.installment_amount)
+        amounts = np.clip(total - installment * np.arange(len(dates), dtype=np.int64), 0, installment)
+    else:
+        amounts = np.zeros(len(dates), dtype=np.int64)
+    # The last installment absorbs whatever the regular ones leave unpaid.
+    amounts[-1] += total - amounts.sum()
+
+    keep = amounts > 0
+    return dates[keep], amounts[keep]
+
+
+def write_schedules(scheme, enrollments, batch_size):
+    """Bulk-creates the schedule rows of `enrollments` (id, customer_id, start_date, end_date tuples)."""
+    dates, amounts = scheme_installments(scheme)
+    due_dates = list(dates.date)
+    due_amounts = [Decimal(int(paise)) / 100 for paise in amounts]
+
+    batch, written = [], 0
+    for _, customer_id, start_date, end_date in enrollments:
+        first = dates.searchsorted(pd.Timestamp(max(start_date, scheme.start_date)), side="left")
+        last = dates.searchsorted(pd.Timestamp(min(end_date, scheme.end_date)), side="right")
+        for index in range(first, last):
+            batch.append(PaymentSchedule(
+                customer_id=customer_id, scheme_id=scheme.id, due_date=due_dates[index], amount=due_amounts[index],
+            ))
+        if len(batch) >= batch_size:
+            PaymentSchedule.objects.bulk_create(batch, batch_size=batch_size, ignore_conflicts=True)
+            written += len(batch)
+            batch = []
+
+    if batch:
+        PaymentSchedule.objects.bulk_create(batch, batch_size=batch_size, ignore_conflicts=True)
+        written += len(batch)
+    return written
+
+
+def generate_schedules(scheme_ids=None, force=False, batch_size=5000):
+    """
+    Brings PaymentSchedule up to date for the given schemes (all by default).
+
+    Returns counts of the schemes rebuilt, the enrollments expanded and the
+    installment rows offered to bulk_create (rows that already existed are
+    skipped by the database).
+    """
+    stats = {"schemes_rebuilt": 0, "enrollments": 0, "installments": 0}
+    schemes = Scheme.objects.order_by("id")
+    if scheme_ids:
+        schemes = schemes.filter(id__in=scheme_ids)
+    states = {state.scheme_id: state for state in PaymentScheduleState.objects.filter(scheme__in=schemes)}
+
+    for scheme in schemes:
+        started_at = timezone.now()
+        signature = scheme_signature(scheme)
+        state = states.get(scheme.id)
+        enrollments = CashCollection.objects.filter(scheme=scheme)
+        unpaid = PaymentSchedule.objects.filter(scheme=scheme).exclude(status__in=PRESERVED_STATUSES)
+
+        with transaction.atomic():
+            if force or state is None or state.signature != signature:
+                unpaid.delete()
+                stats["schemes_rebuilt"] += 1
+            else:
+                # Only enrollments created or edited since the last run; an edited
+                # enrollment may have a new period, so its unpaid rows are rebuilt.
+                enrollments = enrollments.filter(updated_at__gte=state.generated_at)
+                unpaid.filter(customer_id__in=enrollments.values("customer_id")).delete()
+
+            rows = list(enrollments.order_by("id").values_list("id", "customer_id", "start_date", "end_date"))
+            stats["enrollments"] += len(rows)
+            stats["installments"] += write_schedules(scheme, rows, batch_size)
+
+            PaymentScheduleState.objects.update_or_create(
+                scheme=scheme, defaults={"signature": signature, "generated_at": started_at},
+            )
+    return stats
@@ -0,0 +1,29 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from collectionplans.models import CashCollectionEntry
+from dashboard import notifications, targets
+from dashboard.models import AgentCollectionTarget
+
+
+@receiver(post_save, sender=CashCollectionEntry)
+def update_targets_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    targets.entry_saved(instance, created)
+    if created:
+        # After commit, so a payment rolled back by the overpayment guard raises no alert.
+        transaction.on_commit(lambda: notifications.alert_large_entries([instance]))
+
+
+@receiver(post_delete, sender=CashCollectionEntry)
+def update_targets_on_delete(sender, instance, **kwargs):
+    targets.entry_deleted(instance)
+
+
+@receiver(post_save, sender=AgentCollectionTarget)
+def reconcile_moved_target(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    targets.target_saved(instance, created)
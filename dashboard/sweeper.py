@@ -0,0 +1,164 @@
+"""
+Keeps PaymentSchedule.status current.
+
+Two steps per run:
+
+1. Allocation. The payments of each enrollment are applied to its
+   installments first-in-first-out: paid rows get the local date of the
+   payment that covered them, and a row covered only in part becomes
+   `partially_paid`. Schedules and payments are read in customer chunks,
+   ordered by enrollment, and merged in a single pass. Only rows whose
+   status or payment date changes are written, with one UPDATE per
+   (status, payment date). Incremental runs only look at customers whose
+   ledger row changed or who got new schedule rows since the last
+   finished sweep.
+
+2. Date roll. Unpaid rows move between `upcoming`, `due` and `overdue`
+   with three UPDATE statements keyed on due_date against today in
+   settings.TIME_ZONE. Each statement only matches rows that change.
+"""
+import itertools
+from decimal import Decimal
+from operator import itemgetter
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from collectionplans.models import CashCollectionBalance, CashCollectionEntry
+from customer.models import Customer
+from dashboard.models import PaymentSchedule, ScheduleSweep
+
+
+UPCOMING = "upcoming"
+DUE = "due"
+OVERDUE = "overdue"
+PAID = "paid"
+PARTIALLY_PAID = "partially_paid"
+
+DATE_STATUSES = (UPCOMING, DUE, OVERDUE)
+
+
+def date_status(due_date, today):
+    if due_date > today:
+        return UPCOMING
+    if due_date == today:
+        return DUE
+    return OVERDUE
+
+
+def allocate_enrollment(schedules, payments, today):
+    """
+    Yields (id, status, actual_payment_date) for the installments of one
+    enrollment whose state changes. `schedules` are ordered by due date and
+    `payments` by payment time.
+    """
+    payments = iter(payments)
+    paid, paid_at, due = Decimal("0.00"), None, Decimal("0.00")
+
+    for schedule_id, _, _, due_date, amount, status, actual_payment_date in schedules:
+        due += amount
+        while paid < due:
+            payment = next(payments, None)
+            if payment is None:
+                break
+            paid += payment[3]
+            paid_at = payment[2]
+
+        if paid >= due:
+            new = (PAID, timezone.localtime(paid_at).date())
+        elif paid > due - amount:
+            new = (PARTIALLY_PAID, None)
+        else:
+            new = (date_status(due_date, today), None)
+        if new != (status, actual_payment_date):
+            yield (schedule_id, *new)
+
+
+def allocate(schedule_rows, payment_rows, today):
+    """Merges schedule and payment rows, both ordered by (customer_id, scheme_id), one enrollment at a time."""
+    payment_groups = itertools.groupby(payment_rows, key=itemgetter(0, 1))
+    pending = next(payment_groups, None)
+
+    for key, schedules in itertools.groupby(schedule_rows, key=itemgetter(1, 2)):
+        while pending is not None and pending[0] < key:
+            pending = next(payment_groups, None)
+        payments = pending[1] if pending is not None and pending[0] == key else ()
+        yield from allocate_enrollment(schedules, payments, today)
+
+
+def allocate_customers(customer_ids, today, batch_size):
+    """Runs the allocation for a chunk of customers and returns the number of rows updated."""
+    schedule_rows = (
+        PaymentSchedule.objects.filter(customer_id__in=customer_ids)
+        .order_by("customer_id", "scheme_id", "due_date", "id")
+        .values_list("id", "customer_id", "scheme_id", "due_date", "amount", "status", "actual_payment_date")
+    )
+    payment_rows = (
+        CashCollectionEntry.objects.filter(customer_id__in=customer_ids, scheme__isnull=False)
+        .order_by("customer_id", "scheme_id", "created_at", "id")
+        .values_list("customer_id", "scheme_id", "created_at", "amount")
+    )
+
+    # Changed rows share few (status, payment date) pairs, so they are written as one
+    # UPDATE ... WHERE id IN (...) per pair and batch rather than row by row.
+    changed = {}
+    for schedule_id, status, actual_payment_date in allocate(schedule_rows, payment_rows, today):
+        changed.setdefault((status, actual_payment_date), []).append(schedule_id)
+
+    now = timezone.now()
+    updated = 0
+    for (status, actual_payment_date), ids in changed.items():
+        for start in range(0, len(ids), batch_size):
+            updated += PaymentSchedule.objects.filter(id__in=ids[start:start + batch_size]).update(
+                status=status, actual_payment_date=actual_payment_date, updated_at=now,
+            )
+    return updated
+
+
+def roll_dates(today):
+    """Moves unpaid rows between upcoming, due and overdue; returns the number of rows updated."""
+    now = timezone.now()
+    unpaid = PaymentSchedule.objects.filter(status__in=DATE_STATUSES)
+    return (
+        unpaid.filter(due_date__lt=today).exclude(status=OVERDUE).update(status=OVERDUE, updated_at=now)
+        + unpaid.filter(due_date=today).exclude(status=DUE).update(status=DUE, updated_at=now)
+        + unpaid.filter(due_date__gt=today).exclude(status=UPCOMING).update(status=UPCOMING, updated_at=now)
+    )
+
+
+def customers_to_allocate(since):
+    customers = Customer.objects.all()
+    if since is not None:
+        customers = customers.filter(
+            Q(id__in=CashCollectionBalance.objects.filter(updated_at__gte=since).values("customer_id"))
+            | Q(id__in=PaymentSchedule.objects.filter(created_at__gte=since).values("customer_id"))
+        )
+    return customers
+
+
+def sweep(full=False, today=None, chunk_size=1000, batch_size=1000):
+    """
+    Runs the allocation and the date roll and records the run. Without
+    `full`, only customers changed since the last finished sweep are
+    re-allocated.
+    """
+    today = today or timezone.localdate()
+    last = ScheduleSweep.objects.filter(finished_at__isnull=False).order_by("-started_at").first()
+    since = None if full or last is None else last.started_at
+    run = ScheduleSweep.objects.create(started_at=timezone.now())
+
+    customers = customers_to_allocate(since).order_by("id").values_list("id", flat=True)
+    last_id = 0
+    while True:
+        customer_ids = list(customers.filter(id__gt=last_id)[:chunk_size])
+        if not customer_ids:
+            break
+        last_id = customer_ids[-1]
+        with transaction.atomic():
+            run.allocated_rows += allocate_customers(customer_ids, today, batch_size)
+
+    run.rolled_rows = roll_dates(today)
+    run.finished_at = timezone.now()
+    run.save()
+    return run
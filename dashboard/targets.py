@@ -0,0 +1,122 @@
+"""
+Incremental maintenance of AgentCollectionTarget.achieved_amount.
+
+A payment counts towards every target of the agent who recorded it
+(`created_by`) whose window covers the payment's local date. Creates,
+edits and deletes are applied as F() deltas with one UPDATE over the
+matching targets. A target that is created, moved to another agent or
+given a different window is recomputed from the entry table, as is every
+target by reconcile_targets() to repair drift.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from collectionplans.models import CashCollectionEntry
+from dashboard.models import AgentCollectionTarget
+
+
+def adjust(agent_id, day, amount):
+    """Adds `amount` to the agent's targets whose window covers `day`."""
+    if agent_id is None or not amount:
+        return
+    AgentCollectionTarget.objects.filter(agent_id=agent_id, start_date__lte=day, end_date__gte=day).update(
+        achieved_amount=F("achieved_amount") + amount, updated_at=timezone.now(),
+    )
+
+
+def contribution(agent_id, created_at, amount):
+    return agent_id, timezone.localdate(created_at), Decimal(amount)
+
+
+def entry_saved(entry, created):
+    """Applies a created or updated entry to its agent's targets."""
+    current = contribution(entry.created_by_id, entry.created_at, entry.amount)
+    previous = getattr(entry, "_loaded_values", None)
+    if created:
+        adjust(*current)
+    elif previous is None or "created_by_id" not in previous:
+        # Loaded without the fields we need (e.g. .only()); recompute the affected targets.
+        reconcile_targets(agent_ids=[entry.created_by_id], include_closed=True)
+    else:
+        before = contribution(previous["created_by_id"], previous["created_at"], previous["amount"])
+        if before[:2] == current[:2]:
+            adjust(current[0], current[1], current[2] - before[2])
+        else:
+            adjust(before[0], before[1], -before[2])
+            adjust(*current)
+
+
+def entry_deleted(entry):
+    """Removes a deleted entry from its agent's targets."""
+    previous = getattr(entry, "_loaded_values", None) or {}
+    agent_id, day, amount = contribution(
+        previous.get("created_by_id", entry.created_by_id),
+        previous.get("created_at", entry.created_at),
+        previous.get("amount", entry.amount),
+    )
+    adjust(agent_id, day, -amount)
+
+
+def target_saved(target, created):
+    """Recomputes a target whose agent or window is new, so payments already in the window count."""
+    previous = getattr(target, "_loaded_values", None)
+    if not created and previous is not None and all(
+        previous.get(field) == getattr(target, field) for field in ("agent_id", "start_date", "end_date")
+    ):
+        return
+    reconcile_targets(agent_ids=[target.agent_id], include_closed=True)
+    target._loaded_values = {
+        "agent_id": target.agent_id, "start_date": target.start_date, "end_date": target.end_date,
+    }
+
+
+def apply_bulk(entries):
+    """Adds bulk-created entries (which bypass post_save) with one UPDATE per agent and day."""
+    totals = defaultdict(Decimal)
+    for entry in entries:
+        agent_id, day, amount = contribution(entry.created_by_id, entry.created_at, entry.amount)
+        totals[(agent_id, day)] += amount
+    for (agent_id, day), amount in totals.items():
+        adjust(agent_id, day, amount)
+
+
+def reconcile_targets(agent_ids=None, include_closed=False, dry_run=False):
+    """
+    Recomputes achieved_amount from the entry table for open targets (all
+    targets with `include_closed`) and returns the targets that had drifted.
+    The actual totals come from one query with a correlated SUM per target.
+    """
+    achieved = (
+        CashCollectionEntry.objects
+        .filter(
+            created_by_id=OuterRef("agent_id"),
+            created_at__date__gte=OuterRef("start_date"),
+            created_at__date__lte=OuterRef("end_date"),
+        )
+        .order_by()
+        .values("created_by_id")
+        .annotate(total=Sum("amount"))
+        .values("total")
+    )
+    money = DecimalField(max_digits=12, decimal_places=2)
+    targets = AgentCollectionTarget.objects.annotate(
+        actual=Coalesce(Subquery(achieved, output_field=money), Decimal("0.00"), output_field=money)
+    )
+    if not include_closed:
+        targets = targets.filter(end_date__gte=timezone.localdate())
+    if agent_ids is not None:
+        targets = targets.filter(agent_id__in=agent_ids)
+
+    drifted = []
+    for target in targets:
+        if target.achieved_amount != target.actual:
+            target.achieved_amount = target.actual
+            target.updated_at = timezone.now()
+            drifted.append(target)
+    if not dry_run:
+        AgentCollectionTarget.objects.bulk_update(drifted, ["achieved_amount", "updated_at"], batch_size=1000)
+    return drifted
@@ -1,3 +1,443 @@
-from django.test import TestCase
+import io
+import math
+import os
+import shutil
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import skipUnless
 
-# Create your tests here.
+import openpyxl
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from collectionplans.models import CashCollection, CashCollectionBalance, CashCollectionEntry, Scheme
+from customer.models import Customer
+from dashboard import jobs, notifications
+from dashboard.models import AgentCollectionTarget, Notification, PaymentSchedule, ReportJob, ScheduleSweep
+from dashboard.reports import report_data, summarize
+from dashboard.schedules import generate_schedules
+from dashboard.sweeper import sweep
+from users.models import CustomUser, UserRoles
+
+
+class ReportJobTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user("9999999999", password="pw", role=UserRoles.ADMIN, is_staff=True)
+        self.agent = CustomUser.objects.create_user("8888888888", password="pw", first_name="Agent", role=UserRoles.AGENT)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.scheme = Scheme.objects.create(
+            scheme_number="S-1", name="Gold", total_amount=Decimal("10000.00"),
+            start_date=date(2025, 1, 1), end_date=date(2025, 12, 31),
+        )
+        user = CustomUser.objects.create_user("9000000001", password="pw", role=UserRoles.CUSTOMER)
+        self.customer = Customer.objects.create(user=user, shop_name="Shop")
+
+    def pay(self, amount, day, method="cash", agent=None):
+        entry = CashCollectionEntry.objects.create(
+            customer=self.customer, scheme=self.scheme, amount=Decimal(amount),
+            payment_method=method, created_by=agent,
+        )
+        # created_at is auto_now_add; move it into the report period.
+        CashCollectionEntry.objects.filter(id=entry.id).update(
+            created_at=timezone.make_aware(datetime.combine(day, datetime.min.time().replace(hour=10)))
+        )
+
+    def test_request_returns_a_job_and_the_worker_builds_the_report(self):
+        self.pay("100.10", date(2025, 3, 3), agent=self.agent)
+        self.pay("200.20", date(2025, 3, 5), method="upi", agent=self.agent)
+        self.pay("50.00", date(2025, 3, 12))
+
+        response = self.client.post(
+            reverse("dashboard_api:report_create"), {"report_type": "weekly", "date": "2025-03-05"}
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["status"], ReportJob.QUEUED)
+
+        out = io.StringIO()
+        call_command("process_report_jobs", "--once", stdout=out)
+        self.assertIn("Processed 1 report jobs", out.getvalue())
+
+        job = self.client.get(reverse("dashboard_api:report_job_detail", args=[response.data["id"]])).data
+        self.assertEqual(job["status"], ReportJob.DONE)
+        data = job["report"]["data"]
+        self.assertEqual(data["period"], {"start_date": "2025-03-03", "end_date": "2025-03-09"})
+        self.assertEqual(data["totals"], {"amount": "300.30", "count": 2})
+        self.assertEqual(data["by_agent"], [{"agent_id": self.agent.id, "agent_name": "Agent", "count": 2, "amount": "300.30"}])
+        self.assertEqual([row["payment_method"] for row in data["by_payment_method"]], ["cash", "upi"])
+
+        workbook = openpyxl.load_workbook(ReportJob.objects.get().report.file.path, read_only=True)
+        self.assertIn("By scheme", workbook.sheetnames)
+
+    def test_chunked_aggregation_matches_a_single_pass(self):
+        for index in range(7):
+            self.pay(f"{index + 1}.25", date(2025, 3, 1 + index % 3), method=["cash", "upi"][index % 2])
+        job = jobs.enqueue_report("March", "monthly", date(2025, 3, 1), date(2025, 3, 31))
+
+        chunked = report_data(summarize(date(2025, 3, 1), date(2025, 3, 31), chunk_size=2), date(2025, 3, 1), date(2025, 3, 31))
+        jobs.process_jobs("test")
+        job.report.refresh_from_db()
+        self.assertEqual(chunked, job.report.data)
+        self.assertEqual(chunked["totals"], {"amount": "29.75", "count": 7})
+
+    def test_a_claimed_job_cannot_be_claimed_again(self):
+        jobs.enqueue_report("Today", "daily", date(2025, 3, 1), date(2025, 3, 1))
+        self.assertIsNotNone(jobs.claim_next_job("first"))
+        self.assertIsNone(jobs.claim_next_job("second"))
+
+    def test_stale_jobs_are_reclaimed_until_attempts_run_out(self):
+        job = jobs.enqueue_report("Today", "daily", date(2025, 3, 1), date(2025, 3, 1))
+        stale = timezone.now() - jobs.job_timeout() - timedelta(minutes=1)
+        ReportJob.objects.filter(id=job.id).update(status=ReportJob.RUNNING, started_at=stale, attempts=1)
+        self.assertEqual(jobs.claim_next_job("second").id, job.id)
+
+        ReportJob.objects.filter(id=job.id).update(started_at=stale, attempts=jobs.max_attempts())
+        self.assertIsNone(jobs.claim_next_job("third"))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.FAILED)
+        self.assertIn("no attempts are left", job.error)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_only_the_requester_or_staff_can_see_a_job(self):
+        job = jobs.enqueue_report("Today", "daily", date(2025, 3, 1), date(2025, 3, 1), self.agent)
+        other = CustomUser.objects.create_user("7777777777", password="pw", role=UserRoles.AGENT)
+        url = reverse("dashboard_api:report_job_detail", args=[job.id])
+
+        client = APIClient()
+        client.force_authenticate(other)
+        self.assertEqual(client.get(url).status_code, 404)
+        client.force_authenticate(self.agent)
+        self.assertEqual(client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_custom_report_needs_both_dates(self):
+        response = self.client.post(
+            reverse("dashboard_api:report_create"), {"report_type": "custom", "start_date": "2025-03-01"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class PaymentScheduleTests(TestCase):
+
+    def setUp(self):
+        self.scheme = Scheme.objects.create(
+            scheme_number="S-1", name="Gold", total_amount=Decimal("1000.00"), installment_amount=Decimal("300.00"),
+            collection_frequency="monthly", start_date=date(2025, 1, 31), end_date=date(2025, 12, 31),
+        )
+        self.customers = []
+        for index in range(3):
+            user = CustomUser.objects.create_user(f"900000000{index}", password="pw", role=UserRoles.CUSTOMER)
+            customer = Customer.objects.create(user=user, shop_name=f"Shop {index}")
+            CashCollection.objects.create(
+                customer=customer, scheme=self.scheme, start_date=self.scheme.start_date, end_date=self.scheme.end_date,
+            )
+            self.customers.append(customer)
+
+    def schedule(self, customer):
+        return list(
+            PaymentSchedule.objects.filter(customer=customer).order_by("due_date").values_list("due_date", "amount")
+        )
+
+    def test_installments_follow_the_frequency_and_sum_to_the_total(self):
+        generate_schedules()
+
+        self.assertEqual(self.schedule(self.customers[0]), [
+            (date(2025, 1, 31), Decimal("300.00")),
+            (date(2025, 2, 28), Decimal("300.00")),
+            (date(2025, 3, 31), Decimal("300.00")),
+            (date(2025, 4, 30), Decimal("100.00")),
+        ])
+        self.assertEqual(PaymentSchedule.objects.count(), 12)
+
+    def test_rerun_is_idempotent_and_only_expands_new_enrollments(self):
+        generate_schedules()
+        self.assertEqual(generate_schedules()["installments"], 0)
+
+        user = CustomUser.objects.create_user("9000000009", password="pw", role=UserRoles.CUSTOMER)
+        late = Customer.objects.create(user=user, shop_name="Late")
+        CashCollection.objects.create(
+            customer=late, scheme=self.scheme, start_date=date(2025, 3, 1), end_date=self.scheme.end_date,
+        )
+        stats = generate_schedules()
+        self.assertEqual((stats["schemes_rebuilt"], stats["enrollments"]), (0, 1))
+        self.assertEqual([row[0] for row in self.schedule(late)], [date(2025, 3, 31), date(2025, 4, 30)])
+
+    def test_scheme_change_rebuilds_unpaid_rows_and_keeps_paid_ones(self):
+        generate_schedules()
+        PaymentSchedule.objects.filter(customer=self.customers[0], due_date=date(2025, 1, 31)).update(status="paid")
+
+        self.scheme.collection_frequency = "weekly"
+        self.scheme.installment_amount = Decimal("250.00")
+        self.scheme.save()
+        stats = generate_schedules()
+
+        self.assertEqual(stats["schemes_rebuilt"], 1)
+        rows = self.schedule(self.customers[0])
+        self.assertEqual(rows[0], (date(2025, 1, 31), Decimal("300.00")))
+        self.assertEqual([row[0] for row in rows[1:]], [date(2025, 2, 7), date(2025, 2, 14), date(2025, 2, 21)])
+        self.assertEqual(PaymentSchedule.objects.filter(status="paid").count(), 1)
+
+
+class ScheduleSweepTests(TestCase):
+
+    def setUp(self):
+        self.scheme = Scheme.objects.create(
+            scheme_number="S-1", name="Gold", total_amount=Decimal("400.00"), installment_amount=Decimal("100.00"),
+            collection_frequency="daily", start_date=date(2025, 3, 1), end_date=date(2025, 3, 4),
+        )
+        user = CustomUser.objects.create_user("9000000001", password="pw", role=UserRoles.CUSTOMER)
+        self.customer = Customer.objects.create(user=user, shop_name="Shop")
+        CashCollection.objects.create(
+            customer=self.customer, scheme=self.scheme, start_date=self.scheme.start_date, end_date=self.scheme.end_date,
+        )
+        generate_schedules()
+
+    def pay(self, amount, day):
+        entry = CashCollectionEntry.objects.create(customer=self.customer, scheme=self.scheme, amount=Decimal(amount))
+        CashCollectionEntry.objects.filter(id=entry.id).update(
+            created_at=timezone.make_aware(datetime.combine(day, datetime.min.time().replace(hour=10)))
+        )
+
+    def statuses(self):
+        return list(PaymentSchedule.objects.order_by("due_date").values_list("status", "actual_payment_date"))
+
+    def test_payments_are_allocated_fifo_and_dates_rolled(self):
+        self.pay("100.00", date(2025, 3, 1))
+        self.pay("50.00", date(2025, 3, 2))
+        sweep(today=date(2025, 3, 3))
+
+        self.assertEqual(self.statuses(), [
+            ("paid", date(2025, 3, 1)),
+            ("partially_paid", None),
+            ("due", None),
+            ("upcoming", None),
+        ])
+
+    def test_only_changed_rows_are_written(self):
+        run = sweep(today=date(2025, 3, 3))
+        self.assertEqual((run.allocated_rows, run.rolled_rows), (3, 0))
+        run = sweep(today=date(2025, 3, 4))
+        self.assertEqual((run.allocated_rows, run.rolled_rows), (0, 2))
+
+        self.pay("250.00", date(2025, 3, 3))
+        run = sweep(today=date(2025, 3, 4))
+        self.assertEqual((run.allocated_rows, run.rolled_rows), (3, 0))
+        self.assertEqual([status for status, _ in self.statuses()], ["paid", "paid", "partially_paid", "due"])
+
+        run = sweep(today=date(2025, 3, 4))
+        self.assertEqual((run.allocated_rows, run.rolled_rows), (0, 0))
+
+    def test_each_run_is_recorded_and_bounds_the_next(self):
+        first = sweep(today=date(2025, 3, 3))
+        second = sweep(today=date(2025, 3, 3))
+
+        runs = list(ScheduleSweep.objects.order_by("started_at").values_list("id", "allocated_rows", "rolled_rows"))
+        self.assertEqual(runs, [(first.id, 3, 0), (second.id, 0, 0)])
+        self.assertFalse(ScheduleSweep.objects.filter(finished_at__isnull=True).exists())
+        self.assertGreaterEqual(second.started_at, first.started_at)
+
+        # An unfinished run (e.g. a crashed sweep) must not move the window forward.
+        ScheduleSweep.objects.create(started_at=timezone.now())
+        self.pay("100.00", date(2025, 3, 3))
+        self.assertEqual(sweep(today=date(2025, 3, 3)).allocated_rows, 1)
+
+
+@skipUnless(os.environ.get("SWEEP_BENCHMARK_ROWS"), "set SWEEP_BENCHMARK_ROWS to benchmark the schedule sweeper")
+class ScheduleSweepBenchmark(TestCase):
+    """Times a full sweep over SWEEP_BENCHMARK_ROWS daily schedule rows (e.g. 3000000)."""
+
+    def test_full_sweep(self):
+        rows = int(os.environ["SWEEP_BENCHMARK_ROWS"])
+        scheme = Scheme.objects.create(
+            scheme_number="S-B", name="Bench", total_amount=Decimal("36500.00"), installment_amount=Decimal("100.00"),
+            collection_frequency="daily", start_date=date(2025, 1, 1), end_date=date(2025, 12, 31),
+        )
+        customers = math.ceil(rows / 365)
+        users = CustomUser.objects.bulk_create([
+            CustomUser(contact_number=f"7{index:09d}", role=UserRoles.CUSTOMER) for index in range(customers)
+        ])
+        customer_rows = Customer.objects.bulk_create([Customer(user=user, shop_name="Bench") for user in users])
+        CashCollection.objects.bulk_create([
+            CashCollection(customer=customer, scheme=scheme, start_date=scheme.start_date, end_date=scheme.end_date)
+            for customer in customer_rows
+        ])
+        generate_schedules()
+        paid_at = timezone.make_aware(datetime(2025, 3, 1, 10))
+        CashCollectionEntry.objects.bulk_create([
+            CashCollectionEntry(customer=customer, scheme=scheme, amount=Decimal("3000.00"), created_at=paid_at)
+            for customer in customer_rows
+        ])
+        CashCollectionBalance.objects.bulk_create([
+            CashCollectionBalance(customer=customer, scheme=scheme, total_paid=Decimal("3000.00"), entry_count=1)
+            for customer in customer_rows
+        ])
+
+        started = time.perf_counter()
+        run = sweep(full=True, today=date(2025, 6, 30))
+        elapsed = time.perf_counter() - started
+        total = PaymentSchedule.objects.count()
+        print(f"\nSwept {total} schedule rows in {elapsed:.2f}s ({total / elapsed:.0f} rows/sec); "
+              f"{run.allocated_rows} allocated, {run.rolled_rows} rolled")
+
+
+class AgentTargetTests(TestCase):
+
+    def setUp(self):
+        self.agent = CustomUser.objects.create_user("8888888888", password="pw", role=UserRoles.AGENT)
+        self.other_agent = CustomUser.objects.create_user("8888888887", password="pw", role=UserRoles.AGENT)
+        self.scheme = Scheme.objects.create(
+            scheme_number="S-1", name="Gold", total_amount=Decimal("10000.00"),
+            start_date=date(2025, 1, 1), end_date=date(2025, 12, 31),
+        )
+        user = CustomUser.objects.create_user("9000000001", password="pw", role=UserRoles.CUSTOMER)
+        self.customer = Customer.objects.create(user=user, shop_name="Shop")
+        today = timezone.localdate()
+        self.target = AgentCollectionTarget.objects.create(
+            agent=self.agent, target_amount=Decimal("1000.00"), start_date=today, end_date=today,
+        )
+        self.past_target = AgentCollectionTarget.objects.create(
+            agent=self.agent, target_amount=Decimal("1000.00"),
+            start_date=date(2024, 1, 1), end_date=date(2024, 1, 31),
+        )
+
+    def pay(self, amount, agent):
+        return CashCollectionEntry.objects.create(
+            customer=self.customer, scheme=self.scheme, amount=Decimal(amount), created_by=agent,
+        )
+
+    def achieved(self, target):
+        target.refresh_from_db()
+        return target.achieved_amount
+
+    def test_achievement_follows_create_edit_reassign_and_delete(self):
+        entry = self.pay("300.00", self.agent)
+        self.pay("50.00", self.other_agent)
+        self.assertEqual(self.achieved(self.target), Decimal("300.00"))
+
+        entry = CashCollectionEntry.objects.get(id=entry.id)
+        entry.amount = Decimal("400.00")
+        entry.save()
+        self.assertEqual(self.achieved(self.target), Decimal("400.00"))
+        self.assertEqual(self.target.achievement_percentage, Decimal("40"))
+
+        entry.created_by = self.other_agent
+        entry.save()
+        self.assertEqual(self.achieved(self.target), Decimal("0.00"))
+
+        entry.created_by = self.agent
+        entry.save()
+        entry.delete()
+        self.assertEqual(self.achieved(self.target), Decimal("0.00"))
+        self.assertEqual(self.achieved(self.past_target), Decimal("0.00"))
+
+    def test_new_and_moved_targets_count_earlier_payments(self):
+        self.pay("300.00", self.agent)
+        yesterday = timezone.localdate() - timedelta(days=1)
+        target = AgentCollectionTarget.objects.create(
+            agent=self.agent, target_amount=Decimal("500.00"), start_date=yesterday, end_date=yesterday,
+        )
+        self.assertEqual(self.achieved(target), Decimal("0.00"))
+
+        target = AgentCollectionTarget.objects.get(id=target.id)
+        target.end_date = timezone.localdate()
+        target.save()
+        self.assertEqual(self.achieved(target), Decimal("300.00"))
+
+        target.agent = self.other_agent
+        target.save()
+        self.assertEqual(self.achieved(target), Decimal("0.00"))
+
+        AgentCollectionTarget.objects.filter(id=self.target.id).update(achieved_amount=Decimal("5.00"))
+        target = AgentCollectionTarget.objects.get(id=self.target.id)
+        target.target_amount = Decimal("2000.00")
+        with self.assertNumQueries(1):
+            target.save()
+
+        created = AgentCollectionTarget.objects.create(
+            agent=self.agent, target_amount=Decimal("500.00"), start_date=timezone.localdate(),
+            end_date=timezone.localdate(),
+        )
+        self.assertEqual(self.achieved(created), Decimal("300.00"))
+
+    def test_reconcile_repairs_open_targets(self):
+        self.pay("300.00", self.agent)
+        AgentCollectionTarget.objects.update(achieved_amount=Decimal("5.00"))
+
+        out = io.StringIO()
+        call_command("reconcile_agent_targets", stdout=out)
+        self.assertIn("1 targets drifted", out.getvalue())
+        self.assertEqual(self.achieved(self.target), Decimal("300.00"))
+        self.assertEqual(self.achieved(self.past_target), Decimal("5.00"))
+
+        call_command("reconcile_agent_targets", "--all", stdout=out)
+        self.assertEqual(self.achieved(self.past_target), Decimal("0.00"))
+
+
+class NotificationTests(TestCase):
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user("9999999999", password="pw", role=UserRoles.ADMIN, is_staff=True)
+        self.users = [
+            CustomUser.objects.create_user(f"90000000{index:02d}", password="pw", role=UserRoles.CUSTOMER)
+            for index in range(5)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def test_fan_out_batches_and_counts_unread(self):
+        user_ids = [user.id for user in self.users]
+        with self.assertNumQueries(5 * 3):
+            # Per batch of 2: notification insert, counter insert, counter update and the savepoint pair.
+            sent = notifications.notify(user_ids, "Hello", "Welcome", "system", batch_size=2)
+        self.assertEqual(sent, 5)
+        notifications.notify(user_ids[:1], "Again", "Welcome", "system")
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("dashboard_api:notification_unread_count"))
+        self.assertEqual(response.data, {"unread": 2})
+
+    def test_inbox_is_paginated_and_mark_read_updates_the_counter(self):
+        for index in range(3):
+            notifications.notify([self.users[0].id], f"Note {index}", "Body", "system")
+
+        response = self.client.get(reverse("dashboard_api:notification_list"), {"page_size": 2, "unread": "true"})
+        self.assertEqual([row["title"] for row in response.data["results"]], ["Note 2", "Note 1"])
+        self.assertIsNotNone(response.data["next"])
+
+        first = response.data["results"][0]["id"]
+        response = self.client.post(reverse("dashboard_api:notification_mark_read"), {"ids": [first, first]}, format="json")
+        self.assertEqual(response.data, {"marked": 1, "unread": 2})
+        response = self.client.post(reverse("dashboard_api:notification_mark_read"), {"all": True}, format="json")
+        self.assertEqual(response.data, {"marked": 2, "unread": 0})
+
+    def test_large_payments_alert_the_admins(self):
+        scheme = Scheme.objects.create(
+            scheme_number="S-1", name="Gold", total_amount=Decimal("100000.00"),
+            start_date=date(2025, 1, 1), end_date=date(2025, 12, 31),
+        )
+        customer = Customer.objects.create(user=self.users[1], shop_name="Shop")
+        with self.settings(LARGE_TRANSACTION_THRESHOLD=Decimal("1000.00")), self.captureOnCommitCallbacks(execute=True):
+            CashCollectionEntry.objects.create(customer=customer, scheme=scheme, amount=Decimal("999.00"))
+            CashCollectionEntry.objects.create(customer=customer, scheme=scheme, amount=Decimal("1000.00"))
+
+        self.assertEqual(notifications.unread_count(self.admin.id), 1)
+        self.assertEqual(Notification.objects.get().notification_type, "large_transaction")
@@ -4,3 +4,18 @@ from django.apps import AppConfig
 class MainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
+
+    def ready(self):
+        from collectionplans.models import Scheme
+        from customer.models import Agent, Customer
+        from main import cache
+        from main.instrumentation import instrument_serializers
+        from users.models import CustomUser
+
+        instrument_serializers()
+
+        cache.register(Scheme, "schemes")
+        cache.register(Agent, "agents")
+        cache.register(Customer, "customers")
+        # Logins only touch last_login, which no cached view exposes.
+        cache.register(CustomUser, "users", ignore_fields=["last_login"])
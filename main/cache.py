@@ -0,0 +1,156 @@
+"""
+Versioned read cache for reference data (schemes, the agent roster).
+
+Every cached value is stored under a key that embeds the current version
+of each namespace it depends on. Saving or deleting a model of a
+namespace bumps that namespace's version, so older entries are never read
+again and simply expire. The versions live in the shared cache backend
+(the file-based cache by default), so a bump made by one gunicorn worker
+is seen by all of them without deleting keys one by one.
+
+Hits and misses are counted per cache name in the same backend; see the
+`read_cache_stats` command.
+"""
+import hashlib
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework import status
+from rest_framework.response import Response
+
+
+MISSING = object()
+
+
+def read_cache():
+    return caches[getattr(settings, "READ_CACHE_ALIAS", "default")]
+
+
+def read_cache_timeout():
+    return getattr(settings, "READ_CACHE_TIMEOUT", 24 * 60 * 60)
+
+
+def version_key(namespace):
+    return f"version:{namespace}"
+
+
+def new_version():
+    # The clock keeps a version lost to eviction from coming back; the random part keeps two
+    # bumps made in the same tick by different workers apart.
+    return f"{time.time_ns()}-{secrets.token_hex(4)}"
+
+
+def versions(namespaces):
+    """Returns the current version of each namespace, initializing missing ones."""
+    cache = read_cache()
+    found = cache.get_many([version_key(namespace) for namespace in namespaces])
+    result = []
+    for namespace in namespaces:
+        value = found.get(version_key(namespace))
+        if value is None:
+            cache.add(version_key(namespace), new_version(), None)
+            value = cache.get(version_key(namespace))
+        result.append(value)
+    return result
+
+
+def bump(namespace):
+    # A fresh value rather than incr(): incr is a get and a set on the file-based cache, so two
+    # concurrent bumps could both write the same successor and one would be lost.
+    read_cache().set(version_key(namespace), new_version(), None)
+
+
+def bump_now_and_on_commit(namespace):
+    # The bump after commit keeps other workers from caching the pre-commit rows under the
+    # new version; the immediate one covers reads made later in this same transaction.
+    bump(namespace)
+    transaction.on_commit(lambda: bump(namespace))
+
+
+def register(model, *namespaces, ignore_fields=()):
+    """Bumps `namespaces` whenever an instance of `model` is saved or deleted."""
+    ignored = frozenset(ignore_fields)
+
+    def on_save(sender, instance, update_fields=None, raw=False, **kwargs):
+        if update_fields and frozenset(update_fields) <= ignored:
+            return
+        for namespace in namespaces:
+            bump_now_and_on_commit(namespace)
+
+    def on_delete(sender, instance, **kwargs):
+        for namespace in namespaces:
+            bump_now_and_on_commit(namespace)
+
+    post_save.connect(on_save, sender=model, weak=False, dispatch_uid=f"read-cache-save:{model._meta.label}")
+    post_delete.connect(on_delete, sender=model, weak=False, dispatch_uid=f"read-cache-delete:{model._meta.label}")
+
+
+def count(name, outcome):
+    cache = read_cache()
+    key = f"stats:{name}:{outcome}"
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def entry_key(name, namespaces, key):
+    version = ".".join(str(value) for value in versions(namespaces))
+    return f"read:{name}:{version}:{hashlib.sha1(key.encode()).hexdigest()}"
+
+
+def cached(name, namespaces, key, compute, timeout=None):
+    """Returns the cached value of `key` under the current namespace versions, computing it on a miss."""
+    cache = read_cache()
+    full_key = entry_key(name, namespaces, key)
+
+    value = cache.get(full_key, MISSING)
+    if value is not MISSING:
+        count(name, "hits")
+        return value
+
+    count(name, "misses")
+    value = compute()
+    cache.set(full_key, value, read_cache_timeout() if timeout is None else timeout)
+    return value
+
+
+def cached_response(request, name, namespaces, build):
+    """
+    Serves a GET response from the cache, keyed by its full URL (so query
+    parameters and cursors are part of the key). `build` returns the DRF
+    Response; only 200 responses are stored.
+    """
+    cache = read_cache()
+    full_key = entry_key(name, namespaces, request.build_absolute_uri())
+
+    data = cache.get(full_key, MISSING)
+    if data is not MISSING:
+        count(name, "hits")
+        return Response(data, status=status.HTTP_200_OK)
+
+    count(name, "misses")
+    response = build()
+    if response.status_code == status.HTTP_200_OK:
+        cache.set(full_key, response.data, read_cache_timeout())
+    return response
+
+
+def stats(names):
+    cache = read_cache()
+    result = {}
+    for name in names:
+        hits = cache.get(f"stats:{name}:hits") or 0
+        misses = cache.get(f"stats:{name}:misses") or 0
+        total = hits + misses
+        result[name] = {"hits": hits, "misses": misses, "hit_rate": hits / total if total else None}
+    return result
+
+
+def reset_stats(names):
+    read_cache().delete_many([f"stats:{name}:{outcome}" for name in names for outcome in ("hits", "misses")])
@@ -0,0 +1,52 @@
+"""
+Serializer timing for main.middleware.QueryInstrumentationMiddleware.
+
+`instrument_serializers()` (called from MainConfig.ready) wraps the
+`data` property of DRF's Serializer and ListSerializer. While a request
+is being collected, the time spent building the outermost `.data` is
+added to the request's stats. That time includes the queries the
+serializer triggers (lazy querysets, SerializerMethodFields), which is
+exactly where per-row N+1 queries hide. Nested serializers are not
+counted twice.
+"""
+import contextlib
+import contextvars
+import time
+
+from rest_framework.serializers import ListSerializer, Serializer
+
+
+current_stats = contextvars.ContextVar("current_stats", default=None)
+serializing = contextvars.ContextVar("serializing", default=False)
+
+
+@contextlib.contextmanager
+def collecting(stats):
+    token = current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_stats.reset(token)
+
+
+def timed_data(original):
+    def data(self):
+        stats = current_stats.get()
+        if stats is None or serializing.get():
+            return original.fget(self)
+        token = serializing.set(True)
+        started = time.perf_counter()
+        try:
+            return original.fget(self)
+        finally:
+            stats.serializer_time += time.perf_counter() - started
+            serializing.reset(token)
+
+    data.instrumented = True
+    return property(data)
+
+
+def instrument_serializers():
+    for serializer_class in (Serializer, ListSerializer):
+        if not getattr(serializer_class.data.fget, "instrumented", False):
+            serializer_class.data = timed_data(serializer_class.data)
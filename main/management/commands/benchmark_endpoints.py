@@ -0,0 +1,218 @@
+"""
+Latency, query and memory benchmark of the hot API endpoints.
+
+For every requested scale a throwaway test database is created, filled
+with `seed_dataset` (the scale is the number of payments) and the
+endpoints are driven in-process through DRF's APIClient against the real
+URLconf and middleware, authenticated with a JWT from the login endpoint.
+With --current the configured database is benchmarked as it is instead
+(it must have been seeded with `seed_dataset`).
+
+Per endpoint the result holds the p50/p95/p99 latency of --iterations
+requests (after --warmup discarded ones), the queries, DB time and
+serializer time per request reported by QueryInstrumentationMiddleware,
+and the peak Python heap allocated by one extra request under
+tracemalloc. POSTs run inside a rolled-back transaction so repeated runs
+see the same data. Everything is written to --output as JSON, tagged with
+the git commit, so runs can be compared across commits.
+"""
+import datetime
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from collectionplans.models import CashCollection, CashCollectionEntry, CollectionEntry
+from customer.models import Customer
+from main.management.commands.seed_dataset import AGENT_PREFIX
+from users import writebehind
+
+
+BENCHMARK_PHONE = f"{AGENT_PREFIX}{0:09d}"
+DEFAULT_SCALES = [1000, 100000, 1000000]
+
+
+def endpoints(phone, password):
+    """(name, method, url, payload) of every benchmarked endpoint; payloads are built against the current data."""
+    enrollment = (
+        CashCollection.objects.with_balances()
+        .filter(paid_amount__lte=F("scheme__total_amount") - 1)
+        .order_by("id").first()
+    )
+    if enrollment is None:
+        raise CommandError("No enrollment with an outstanding balance; seed the database with seed_dataset first.")
+    return [
+        ("login_user", "post", reverse("login_api"), {"phone_number": phone, "password": password}),
+        ("cash_collection_list", "get", reverse("cashcollection_api:cashcollection_list"), None),
+        ("cash_collection_entry_create", "post", reverse("cashcollection_api:cash-collection-entry"), {
+            "customer": enrollment.customer_id, "scheme": enrollment.scheme_id,
+            "amount": "1.00", "payment_method": "cash",
+        }),
+        ("collection_list", "get", reverse("cashcollection_api:collection_list"), None),
+        ("collection_summary", "get", reverse("cashcollection_api:collection_summary"), None),
+        ("customer_list", "get", reverse("partner_api:customer_list"), None),
+        ("get_customer_schemes", "get", reverse("cashcollection_api:customer-scheme-list"), None),
+    ]
+
+
+def percentile(quantiles, value):
+    return round(quantiles[value - 1] * 1000, 2)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "Benchmark the hot API endpoints (latency percentiles, queries, peak memory) and write the results as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scales", type=int, nargs="+", default=DEFAULT_SCALES,
+            help="Payment counts to seed a fresh test database with, one run per scale",
+        )
+        parser.add_argument("--current", action="store_true", help="Benchmark the configured database without seeding")
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument("--phone", default=BENCHMARK_PHONE, help="User to log in as (a seeded agent by default)")
+        parser.add_argument("--password", default="password")
+        parser.add_argument("--output", default="benchmark-results.json")
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 2:
+            raise CommandError("--iterations must be at least 2.")
+
+        runs = []
+        # Every request is reported below; the per-request log records would only add noise and time.
+        request_logger = logging.getLogger("paycollection.requests")
+        previous_level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+                QUERY_INSTRUMENTATION={**getattr(settings, "QUERY_INSTRUMENTATION", {}), "ENABLED": True},
+                # No background flusher on the throwaway databases; run() flushes the journal itself.
+                AUTH_WRITE_BEHIND={**getattr(settings, "AUTH_WRITE_BEHIND", {}), "FLUSH_INTERVAL": 0},
+            ):
+                if options["current"]:
+                    runs.append(self.run(None, options))
+                else:
+                    for scale in options["scales"]:
+                        runs.append(self.run_seeded(scale, options))
+        finally:
+            request_logger.setLevel(previous_level)
+
+        report = {
+            "commit": git_commit(),
+            "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "iterations": options["iterations"],
+            "warmup": options["warmup"],
+            "runs": runs,
+        }
+        with open(options["output"], "w") as output:
+            json.dump(report, output, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def run_seeded(self, scale, options):
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write(f"Seeding {scale} payments...")
+            call_command(
+                "seed_dataset", entries=scale, customers=max(50, scale // 50), daybook=max(1000, scale // 50),
+                password=options["password"], stdout=self.stdout,
+            )
+            return self.run(scale, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run(self, scale, options):
+        rows = {
+            "customers": Customer.objects.count(),
+            "enrollments": CashCollection.objects.count(),
+            "payments": CashCollectionEntry.objects.count(),
+            "daybook": CollectionEntry.objects.count(),
+        }
+        self.stdout.write(f"Benchmarking {', '.join(f'{count} {name}' for name, count in rows.items())}")
+
+        client = APIClient()
+        login = client.post(reverse("login_api"), {"phone_number": options["phone"], "password": options["password"]}, format="json")
+        if login.status_code != 200:
+            raise CommandError(f"Could not log in as {options['phone']}: {login.status_code} {login.data}")
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {login.data['access_token']}")
+
+        results = {}
+        for name, method, url, payload in endpoints(options["phone"], options["password"]):
+            results[name] = self.measure(client, method, url, payload, options["iterations"], options["warmup"])
+            result = results[name]
+            self.stdout.write(
+                f"  {name}: p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms "
+                f"queries={result['queries']} peak={result['peak_memory_kb']}KiB"
+            )
+        # Apply the logins' last_login and token rows while this database still exists.
+        writebehind.journal.flush()
+        return {"scale": scale, "rows": rows, "endpoints": results}
+
+    def measure(self, client, method, url, payload, iterations, warmup):
+        def request():
+            with transaction.atomic():
+                response = client.post(url, payload, format="json") if method == "post" else client.get(url)
+                transaction.set_rollback(True)
+            if response.status_code >= 400:
+                raise CommandError(f"{method.upper()} {url} returned {response.status_code}: {response.data}")
+            return response
+
+        for _ in range(warmup):
+            request()
+
+        latencies, queries, db_times, serializer_times = [], [], [], []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            response = request()
+            latencies.append(time.perf_counter() - started)
+            stats = response.query_stats
+            queries.append(stats.count)
+            db_times.append(stats.db_time)
+            serializer_times.append(stats.serializer_time)
+
+        tracemalloc.start()
+        try:
+            request()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+        return {
+            "status": response.status_code,
+            "p50_ms": percentile(quantiles, 50),
+            "p95_ms": percentile(quantiles, 95),
+            "p99_ms": percentile(quantiles, 99),
+            "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+            "queries": max(queries),
+            "query_budget": response.query_stats.budget,
+            "db_time_ms": round(statistics.fmean(db_times) * 1000, 2),
+            "serializer_time_ms": round(statistics.fmean(serializer_times) * 1000, 2),
+            "peak_memory_kb": round(peak / 1024, 1),
+        }
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from users import writebehind
+
+
+class Command(BaseCommand):
+    help = "Apply the login write-behind journal segments left by processes that are no longer running"
+
+    def handle(self, *args, **options):
+        applied = writebehind.journal.flush()
+        self.stdout.write(self.style.SUCCESS(f"{applied} journal records applied"))
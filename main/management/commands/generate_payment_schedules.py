@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.schedules import generate_schedules
+
+
+class Command(BaseCommand):
+    help = "Expand enrollments into PaymentSchedule installments; safe to re-run, only changed schemes are rebuilt"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scheme", type=int, action="append", dest="schemes", help="Limit to this scheme id (repeatable)")
+        parser.add_argument("--force", action="store_true", help="Rebuild the unpaid installments of every selected scheme")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per bulk insert")
+
+    def handle(self, *args, **options):
+        stats = generate_schedules(options["schemes"], force=options["force"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {stats['schemes_rebuilt']} schemes, expanded {stats['enrollments']} enrollments "
+            f"into {stats['installments']} installments"
+        ))
@@ -0,0 +1,35 @@
+import os
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from dashboard.jobs import process_jobs
+
+
+class Command(BaseCommand):
+    help = "Build queued dashboard reports; runs as a long-lived worker unless --once is given"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain the queue once and exit")
+        parser.add_argument("--poll-interval", type=float, default=5.0, help="Seconds to sleep when the queue is empty")
+        parser.add_argument("--limit", type=int, default=None, help="Stop after this many jobs")
+
+    def handle(self, *args, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        remaining = options["limit"]
+        total = 0
+
+        while remaining is None or remaining > 0:
+            close_old_connections()
+            processed = process_jobs(worker, limit=remaining)
+            total += processed
+            if remaining is not None:
+                remaining -= processed
+            if options["once"]:
+                break
+            if not processed:
+                time.sleep(options["poll_interval"])
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} report jobs"))
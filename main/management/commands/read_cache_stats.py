@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from main import cache
+
+
+CACHE_NAMES = ["scheme_list", "agent_list", "agent_detail", "admin_user_ids"]
+
+
+class Command(BaseCommand):
+    help = "Show hit/miss counts and hit rates of the versioned read cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Zero the counters after printing them")
+
+    def handle(self, *args, **options):
+        for name, counts in cache.stats(CACHE_NAMES).items():
+            rate = "-" if counts["hit_rate"] is None else f"{counts['hit_rate']:.1%}"
+            self.stdout.write(f"{name}: hits={counts['hits']} misses={counts['misses']} hit_rate={rate}")
+        if options["reset"]:
+            cache.reset_stats(CACHE_NAMES)
+            self.stdout.write(self.style.SUCCESS("Counters reset"))
@@ -0,0 +1,114 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from collectionplans import ledger
+from collectionplans.models import CashCollectionBalance, CashCollectionEntry
+from customer.models import Customer
+
+
+NO_ENTRIES = {"total": None, "count": 0, "latest": None}
+
+
+class Command(BaseCommand):
+    help = "Recompute CashCollectionBalance rows from CashCollectionEntry in customer chunks and report drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Customers processed per transaction")
+        parser.add_argument("--dry-run", action="store_true", help="Report drift without writing any changes")
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        dry_run = options["dry_run"]
+        self.verbosity = options["verbosity"]
+
+        checked = created = updated = deleted = 0
+        last_id = 0
+
+        while True:
+            customer_ids = list(
+                Customer.objects.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[:chunk_size]
+            )
+            if not customer_ids:
+                break
+            last_id = customer_ids[-1]
+
+            with transaction.atomic():
+                stored = {
+                    (balance.customer_id, balance.scheme_id): balance
+                    for balance in CashCollectionBalance.objects.select_for_update().filter(
+                        customer_id__in=customer_ids
+                    )
+                }
+                actual = self.entry_totals(customer_ids)
+
+                missing, to_update = [], []
+                for key, row in actual.items():
+                    checked += 1
+                    balance = stored.pop(key, None)
+                    if balance is None:
+                        missing.append(key)
+                        self.report_drift("missing", key, None, row)
+                    elif (balance.total_paid, balance.entry_count, balance.last_payment_at) != (
+                        row["total"], row["count"], row["latest"]
+                    ):
+                        self.report_drift("mismatch", key, balance, row)
+                        to_update.append(self.repair(balance, row))
+
+                # Whatever is left has no entries behind it any more.
+                orphans = [balance for balance in stored.values() if balance.entry_count or balance.total_paid]
+                for balance in orphans:
+                    self.report_drift("orphan", (balance.customer_id, balance.scheme_id), balance, None)
+
+                created += len(missing)
+                updated += len(to_update)
+                deleted += len(orphans)
+
+                if not dry_run:
+                    if missing:
+                        # A payment may have created some of these rows since they were read, so
+                        # insert what is still missing, lock them all and re-read their entries.
+                        locked = ledger.lock_balances(missing)
+                        recheck = self.entry_totals({customer_id for customer_id, _ in missing})
+                        for key, balance in locked.items():
+                            to_update.append(self.repair(balance, recheck.get(key, NO_ENTRIES)))
+                    CashCollectionBalance.objects.bulk_update(
+                        to_update, ["total_paid", "entry_count", "last_payment_at", "updated_at"]
+                    )
+                    CashCollectionBalance.objects.filter(id__in=[balance.id for balance in orphans]).delete()
+
+        drift = created + updated + deleted
+        summary = (
+            f"Checked {checked} balances: {created} missing, {updated} mismatched, {deleted} orphaned"
+            + (" (dry run, nothing written)" if dry_run else "")
+        )
+        self.stdout.write(self.style.WARNING(summary) if drift else self.style.SUCCESS(summary))
+
+    def entry_totals(self, customer_ids):
+        rows = (
+            CashCollectionEntry.objects
+            .filter(customer_id__in=customer_ids, scheme__isnull=False)
+            .order_by()
+            .values("customer_id", "scheme_id")
+            .annotate(total=Sum("amount"), count=Count("id"), latest=Max("created_at"))
+        )
+        return {(row["customer_id"], row["scheme_id"]): row for row in rows}
+
+    def repair(self, balance, row):
+        balance.total_paid = row["total"] or Decimal("0.00")
+        balance.entry_count = row["count"]
+        balance.last_payment_at = row["latest"]
+        # bulk_update() skips auto_now; delta sync and the sweeper key on updated_at.
+        balance.updated_at = timezone.now()
+        return balance
+
+    def report_drift(self, kind, key, balance, row):
+        if self.verbosity < 2:
+            return
+        stored = f"{balance.total_paid}/{balance.entry_count}" if balance else "-"
+        actual = f"{row['total']}/{row['count']}" if row else "-"
+        self.stdout.write(f"{kind}: customer={key[0]} scheme={key[1]} stored={stored} actual={actual}")
+
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.targets import reconcile_targets
+
+
+class Command(BaseCommand):
+    help = "Recompute AgentCollectionTarget.achieved_amount from CashCollectionEntry and report drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Include targets whose window has ended")
+        parser.add_argument("--dry-run", action="store_true", help="Report drift without writing any changes")
+
+    def handle(self, *args, **options):
+        drifted = reconcile_targets(include_closed=options["all"], dry_run=options["dry_run"])
+        if options["verbosity"] >= 2:
+            for target in drifted:
+                self.stdout.write(f"target={target.id} agent={target.agent_id} actual={target.actual}")
+        summary = f"{len(drifted)} targets drifted" + (" (dry run, nothing written)" if options["dry_run"] else "")
+        self.stdout.write(self.style.WARNING(summary) if drifted else self.style.SUCCESS(summary))
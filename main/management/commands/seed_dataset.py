@@ -0,0 +1,320 @@
+"""
+Synthetic production-scale data for benchmarks and query-plan work.
+
+Everything is generated with a seeded numpy Generator and written in
+batches, one chunk of customers at a time, so memory stays flat however
+many rows are requested. Payments, the bulk of the rows, go through a
+plain executemany INSERT; the other tables use bulk_create. All users share one password hash
+computed up front. Distributions:
+
+- schemes: 60% daily, 25% weekly, 15% monthly; installments log-normal
+  around ₹200 / ₹1,000 / ₹5,000, rounded to ₹10; periods of 3 to 24
+  months starting in the last 18 months;
+- enrollments: 1 to 4 per customer (geometric), schemes picked with a
+  Zipf-like popularity;
+- payments: spread over enrollments in proportion to their elapsed
+  installments; 85% pay the installment, 10% half, 5% double, never past
+  the scheme total; paid around 11:00 local time; 70% cash, 25% UPI, 5%
+  bank transfer, recorded by the customer's agent;
+- daybook: 70% credits, log-normal amounts, dates over the last year.
+
+Neither path runs the post_save receivers, so the ledger is rebuilt
+with `rebuild_balances` at the end and daybook checkpoints are dropped.
+"""
+import contextlib
+import datetime
+import itertools
+import math
+import time
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from collectionplans import checkpoints
+from collectionplans.models import (
+    CashCollection, CashCollectionEntry, CollectionEntry, CollectionFrequencyChoices, Scheme,
+)
+from customer.models import Agent, Customer, CustomerAssignment
+from main import cache as read_cache
+from users.models import CustomUser, UserRoles
+
+
+FREQUENCIES = [CollectionFrequencyChoices.DAILY, CollectionFrequencyChoices.WEEKLY, CollectionFrequencyChoices.MONTHLY]
+FREQUENCY_SHARES = [0.60, 0.25, 0.15]
+STEP_DAYS = {CollectionFrequencyChoices.DAILY: 1, CollectionFrequencyChoices.WEEKLY: 7, CollectionFrequencyChoices.MONTHLY: 30}
+MEDIAN_INSTALLMENT = {CollectionFrequencyChoices.DAILY: 200, CollectionFrequencyChoices.WEEKLY: 1000, CollectionFrequencyChoices.MONTHLY: 5000}
+PERIOD_DAYS = {CollectionFrequencyChoices.DAILY: (90, 365), CollectionFrequencyChoices.WEEKLY: (180, 365), CollectionFrequencyChoices.MONTHLY: (180, 730)}
+
+PAYMENT_METHODS = np.array(["cash", "upi", "bank_transfer"])
+PAYMENT_METHOD_SHARES = [0.70, 0.25, 0.05]
+AMOUNT_MULTIPLIERS = np.array([1.0, 0.5, 2.0])
+AMOUNT_MULTIPLIER_SHARES = [0.85, 0.10, 0.05]
+PAYMENT_COLUMNS = ["customer", "scheme", "amount", "payment_method", "created_by", "created_at", "updated_at"]
+
+CUSTOMER_PREFIX = "6"
+AGENT_PREFIX = "7"
+
+
+@contextlib.contextmanager
+def explicit_timestamps(*models):
+    """Lets bulk_create keep the generated created_at values instead of stamping now()."""
+    fields = [field for model in models for field in model._meta.concrete_fields if getattr(field, "auto_now_add", False)]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def paise_to_decimal(paise, cache={}):
+    value = cache.get(paise)
+    if value is None:
+        value = cache[paise] = Decimal(int(paise)).scaleb(-2)
+    return value
+
+
+def adapt_datetimes(moments):
+    """Formats an aware DatetimeIndex the way the backend stores datetimes, without a per-row adapt call."""
+    if connection.vendor == "sqlite":
+        return moments.tz_convert("UTC").strftime("%Y-%m-%d %H:%M:%S").tolist()
+    return moments.to_pydatetime().tolist()
+
+
+def insert_rows(model, columns, rows, batch_size):
+    """
+    Writes already adapted `rows` (tuples in `columns` order) with
+    executemany. For the payments table this is several times faster than
+    bulk_create, which prepares every value of every instance in Python.
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    names = ", ".join(connection.ops.quote_name(model._meta.get_field(column).column) for column in columns)
+    sql = f"INSERT INTO {table} ({names}) VALUES ({', '.join(['%s'] * len(columns))})"
+    written = 0
+    with connection.cursor() as cursor:
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                return written
+            cursor.executemany(sql, batch)
+            written += len(batch)
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic, production-scale dataset (users, schemes, enrollments, payments, daybook)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=int, default=10000)
+        parser.add_argument("--agents", type=int, default=50)
+        parser.add_argument("--schemes", type=int, default=20)
+        parser.add_argument("--entries", type=int, default=500000, help="Approximate number of CashCollectionEntry rows")
+        parser.add_argument("--daybook", type=int, default=20000, help="CollectionEntry rows")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Customers generated per transaction")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per bulk_create batch")
+        parser.add_argument("--password", default="password", help="Password shared by every generated user")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        if min(options["customers"], options["agents"], options["schemes"]) < 1:
+            raise CommandError("--customers, --agents and --schemes must be at least 1.")
+        if CustomUser.objects.filter(contact_number__startswith=CUSTOMER_PREFIX, role=UserRoles.CUSTOMER).exists():
+            raise CommandError("The database already holds generated customers; seed into an empty database.")
+
+        self.rng = np.random.default_rng(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.password = make_password(options["password"])
+        self.today = timezone.localdate()
+        started = time.perf_counter()
+
+        with connection.cursor() as cursor:
+            if connection.vendor == "sqlite" and not connection.in_atomic_block:
+                # Durability is not needed for throwaway data; this roughly halves SQLite insert time.
+                cursor.execute("PRAGMA synchronous = OFF")
+
+        with explicit_timestamps(CollectionEntry):
+            agents = self.create_agents(options["agents"])
+            schemes = self.create_schemes(options["schemes"])
+            entries = self.create_customers(options, agents, schemes)
+            daybook = self.create_daybook(options["daybook"])
+
+        self.stdout.write("Rebuilding the balance ledger...")
+        call_command("rebuild_balances", stdout=self.stdout)
+        checkpoints.invalidate_from(datetime.date.min)
+        checkpoints.materialize_closed_days()
+        for namespace in ("schemes", "agents", "customers", "users"):
+            read_cache.bump(namespace)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {options['customers']} customers, {len(agents)} agents, {len(schemes)} schemes, "
+            f"{entries} payments and {daybook} daybook rows in {elapsed:.1f}s"
+        ))
+
+    # Reference data ---------------------------------------------------------------------
+
+    def create_agents(self, count):
+        users = CustomUser.objects.bulk_create([
+            CustomUser(contact_number=f"{AGENT_PREFIX}{index:09d}", first_name="Agent", last_name=str(index),
+                       role=UserRoles.AGENT, password=self.password)
+            for index in range(count)
+        ], batch_size=self.batch_size)
+        Agent.objects.bulk_create([Agent(user=user) for user in users], batch_size=self.batch_size)
+        return [user.id for user in users]
+
+    def create_schemes(self, count):
+        frequencies = self.rng.choice(FREQUENCIES, size=count, p=FREQUENCY_SHARES)
+        schemes = []
+        for index, frequency in enumerate(frequencies):
+            low, high = PERIOD_DAYS[frequency]
+            days = int(self.rng.integers(low, high + 1))
+            start = self.today - datetime.timedelta(days=int(self.rng.integers(0, 540)))
+            installments = max(1, days // STEP_DAYS[frequency])
+            installment = max(10, int(round(self.rng.lognormal(math.log(MEDIAN_INSTALLMENT[frequency]), 0.5), -1)))
+            schemes.append(Scheme(
+                scheme_number=f"SEED-{index:04d}", name=f"Seed scheme {index} ({frequency})",
+                collection_frequency=str(frequency), installment_amount=Decimal(installment),
+                total_amount=Decimal(installment * installments),
+                start_date=start, end_date=start + datetime.timedelta(days=days),
+            ))
+        return Scheme.objects.bulk_create(schemes)
+
+    # Customers, enrollments and payments ------------------------------------------------------
+
+    def create_customers(self, options, agents, schemes):
+        total_customers, chunk_size = options["customers"], options["chunk_size"]
+        entries_per_customer = options["entries"] / total_customers
+        popularity = 1 / np.arange(1, len(schemes) + 1)
+        popularity /= popularity.sum()
+
+        written = 0
+        for offset in range(0, total_customers, chunk_size):
+            count = min(chunk_size, total_customers - offset)
+            with transaction.atomic():
+                written += self.create_customer_chunk(
+                    offset, count, agents, schemes, popularity, round(entries_per_customer * count)
+                )
+            self.stdout.write(f"  {offset + count}/{total_customers} customers, {written} payments")
+        return written
+
+    def create_customer_chunk(self, offset, count, agents, schemes, popularity, entries):
+        rng = self.rng
+        users = CustomUser.objects.bulk_create([
+            CustomUser(contact_number=f"{CUSTOMER_PREFIX}{offset + index:09d}", first_name="Customer",
+                       last_name=str(offset + index), role=UserRoles.CUSTOMER, password=self.password)
+            for index in range(count)
+        ], batch_size=self.batch_size)
+        customers = Customer.objects.bulk_create([
+            Customer(user=user, shop_name=f"Shop {offset + index}") for index, user in enumerate(users)
+        ], batch_size=self.batch_size)
+        customer_ids = np.array([customer.id for customer in customers])
+
+        customer_agents = rng.choice(agents, size=count)
+        assignments = [
+            CustomerAssignment(customer_id=customer_id, agent_id=agent_id)
+            for customer_id, agent_id in zip(customer_ids.tolist(), customer_agents.tolist())
+        ]
+        # A few customers changed hands and keep an inactive assignment to their previous agent.
+        moved = np.flatnonzero(rng.random(count) < 0.05)
+        assignments += [
+            CustomerAssignment(customer_id=int(customer_ids[index]), agent_id=int(rng.choice(agents)), is_active=False)
+            for index in moved
+        ]
+        CustomerAssignment.objects.bulk_create(assignments, batch_size=self.batch_size)
+
+        # Enrollments: 1-4 distinct schemes per customer.
+        per_customer = np.minimum(rng.geometric(0.55, size=count), min(4, len(schemes)))
+        enrollment_customer, enrollment_scheme = [], []
+        for index, enrolled in enumerate(per_customer):
+            picks = rng.choice(len(schemes), size=enrolled, replace=False, p=popularity)
+            enrollment_customer += [index] * enrolled
+            enrollment_scheme += picks.tolist()
+        enrollment_customer = np.array(enrollment_customer)
+        enrollment_scheme = np.array(enrollment_scheme)
+
+        starts, ends = [], []
+        for scheme_index in enrollment_scheme:
+            scheme = schemes[scheme_index]
+            period = (scheme.end_date - scheme.start_date).days
+            start = scheme.start_date + datetime.timedelta(days=int(rng.integers(0, max(1, period // 3))))
+            starts.append(start)
+            ends.append(scheme.end_date)
+        CashCollection.objects.bulk_create([
+            CashCollection(customer_id=int(customer_ids[customer]), scheme_id=schemes[scheme].id, start_date=start, end_date=end)
+            for customer, scheme, start, end in zip(enrollment_customer, enrollment_scheme, starts, ends)
+        ], batch_size=self.batch_size)
+
+        return self.create_payments(
+            entries, schemes, customer_ids[enrollment_customer], customer_agents[enrollment_customer],
+            enrollment_scheme, np.array(starts, dtype="datetime64[D]"), np.array(ends, dtype="datetime64[D]"),
+        )
+
+    def create_payments(self, entries, schemes, customer_ids, agent_ids, scheme_indexes, starts, ends):
+        rng = self.rng
+        today = np.datetime64(self.today, "D")
+        step = np.array([STEP_DAYS[schemes[index].collection_frequency] for index in scheme_indexes])
+        installment = np.array([int(schemes[index].installment_amount * 100) for index in scheme_indexes])
+        total = np.array([int(schemes[index].total_amount * 100) for index in scheme_indexes])
+
+        # Payments so far are proportional to the installments elapsed, capped by them.
+        elapsed_days = np.clip((np.minimum(ends, today) - starts).astype(np.int64) + 1, 0, None)
+        capacity = np.minimum(elapsed_days // step + (elapsed_days > 0), total // np.maximum(installment, 1))
+        if capacity.sum() == 0 or entries == 0:
+            return 0
+        counts = np.minimum(rng.multinomial(entries, capacity / capacity.sum()), capacity)
+
+        enrollment = np.repeat(np.arange(len(counts)), counts)
+        days = (rng.random(len(enrollment)) * elapsed_days[enrollment]).astype(np.int64)
+        order = np.lexsort((days, enrollment))
+        enrollment, days = enrollment[order], days[order]
+
+        amounts = (installment[enrollment] * rng.choice(AMOUNT_MULTIPLIERS, size=len(enrollment), p=AMOUNT_MULTIPLIER_SHARES)).astype(np.int64)
+        amounts = np.maximum(amounts // 1000 * 1000, 1000)
+        # Never pay past the scheme total: clip against the running sum within each enrollment.
+        running = np.cumsum(amounts)
+        prefix = np.concatenate(([0], running))
+        before = running - amounts - np.repeat(prefix[np.cumsum(counts) - counts], counts)
+        amounts = np.clip(total[enrollment] - before, 0, amounts)
+        keep = amounts > 0
+
+        minutes = np.clip(rng.normal(11 * 60, 150, size=len(enrollment)), 7 * 60, 21 * 60).astype(np.int64)
+        local = pd.to_datetime(starts[enrollment] + days) + pd.to_timedelta(minutes, unit="min")
+        created_at = adapt_datetimes(local.tz_localize(settings.TIME_ZONE)[keep])
+        methods = rng.choice(PAYMENT_METHODS, size=len(enrollment), p=PAYMENT_METHOD_SHARES)
+        scheme_ids = np.array([scheme.id for scheme in schemes])[scheme_indexes]
+
+        rows = zip(
+            customer_ids[enrollment][keep].tolist(), scheme_ids[enrollment][keep].tolist(),
+            map(paise_to_decimal, amounts[keep].tolist()), methods[keep].tolist(),
+            agent_ids[enrollment][keep].tolist(), created_at, created_at,
+        )
+        return insert_rows(CashCollectionEntry, PAYMENT_COLUMNS, rows, self.batch_size)
+
+    # Daybook ------------------------------------------------------------------------------
+
+    def create_daybook(self, count):
+        rng = self.rng
+        written = 0
+        for offset in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - offset)
+            credit = rng.random(size) < 0.7
+            amounts = np.maximum(np.round(rng.lognormal(math.log(2000), 1.0, size=size), -1), 10).astype(np.int64)
+            days = rng.integers(0, 365, size=size)
+            moments = timezone.now() - pd.to_timedelta(days, unit="D")
+            CollectionEntry.objects.bulk_create([
+                CollectionEntry(
+                    type="credit" if is_credit else "debit", amount=Decimal(int(amount)),
+                    date=self.today - datetime.timedelta(days=int(day)), narration="Seeded",
+                    created_at=moment,
+                )
+                for is_credit, amount, day, moment in zip(credit.tolist(), amounts.tolist(), days.tolist(), moments)
+            ], batch_size=self.batch_size)
+            written += size
+        return written
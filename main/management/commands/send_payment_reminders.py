@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.notifications import fan_out, payment_reminders
+
+
+class Command(BaseCommand):
+    help = "Notify customers of installments due today and of installments that became overdue yesterday; run once a day"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Notifications per bulk insert")
+
+    def handle(self, *args, **options):
+        sent = fan_out(payment_reminders(), batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} payment reminders"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.sweeper import sweep
+
+
+class Command(BaseCommand):
+    help = "Allocate payments to PaymentSchedule rows FIFO and roll upcoming/due/overdue statuses; run daily"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Re-allocate every customer, not only those changed since the last sweep")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Customers allocated per transaction")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows per bulk update")
+
+    def handle(self, *args, **options):
+        run = sweep(full=options["full"], chunk_size=options["chunk_size"], batch_size=options["batch_size"])
+        elapsed = (run.finished_at - run.started_at).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f"Allocated {run.allocated_rows} and rolled {run.rolled_rows} schedule rows in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,134 @@
+"""
+Per-request database and serializer instrumentation.
+
+QueryInstrumentationMiddleware wraps every database connection with
+`connection.execute_wrapper` for the duration of a request and records
+the number of queries, the time spent in them and the statements that
+ran more than once with different parameters (the N+1 signature). Time
+spent in DRF serializers is added by main.instrumentation.
+
+The numbers are:
+- attached to the response as `response.query_stats` (used by
+  main.testing.QueryBudgetMixin in the test suite);
+- sent as X-DB-* response headers when the user is staff;
+- logged as one structured record per request on the
+  `paycollection.requests` logger, at WARNING when the request ran over
+  its QUERY_BUDGETS entry or repeated a statement
+  QUERY_INSTRUMENTATION["DUPLICATE_THRESHOLD"] times or more.
+
+Streaming responses (the CSV/XLSX exports) run most of their queries
+after the middleware returns, so only their setup queries are counted.
+"""
+import contextlib
+import json
+import logging
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+
+from main import instrumentation
+
+
+logger = logging.getLogger("paycollection.requests")
+
+
+def instrumentation_setting(name, default):
+    return getattr(settings, "QUERY_INSTRUMENTATION", {}).get(name, default)
+
+
+def query_budget(view_name):
+    return getattr(settings, "QUERY_BUDGETS", {}).get(view_name)
+
+
+class QueryStats:
+    """Queries, DB time and serializer time of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.statements = Counter()
+        self.view_name = None
+        self.budget = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+    def duplicates(self, threshold=2):
+        """Statements (with placeholders, so parameters do not matter) that ran at least `threshold` times."""
+        return {sql: count for sql, count in self.statements.items() if count >= threshold}
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.count > self.budget
+
+    def headers(self):
+        headers = {
+            "X-DB-Queries": str(self.count),
+            "X-DB-Time-ms": f"{self.db_time * 1000:.1f}",
+            "X-DB-Duplicate-Queries": str(sum(count - 1 for count in self.duplicates().values())),
+            "X-Serializer-Time-ms": f"{self.serializer_time * 1000:.1f}",
+        }
+        if self.budget is not None:
+            headers["X-DB-Query-Budget"] = str(self.budget)
+        return headers
+
+    def record(self, request, response, duration):
+        return {
+            "method": request.method,
+            "path": request.path,
+            "view": self.view_name,
+            "status": response.status_code,
+            "duration_ms": round(duration * 1000, 1),
+            "queries": self.count,
+            "budget": self.budget,
+            "db_time_ms": round(self.db_time * 1000, 1),
+            "serializer_time_ms": round(self.serializer_time * 1000, 1),
+            "duplicates": [
+                {"sql": sql[:300], "count": count}
+                for sql, count in sorted(self.duplicates().items(), key=lambda item: -item[1])[:5]
+            ],
+        }
+
+
+class QueryInstrumentationMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not instrumentation_setting("ENABLED", True):
+            return self.get_response(request)
+
+        stats = QueryStats()
+        started = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            stack.enter_context(instrumentation.collecting(stats))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        match = getattr(request, "resolver_match", None)
+        stats.view_name = match.view_name if match else None
+        stats.budget = query_budget(stats.view_name)
+        response.query_stats = stats
+
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated and user.is_staff:
+            for header, value in stats.headers().items():
+                response[header] = value
+
+        threshold = instrumentation_setting("DUPLICATE_THRESHOLD", 5)
+        level = logging.WARNING if stats.over_budget or stats.duplicates(threshold) else logging.DEBUG
+        if logger.isEnabledFor(level):
+            logger.log(level, json.dumps(stats.record(request, response, duration)))
+        return response
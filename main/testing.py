@@ -0,0 +1,19 @@
+"""Test helpers built on main.middleware.QueryInstrumentationMiddleware."""
+
+
+class QueryBudgetMixin:
+    """
+    Asserts that a test-client response stayed within the QUERY_BUDGETS
+    entry of its view. Budgets are fixed numbers, so seeding a test with
+    more rows than the budget makes any per-row query fail the test.
+    """
+
+    def assertWithinQueryBudget(self, response):
+        stats = getattr(response, "query_stats", None)
+        self.assertIsNotNone(stats, "QueryInstrumentationMiddleware did not run for this response")
+        self.assertIsNotNone(stats.budget, f"No QUERY_BUDGETS entry for {stats.view_name!r}")
+        duplicates = "\n".join(f"{count}x {sql}" for sql, count in stats.duplicates().items())
+        self.assertLessEqual(
+            stats.count, stats.budget,
+            f"{stats.view_name} ran {stats.count} queries (budget {stats.budget}). Repeated statements:\n{duplicates}",
+        )
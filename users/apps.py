@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from users.authentication import discard_user_state
+        from users.models import CustomUser
+
+        post_save.connect(discard_user_state, sender=CustomUser, dispatch_uid="users-claims-state-save")
+        post_delete.connect(discard_user_state, sender=CustomUser, dispatch_uid="users-claims-state-delete")
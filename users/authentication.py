@@ -0,0 +1,116 @@
+"""
+Stateless JWT authentication for read-heavy endpoints.
+
+ClaimsJWTAuthentication trusts the role and flags that users.tokens
+embeds in the token and returns a ClaimsUser built from them, instead of
+loading CustomUser on every request as simplejwt's JWTAuthentication
+does. Revocation is checked against each user's current state (active
+flag, role, is_staff, is_deleted), read with one small query and kept
+in process memory for JWT_CLAIMS_STATE_TTL seconds, so a deactivation or
+role change takes effect within that time. Saving a user drops its
+entry in the saving process straight away.
+
+A token whose claims no longer match the user's state, or that predates
+the claims, falls back to the JWTAuthentication user load; it keeps
+working and gets current claims at the next login.
+
+ClaimsUser is not a model instance: only views that read nothing but
+the user's pk, role and flags (and never assign request.user to a
+foreign key) should use this class.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from users.models import CustomUser
+from users.tokens import USER_CLAIMS
+
+
+MAX_CACHED_USERS = 10000
+
+
+def state_ttl():
+    return getattr(settings, "JWT_CLAIMS_STATE_TTL", 60)
+
+
+class UserStateCache:
+    """Per-process TTL cache of the user state the claims are checked against."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+
+        state = (
+            CustomUser.objects.filter(pk=user_id)
+            .values("is_active", *USER_CLAIMS)
+            .first()
+        )
+        with self.lock:
+            self.entries.pop(user_id, None)
+            self.entries[user_id] = (now + state_ttl(), state)
+            while len(self.entries) > MAX_CACHED_USERS:
+                self.entries.popitem(last=False)
+        return state
+
+    def discard(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+user_states = UserStateCache()
+
+
+def discard_user_state(sender, instance, **kwargs):
+    user_states.discard(instance.pk)
+
+
+class ClaimsUser(TokenUser):
+    """request.user of ClaimsJWTAuthentication: the token's user id, role and flags."""
+
+    @cached_property
+    def role(self):
+        return self.token["role"]
+
+    @cached_property
+    def is_staff(self):
+        return self.token["is_staff"]
+
+    @cached_property
+    def is_deleted(self):
+        return self.token["is_deleted"]
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN or any(
+            claim not in validated_token for claim in (api_settings.USER_ID_CLAIM, *USER_CLAIMS)
+        ):
+            return super().get_user(validated_token)
+
+        state = user_states.get(validated_token[api_settings.USER_ID_CLAIM])
+        if state is None:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+        if api_settings.CHECK_USER_IS_ACTIVE and not state["is_active"]:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        if any(validated_token[claim] != state[claim] for claim in USER_CLAIMS):
+            return super().get_user(validated_token)
+        return ClaimsUser(validated_token)
@@ -13,6 +13,8 @@ class PhoneNumberBackend(ModelBackend):
         try:
             user = CustomUser.objects.get(contact_number=username)
         except CustomUser.DoesNotExist:
+            # Hash anyway so unknown numbers take as long as wrong passwords (as ModelBackend does).
+            CustomUser().set_password(password)
             return None
 
         if user.check_password(password) and self.user_can_authenticate(user):
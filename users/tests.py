@@ -1,7 +1,32 @@
-from django.test import TestCase
+from unittest import mock
+
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import MD5PasswordHasher
+from django.db import connection
 from django.db.utils import IntegrityError
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+import json
+import os
+import subprocess
+import sys
+from io import StringIO
+import tempfile
 import uuid
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from api.v1.users_api.throttling import login_throttle
+from users import writebehind
+from users.authentication import user_states
+from users.models import UserRoles
+from users.tokens import ClaimsRefreshToken
 
 User = get_user_model()
 
@@ -38,3 +63,236 @@ class CustomUserTests(TestCase):
             User.objects.create_user(contact_number="0987654321", password="pw", username=f"user-{uid}")
             
         print("\nSUCCESS: Username uniqueness is enforced")
+
+
+class JournalMixin:
+    """Gives each test its own write-behind journal, flushed only when the test asks (and at cleanup)."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.journal_dir = directory.name
+        override = override_settings(AUTH_WRITE_BEHIND={"FLUSH_INTERVAL": 0, "JOURNAL_DIR": directory.name})
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(writebehind.journal.flush)
+
+
+@override_settings(
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+    LOGIN_THROTTLE={"WINDOW": 60, "FAILURES_PER_NUMBER": 3, "FAILURES_PER_IP": 10},
+)
+class LoginTests(JournalMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        login_throttle.reset()
+        self.addCleanup(login_throttle.reset)
+        self.user = User.objects.create_user(contact_number="9000000001", password="secret")
+        self.client = APIClient()
+
+    def login(self, phone_number, password, **extra):
+        return self.client.post(
+            reverse("login_api"), {"phone_number": phone_number, "password": password}, format="json", **extra
+        )
+
+    def hashes(self, phone_number, password):
+        with mock.patch.object(MD5PasswordHasher, "encode", autospec=True, side_effect=MD5PasswordHasher.encode) as encode:
+            response = self.login(phone_number, password)
+        return response, encode.call_count
+
+    def test_every_outcome_costs_one_query_and_one_hash(self):
+        with self.assertNumQueries(1):
+            response, hashes = self.hashes("9000000001", "secret")
+        self.assertEqual((response.status_code, hashes), (200, 1))
+        self.assertIn("access_token", response.data)
+
+        with self.assertNumQueries(1):
+            response, hashes = self.hashes("9000000001", "wrong")
+        self.assertEqual((response.status_code, hashes), (400, 1))
+
+        # Unknown numbers hash a dummy password, so they are not faster than wrong passwords.
+        response, hashes = self.hashes("9000000999", "secret")
+        self.assertEqual((response.status_code, hashes), (400, 1))
+
+    def test_inactive_users_are_rejected(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.login("9000000001", "secret").status_code, 400)
+
+    def test_repeated_failures_are_throttled_without_hashing(self):
+        for _ in range(3):
+            self.assertEqual(self.login("9000000001", "wrong").status_code, 400)
+
+        response, hashes = self.hashes("9000000001", "secret")
+        self.assertEqual((response.status_code, hashes), (429, 0))
+        self.assertIn("Retry-After", response)
+        # Other numbers from another address are unaffected.
+        self.assertEqual(self.login("9000000999", "wrong", REMOTE_ADDR="10.0.0.2").status_code, 400)
+
+    def test_ip_limit_covers_many_numbers(self):
+        for index in range(10):
+            self.login(f"90000010{index:02d}", "wrong")
+        self.assertEqual(self.login("9000000001", "secret").status_code, 429)
+        self.assertEqual(self.login("9000000001", "secret", REMOTE_ADDR="10.0.0.2").status_code, 200)
+
+    def test_forwarded_for_header_does_not_reset_the_ip_limit(self):
+        for index in range(10):
+            self.login(f"90000010{index:02d}", "wrong", HTTP_X_FORWARDED_FOR=f"203.0.113.{index}")
+        response = self.login("9000000001", "secret", HTTP_X_FORWARDED_FOR="203.0.113.99")
+        self.assertEqual(response.status_code, 429)
+
+    def test_failed_logins_are_logged_without_the_number(self):
+        with self.assertLogs("api.v1.users_api.views", "INFO") as logs:
+            self.login("9000000001", "wrong")
+        self.assertEqual(logs.output, ["INFO:api.v1.users_api.views:Failed login for ******0001"])
+
+    def test_success_clears_the_number_failures(self):
+        for _ in range(2):
+            self.login("9000000001", "wrong")
+        self.assertEqual(self.login("9000000001", "secret").status_code, 200)
+        for _ in range(2):
+            self.assertEqual(self.login("9000000001", "wrong").status_code, 400)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class ClaimsAuthenticationTests(JournalMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        user_states.clear()
+        self.addCleanup(user_states.clear)
+        self.agent = User.objects.create_user(contact_number="9000000002", password="secret", role=UserRoles.AGENT)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {ClaimsRefreshToken.for_user(self.agent).access_token}")
+        self.url = reverse("cashcollection_api:collection_summary")
+
+    def user_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return sum('"users_customuser"' in query["sql"] for query in queries.captured_queries)
+
+    def test_login_tokens_carry_the_claims(self):
+        response = self.client.post(reverse("login_api"), {"phone_number": "9000000002", "password": "secret"}, format="json")
+        token = AccessToken(response.data["access_token"])
+        self.assertEqual((token["role"], token["is_staff"], token["is_deleted"]), (UserRoles.AGENT, False, False))
+
+    def test_user_state_is_read_once_per_ttl(self):
+        self.assertEqual(self.user_queries(), 1)
+        self.assertEqual(self.user_queries(), 0)
+
+        # Another process deactivating the user is seen once the entry expires.
+        User.objects.filter(pk=self.agent.pk).update(is_active=False)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        with override_settings(JWT_CLAIMS_STATE_TTL=0):
+            user_states.clear()
+            self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_saving_the_user_revokes_at_once(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.agent.is_active = False
+        self.agent.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_role_claim_is_used_by_agent_endpoints(self):
+        response = self.client.get(reverse("cashcollection_api:agent-sync"))
+        self.assertEqual(response.status_code, 200)
+
+        # Stale claims fall back to the database user, whose role now wins.
+        self.agent.role = UserRoles.STAFF
+        self.agent.save()
+        self.assertEqual(self.client.get(reverse("cashcollection_api:agent-sync")).status_code, 403)
+
+    def test_tokens_without_claims_load_the_user(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.agent).access_token}")
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class WriteBehindTests(JournalMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(contact_number="9000000003", password="secret")
+        self.client = APIClient()
+
+    def login(self):
+        response = self.client.post(reverse("login_api"), {"phone_number": "9000000003", "password": "secret"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def refresh(self, token):
+        return self.client.post(reverse("users_api:token_refresh"), {"refresh": token}, format="json")
+
+    def test_flusher_recycles_its_connection_around_every_flush(self):
+        calls = []
+        with (
+            mock.patch.object(writebehind.time, "sleep", side_effect=[None, None, SystemExit]),
+            mock.patch.object(writebehind, "close_old_connections", side_effect=lambda: calls.append("close")),
+            mock.patch.object(writebehind.journal, "flush", side_effect=lambda: calls.append("flush")),
+            self.assertRaises(SystemExit),
+        ):
+            writebehind.journal.run(1)
+        self.assertEqual(calls, ["close", "flush", "close"] * 2)
+
+    def dead_pid(self):
+        process = subprocess.Popen([sys.executable, "-c", "pass"])
+        process.wait()
+        return process.pid
+
+    def test_login_writes_are_applied_by_the_flush(self):
+        tokens = self.login()
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_login)
+        self.assertFalse(OutstandingToken.objects.exists())
+
+        self.assertEqual(writebehind.journal.flush(), 2)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+        self.assertEqual(
+            OutstandingToken.objects.get().jti, RefreshToken(tokens["refresh_token"], verify=False)["jti"]
+        )
+        self.assertEqual(os.listdir(self.journal_dir), [])
+
+    def test_rotated_refresh_tokens_are_refused_before_and_after_the_flush(self):
+        old = self.login()["refresh_token"]
+        response = self.refresh(old)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AccessToken(response.data["access"])["role"], self.user.role)
+
+        self.assertEqual(self.refresh(old).status_code, 401)
+        writebehind.journal.flush()
+        self.assertTrue(BlacklistedToken.objects.filter(token__jti=RefreshToken(old, verify=False)["jti"]).exists())
+        self.assertEqual(self.refresh(old).status_code, 401)
+        self.assertEqual(self.refresh(response.data["refresh"]).status_code, 200)
+
+    def test_segments_of_dead_processes_are_replayed_idempotently(self):
+        earlier, later = timezone.now() - timedelta(hours=2), timezone.now() - timedelta(hours=1)
+        records = [
+            {"op": "last_login", "user": self.user.pk, "at": later.isoformat()},
+            {"op": "last_login", "user": self.user.pk, "at": earlier.isoformat()},
+        ]
+        path = os.path.join(self.journal_dir, f"{self.dead_pid()}-{uuid.uuid4().hex}.active")
+        with open(path, "w") as segment:
+            segment.writelines(json.dumps(record) + "\n" for record in records)
+            segment.write('{"op": "last_lo')  # Torn by a crash mid-append.
+
+        with self.assertLogs("users.writebehind", "WARNING"):
+            call_command("flush_auth_writes", stdout=StringIO())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_login, later)
+        self.assertEqual(os.listdir(self.journal_dir), [])
+
+        # Replaying never moves last_login backwards.
+        writebehind.apply(records)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_login, later)
+
+    @override_settings(AUTH_WRITE_BEHIND={"ENABLED": False})
+    def test_disabled_journal_writes_synchronously(self):
+        self.login()
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+        self.assertTrue(OutstandingToken.objects.filter(user=self.user).exists())
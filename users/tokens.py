@@ -0,0 +1,61 @@
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import BlacklistMixin, RefreshToken
+
+from users import writebehind
+
+
+# Copied into every token by ClaimsRefreshToken and trusted by users.authentication.ClaimsJWTAuthentication.
+USER_CLAIMS = ("role", "is_staff", "is_deleted")
+
+
+def user_claims(user):
+    return {claim: getattr(user, claim) for claim in USER_CLAIMS}
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """RefreshToken carrying the user's role and flags; its access tokens and rotated refresh tokens copy them."""
+
+    @classmethod
+    def for_user(cls, user):
+        # Skips BlacklistMixin.for_user, which inserts the OutstandingToken in the request;
+        # users.writebehind records it instead.
+        token = super(BlacklistMixin, cls).for_user(user)
+        for claim, value in user_claims(user).items():
+            token[claim] = value
+        writebehind.record_outstanding(token)
+        return token
+
+
+class WriteBehindTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    simplejwt's refresh with the rotated-out refresh token blacklisted
+    through users.writebehind rather than in the request. Tokens this
+    process has blacklisted but not yet flushed are refused as well.
+    """
+    token_class = ClaimsRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        if writebehind.journal.is_blacklisted(refresh[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        if user_id:
+            user = get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+            if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+                raise AuthenticationFailed(self.error_messages["no_active_account"], "no_active_account")
+
+        data = {"access": str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                writebehind.record_blacklist(refresh)
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data["refresh"] = str(refresh)
+        return data
@@ -43,7 +43,8 @@ from django.contrib.auth import authenticate
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework_simplejwt.tokens import RefreshToken
+from users import writebehind
+from users.tokens import ClaimsRefreshToken
 
 class LoginView(APIView):
 
@@ -69,7 +70,8 @@ class LoginView(APIView):
                 status=status.HTTP_401_UNAUTHORIZED
             )
 
-        refresh = RefreshToken.for_user(user)
+        writebehind.record_login(user)
+        refresh = ClaimsRefreshToken.for_user(user)
 
         return Response(
             {
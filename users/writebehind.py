@@ -0,0 +1,277 @@
+"""
+Write-behind journal for login bookkeeping.
+
+Logins and token refreshes used to write in the request path:
+last_login on CustomUser, an OutstandingToken row per issued refresh
+token and a BlacklistedToken row per rotated one. With hundreds of agents
+logging in at the start of the day those writes contend for locks. Now
+they are appended as JSON lines to a journal file owned by the process
+(JOURNAL_DIR/<pid>-<id>.active) and a background thread applies them
+every FLUSH_INTERVAL seconds, BATCH_SIZE records per transaction:
+
+- last_login updates are coalesced per user into one UPDATE that never
+  moves a last_login backwards;
+- outstanding and blacklisted tokens are bulk-inserted, ignoring rows
+  that already exist.
+
+Every statement is idempotent, so a segment is only deleted after it has
+been applied and is simply applied again if the process dies half-way.
+Segments of processes that are no longer running (a restart, a killed
+gunicorn worker) are claimed by renaming them and replayed by the next
+flush in any process, or by the `flush_auth_writes` command; delivery is
+at-least-once across process restarts. Records reach the OS on every
+append but are not fsynced, so a host crash can lose the last ones.
+
+JOURNAL_DIR has to outlive the processes writing to it. The default,
+under the system temp directory, is fine while redeploys keep the host's
+disk: a worker stopped gracefully flushes its segment on exit, and the
+next flush replays what a killed one left. Where a redeploy replaces the
+disk (a fresh container), the records of a worker killed before that
+final flush are lost, so point AUTH_JOURNAL_DIR at a persistent volume
+there.
+
+The flusher thread holds its own database connection, recycled like a
+request's: close_old_connections() runs around every flush, so a
+connection past CONN_MAX_AGE or broken by a failed flush is replaced.
+
+Until its journal is flushed, a rotated refresh token is only known to
+be blacklisted in the process that rotated it; another worker would
+accept it for up to FLUSH_INTERVAL seconds.
+
+With ENABLED off the records are applied synchronously instead.
+"""
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from users.models import CustomUser
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": True,
+    "JOURNAL_DIR": os.path.join(tempfile.gettempdir(), "paycollection-auth-journal"),
+    "FLUSH_INTERVAL": 2,
+    "BATCH_SIZE": 500,
+}
+
+
+def write_behind_setting(name):
+    return getattr(settings, "AUTH_WRITE_BEHIND", {}).get(name, DEFAULTS[name])
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# Applying records ---------------------------------------------------------------------------
+
+def apply(records):
+    """Applies a batch of journal records in one transaction. Safe to repeat."""
+    last_logins, tokens, blacklisted = {}, {}, set()
+    for record in records:
+        if record["op"] == "last_login":
+            at = parse_datetime(record["at"])
+            last_logins[record["user"]] = max(at, last_logins.get(record["user"], at))
+        else:
+            tokens.setdefault(record["jti"], record)
+            if record["op"] == "blacklist":
+                blacklisted.add(record["jti"])
+
+    with transaction.atomic():
+        if last_logins:
+            CustomUser.objects.filter(pk__in=last_logins).update(last_login=Case(
+                *[
+                    When(Q(pk=user_id) & (Q(last_login__isnull=True) | Q(last_login__lt=at)), then=Value(at))
+                    for user_id, at in last_logins.items()
+                ],
+                default=F("last_login"),
+            ))
+        if tokens:
+            users = set(CustomUser.objects.filter(
+                pk__in={record["user"] for record in tokens.values()}
+            ).values_list("pk", flat=True))
+            OutstandingToken.objects.bulk_create([
+                OutstandingToken(
+                    jti=jti, user_id=record["user"] if record["user"] in users else None, token=record["token"],
+                    created_at=parse_datetime(record["created_at"]), expires_at=parse_datetime(record["expires_at"]),
+                )
+                for jti, record in tokens.items()
+            ], ignore_conflicts=True)
+        if blacklisted:
+            BlacklistedToken.objects.bulk_create([
+                BlacklistedToken(token_id=token_id)
+                for token_id in OutstandingToken.objects.filter(jti__in=blacklisted).values_list("id", flat=True)
+            ], ignore_conflicts=True)
+
+
+def token_record(op, token):
+    return {
+        "op": op,
+        "jti": token[api_settings.JTI_CLAIM],
+        "user": token.get(api_settings.USER_ID_CLAIM),
+        "token": str(token),
+        "created_at": token.current_time.isoformat(),
+        "expires_at": datetime_from_epoch(token["exp"]).isoformat(),
+    }
+
+
+# Journal ------------------------------------------------------------------------------------
+
+class Journal:
+
+    def __init__(self):
+        self.reset()
+        os.register_at_fork(after_in_child=self.reset)
+
+    def reset(self):
+        # A forked child (a gunicorn worker) starts its own segment and flusher thread.
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.file = None
+        self.path = None
+        self.thread = None
+        self.pending_blacklist = set()
+
+    def directory(self):
+        path = write_behind_setting("JOURNAL_DIR")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def append(self, record):
+        if not write_behind_setting("ENABLED"):
+            apply([record])
+            return
+        with self.lock:
+            if self.file is None:
+                self.path = os.path.join(self.directory(), f"{os.getpid()}-{uuid.uuid4().hex}.active")
+                self.file = open(self.path, "a", encoding="utf-8")
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+            if record["op"] == "blacklist":
+                self.pending_blacklist.add(record["jti"])
+        self.start_flusher()
+
+    def is_blacklisted(self, jti):
+        with self.lock:
+            return jti in self.pending_blacklist
+
+    def rotate(self):
+        """Closes the active segment so the next flush picks it up."""
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.close()
+            os.rename(self.path, self.path[:-len(".active")] + ".ready")
+            self.file = self.path = None
+
+    def claim_segments(self):
+        """Returns this process's closed segments plus those of dead processes, claimed by renaming."""
+        pid = os.getpid()
+        with self.lock:
+            current = self.path
+        segments = []
+        for name in sorted(os.listdir(self.directory())):
+            owner, _, rest = name.partition("-")
+            path = os.path.join(self.directory(), name)
+            if not owner.isdigit() or not rest.endswith((".active", ".ready")) or path == current:
+                continue
+            if int(owner) == pid and name.endswith(".ready"):
+                segments.append(path)
+            # An active segment under our own pid was left by an earlier process that had the same pid.
+            elif int(owner) == pid or not process_alive(int(owner)):
+                claimed = os.path.join(self.directory(), f"{pid}-{uuid.uuid4().hex}.ready")
+                try:
+                    os.rename(path, claimed)
+                except FileNotFoundError:
+                    continue  # Claimed by another process first.
+                segments.append(claimed)
+        return segments
+
+    def read(self, path):
+        records = []
+        with open(path, encoding="utf-8") as segment:
+            for line in segment:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # Only the last line of a segment whose writer died mid-append can be torn.
+                    logger.warning("Skipping a torn journal record in %s", path)
+        return records
+
+    def flush(self):
+        """Applies every closed and orphaned segment; returns the number of records applied."""
+        with self.flush_lock:
+            self.rotate()
+            applied = 0
+            batch_size = write_behind_setting("BATCH_SIZE")
+            for path in self.claim_segments():
+                records = self.read(path)
+                for start in range(0, len(records), batch_size):
+                    apply(records[start:start + batch_size])
+                os.remove(path)
+                with self.lock:
+                    self.pending_blacklist -= {record["jti"] for record in records if record["op"] == "blacklist"}
+                applied += len(records)
+            return applied
+
+    def start_flusher(self):
+        interval = write_behind_setting("FLUSH_INTERVAL")
+        if not interval or (self.thread is not None and self.thread.is_alive()):
+            return
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.thread = threading.Thread(target=self.run, args=(interval,), name="auth-write-behind", daemon=True)
+            self.thread.start()
+        atexit.register(self.flush_quietly)
+
+    def run(self, interval):
+        while True:
+            time.sleep(interval)
+            close_old_connections()
+            self.flush_quietly()
+            close_old_connections()
+
+    def flush_quietly(self):
+        try:
+            self.flush()
+        except Exception:
+            # The segments stay on disk and are retried by the next flush.
+            logger.exception("Flushing the auth write-behind journal failed")
+
+
+journal = Journal()
+
+
+def record_login(user):
+    journal.append({"op": "last_login", "user": user.pk, "at": timezone.now().isoformat()})
+
+
+def record_outstanding(token):
+    journal.append(token_record("outstanding", token))
+
+
+def record_blacklist(token):
+    journal.append(token_record("blacklist", token))